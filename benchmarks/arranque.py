@@ -0,0 +1,116 @@
+"""Perfil de importación y arranque en frío de la app.
+
+Cada medición corre en un intérprete nuevo (como un worker recién lanzado):
+- Perfil: `python -X importtime` sobre el módulo, con los módulos más caros.
+- Arranque en frío: tiempo de importar el módulo y de iniciar_servicios()
+  (abrir las bases, crear tablas, migraciones), por separado.
+- Dependencias pesadas (SDK de Gemini, motores de extracción) que quedaron
+  importadas: deberían cargarse recién en el primer uso.
+
+Con --maximo-ms termina con código 1 si la mediana de importación lo supera o
+si se importó alguna dependencia pesada, para detectar regresiones.
+
+Uso: python benchmarks/arranque.py [--modulo pyapp.pyapp] [--repeticiones N]
+                                   [--top N] [--maximo-ms MS]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos que no deberían importarse al arrancar
+PESADOS = ("google.generativeai", "PyPDF2", "pypdf", "fitz", "docx", "openpyxl")
+
+MEDIR_ARRANQUE = """
+import sys, time
+inicio = time.perf_counter()
+import {modulo}
+importado = time.perf_counter()
+from pyapp.arranque import iniciar_servicios
+iniciar_servicios()
+iniciado = time.perf_counter()
+pesados = [m for m in {pesados!r} if m in sys.modules]
+print("RESULTADO", importado - inicio, iniciado - importado, ",".join(pesados), file=sys.stderr)
+"""
+
+
+def ejecutar(argumentos, directorio):
+    """Corre un intérprete nuevo con la raíz del repo en el path y retorna su stderr."""
+    entorno = dict(os.environ, PYTHONPATH=RAIZ + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    proceso = subprocess.run(
+        [sys.executable, *argumentos], cwd=directorio, env=entorno,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    if proceso.returncode != 0:
+        print(proceso.stderr[-2000:])
+        sys.exit(f"❌ Falló: python {' '.join(argumentos)}")
+    return proceso.stderr
+
+
+def perfil_importacion(modulo, top):
+    """Módulos ordenados por tiempo acumulado según -X importtime."""
+    salida = ejecutar(["-X", "importtime", "-c", f"import {modulo}"], tempfile.mkdtemp())
+    filas = []
+    for linea in salida.splitlines():
+        if not linea.startswith("import time:") or "cumulative" in linea:
+            continue
+        # "import time:  propio |  acumulado |   paquete" (la indentación marca la anidación)
+        propio, acumulado, nombre = linea[len("import time:"):].split("|", 2)
+        filas.append((int(acumulado), int(propio), nombre.rstrip()))
+    total = next((acumulado for acumulado, _, nombre in filas if nombre.strip() == modulo), None)
+    print(f"\nPerfil de importación de {modulo}"
+          + (f" ({total / 1000:.0f} ms)" if total is not None else ""))
+    print(f"   {'acumulado ms':>12}{'propio ms':>11}  módulo")
+    for acumulado, propio, nombre in sorted(filas, reverse=True)[:top]:
+        print(f"   {acumulado / 1000:>12.1f}{propio / 1000:>11.1f}  {nombre.strip()}")
+
+
+def arranque_en_frio(modulo, repeticiones):
+    """Mediana de importación e inicio de servicios, y dependencias pesadas cargadas."""
+    importaciones, inicios, pesados = [], [], set()
+    for _ in range(repeticiones):
+        # Directorio nuevo en cada corrida: las bases se crean desde cero
+        salida = ejecutar(["-c", MEDIR_ARRANQUE.format(modulo=modulo, pesados=PESADOS)], tempfile.mkdtemp())
+        linea = next(l for l in salida.splitlines() if l.startswith("RESULTADO"))
+        partes = linea.split(" ")
+        importaciones.append(float(partes[1]))
+        inicios.append(float(partes[2]))
+        if len(partes) > 3 and partes[3]:
+            pesados.update(partes[3].split(","))
+    print(f"\nArranque en frío ({repeticiones} intérpretes nuevos)")
+    print(f"   importar {modulo}: {statistics.median(importaciones) * 1000:.0f} ms (mediana), "
+          f"{min(importaciones) * 1000:.0f}-{max(importaciones) * 1000:.0f} ms")
+    print(f"   iniciar servicios: {statistics.median(inicios) * 1000:.0f} ms (mediana)")
+    print(f"   dependencias pesadas importadas: {', '.join(sorted(pesados)) or 'ninguna'}")
+    return statistics.median(importaciones), pesados
+
+
+def main():
+    argumentos = sys.argv[1:]
+    opciones = {"--modulo": "pyapp.pyapp", "--repeticiones": "5", "--top": "15", "--maximo-ms": None}
+    for opcion in opciones:
+        if opcion in argumentos:
+            posicion = argumentos.index(opcion)
+            opciones[opcion] = argumentos[posicion + 1]
+            del argumentos[posicion:posicion + 2]
+    if argumentos:
+        print(__doc__)
+        sys.exit(1)
+
+    modulo = opciones["--modulo"]
+    perfil_importacion(modulo, int(opciones["--top"]))
+    mediana, pesados = arranque_en_frio(modulo, int(opciones["--repeticiones"]))
+
+    if opciones["--maximo-ms"] is not None:
+        maximo = float(opciones["--maximo-ms"])
+        if mediana * 1000 > maximo or pesados:
+            sys.exit(f"❌ Regresión de arranque: {mediana * 1000:.0f} ms (máximo {maximo:.0f} ms), "
+                     f"pesados: {', '.join(sorted(pesados)) or 'ninguno'}")
+        print(f"✅ Dentro del máximo de {maximo:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
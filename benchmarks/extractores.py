@@ -0,0 +1,66 @@
+"""Compara los motores de extracción disponibles sobre archivos reales.
+
+Para cada archivo detecta el formato, lo extrae con cada motor instalado y
+muestra tiempo y rendimiento. El más rápido es el que conviene fijar con
+EXTRACTOR_<FORMATO> si no se quiere depender de la selección automática.
+
+Uso: python benchmarks/extractores.py archivo [archivo ...] [--repeticiones N]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp())  # Las bases de datos de prueba se crean aquí
+
+from pyapp.extractores import detectar_formato, registro  # noqa: E402
+from pyapp.file_processor import FileProcessor  # noqa: E402,F401  (registra los motores)
+
+
+def medir(motor, datos, repeticiones):
+    """Segundos por extracción y largo del texto, o el error si el motor no pudo."""
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                texto = motor.extraer(datos, None)
+        return (time.perf_counter() - inicio) / repeticiones, len(texto), None
+    except Exception as e:
+        return None, 0, e
+
+
+def main():
+    argumentos = sys.argv[1:]
+    repeticiones = 3
+    if "--repeticiones" in argumentos:
+        posicion = argumentos.index("--repeticiones")
+        repeticiones = int(argumentos[posicion + 1])
+        del argumentos[posicion:posicion + 2]
+    if not argumentos:
+        print(__doc__)
+        sys.exit(1)
+
+    for ruta in argumentos:
+        with open(ruta, "rb") as archivo:
+            datos = archivo.read()
+        formato = detectar_formato(datos, os.path.basename(ruta))
+        print(f"\n{os.path.basename(ruta)} ({len(datos) / 1024:.0f} KB, formato {formato})")
+        motores = registro.candidatos(formato) if formato else []
+        if not motores:
+            print("   sin motores disponibles")
+            continue
+        print(f"   {'motor':<16}{'ms':>10}{'MB/s':>10}{'caracteres':>12}")
+        for motor in motores:
+            segundos, caracteres, error = medir(motor, datos, repeticiones)
+            if error is not None:
+                print(f"   {motor.nombre:<16}{'falló':>10}   {str(error)[:50]}")
+                continue
+            print(f"   {motor.nombre:<16}{segundos * 1000:>10.1f}"
+                  f"{len(datos) / segundos / 1e6:>10.1f}{caracteres:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Micro-benchmark del enrutador de comandos del chat.
+
+Compara la cadena original de `in` sobre el mensaje en minúsculas con
+`router.resolver` sobre un corpus parecido al tráfico real: la mayoría son
+preguntas normales (cortas y textos largos pegados) y una minoría comandos.
+Termina con error si alguna pregunta se ejecuta como comando.
+
+Uso: python benchmarks/router_comandos.py [repeticiones]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp())  # La base de datos de prueba se crea aquí
+
+from pyapp.database import router  # noqa: E402  (registra los comandos)
+import pyapp.models  # noqa: E402,F401  (registra los comandos de la biblioteca)
+
+# Frases de la cadena if/elif original, en el mismo orden
+CADENA_ORIGINAL = [
+    ("auth admin",),
+    ("session status", "estado sesion"),
+    ("logout admin", "cerrar sesion"),
+    ("generar contraseña",),
+    ("agregar usuario", "crear usuario"),
+    ("importar usuarios",),
+    ("exportar usuarios",),
+    ("rotar contraseñas", "rotar contrasenas"),
+    ("regenerar contraseña", "nueva contraseña"),
+    ("listar usuarios", "mostrar usuarios", "ver usuarios"),
+    ("buscar usuario",),
+    ("modificar usuario",),
+    ("eliminar usuario", "borrar usuario"),
+    ("cache usuarios", "caché usuarios"),
+    ("verificar estadisticas", "verificar estadísticas"),
+    ("reconstruir estadisticas", "reconstruir estadísticas"),
+    ("estadisticas", "estadísticas"),
+    ("ayuda db", "help db"),
+]
+
+
+def resolver_original(mensaje):
+    """Clasificación de la cadena original (sin ejecutar el comando)."""
+    mensaje_lower = mensaje.lower().strip()
+    if mensaje_lower.startswith("auth admin"):
+        return CADENA_ORIGINAL[0]
+    for frases in CADENA_ORIGINAL[1:]:
+        if any(frase in mensaje_lower for frase in frases):
+            return frases
+    return None
+
+
+PREGUNTAS = [
+    "Hola, ¿cómo estás?",
+    "¿Puedes resumir el documento que te envié?",
+    "Explícame la diferencia entre una lista y una tupla en Python",
+    "¿Qué fórmulas de Excel sirven para buscar valores en otra hoja?",
+    "Necesito ayuda con una macro de AutoCAD que no funciona",
+    "Traduce al inglés: el informe estará listo el lunes",
+    "¿Cuáles son las estadísticas más importantes del archivo?",
+    "Dame ideas para la presentación del proyecto de fin de curso",
+    "¿Cómo agrego un usuario nuevo en Windows 11?",
+    "Escribe un correo formal para pedir una reunión",
+    "¿Por qué mi consulta SQL tarda tanto?",
+    "gracias!",
+    # Empiezan con la frase de un comando sin argumentos, pero son preguntas
+    "Estadísticas de ventas de este mes",
+    "Ver estadísticas del último trimestre por región",
+    "Cerrar sesión de Windows sin apagar el equipo",
+    "Documentos que necesito para renovar el pasaporte",
+]
+PARRAFO = ("El presente informe describe los resultados obtenidos durante el trimestre, "
+           "incluyendo las estadísticas de uso de cada programa y las recomendaciones "
+           "para el próximo período. ")
+TEXTOS_LARGOS = [
+    "Revisa este texto y corrige la ortografía:\n" + PARRAFO * 40,    # ~8 KB
+    "Resume lo siguiente en cinco puntos:\n" + PARRAFO * 400,         # ~80 KB
+]
+COMANDOS = [
+    "auth admin admin123",
+    "listar usuarios",
+    "listar usuarios pagina 3",
+    "buscar usuario autocad",
+    "agregar usuario Juan Perez programa AutoCAD longitud 20",
+    "modificar usuario 12 programa Revit 2024",
+    "regenerar contraseña 5",
+    "estadísticas",
+    "generar contraseña longitud 24",
+    "ayuda db",
+]
+
+
+def medir(funcion, mensajes, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for mensaje in mensajes:
+            funcion(mensaje)
+    return (time.perf_counter() - inicio) / (repeticiones * len(mensajes)) * 1e6
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    grupos = [
+        ("preguntas cortas", PREGUNTAS, repeticiones),
+        ("textos largos", TEXTOS_LARGOS, max(1, repeticiones // 20)),
+        ("comandos", COMANDOS, repeticiones),
+    ]
+
+    print(f"{'grupo':<18}{'original (µs)':>15}{'router (µs)':>14}{'aceleración':>14}")
+    for nombre, mensajes, veces in grupos:
+        original = medir(resolver_original, mensajes, veces)
+        nuevo = medir(router.resolver, mensajes, veces)
+        print(f"{nombre:<18}{original:>15.2f}{nuevo:>14.2f}{original / nuevo:>13.1f}x")
+
+    # Mensajes que la cadena original trataba como comando y ahora van al modelo
+    falsos_positivos = [m for m in PREGUNTAS + TEXTOS_LARGOS
+                        if resolver_original(m) is not None and router.resolver(m) is None]
+    print(f"\nPreguntas que antes se interpretaban como comando: {len(falsos_positivos)}")
+    for mensaje in falsos_positivos:
+        print(f"   • {mensaje[:60]!r}")
+
+    # Preguntas que empiezan con la frase de un comando: el manejador debe rechazarlas
+    mal_enrutadas = []
+    for mensaje in PREGUNTAS + TEXTOS_LARGOS:
+        resultado = router.resolver(mensaje)
+        if resultado is not None:
+            comando, invocacion = resultado
+            if comando.manejador(invocacion) is not None:
+                mal_enrutadas.append(mensaje)
+    print(f"Preguntas que el router ejecuta como comando: {len(mal_enrutadas)}")
+    for mensaje in mal_enrutadas:
+        print(f"   • {mensaje[:60]!r}")
+    if mal_enrutadas:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Resumen de las trazas exportadas por la app (TRAZAS_ARCHIVO).
+
+Lee el archivo de spans (una línea JSON por lote, en el formato OTLP del
+exportador "file" del OpenTelemetry Collector) y muestra:
+- Por etapa (nombre del span): cantidad, mediana, p95, máximo y errores.
+- Las solicitudes más lentas, con el tiempo de cada etapa y su perfil si se
+  guardó uno (TRAZAS_PERFIL_MS).
+
+Uso: python benchmarks/trazas.py [archivo] [--top N]
+"""
+import json
+import os
+import statistics
+import sys
+
+
+def leer_spans(ruta):
+    spans = []
+    with open(ruta, encoding="utf-8") as archivo:
+        for linea in archivo:
+            if not linea.strip():
+                continue
+            for recurso in json.loads(linea).get("resourceSpans", []):
+                for alcance in recurso.get("scopeSpans", []):
+                    spans.extend(alcance.get("spans", []))
+    return spans
+
+
+def _duracion(span):
+    return (int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1e9
+
+
+def _atributo(span, clave):
+    for atributo in span.get("attributes", []):
+        if atributo["key"] == clave:
+            return next(iter(atributo["value"].values()))
+    return None
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+
+def por_etapa(spans):
+    etapas = {}
+    for span in spans:
+        etapas.setdefault(span["name"], []).append(span)
+    print(f"{'etapa':<28}{'cantidad':>9}{'mediana':>10}{'p95':>10}{'máximo':>10}{'errores':>9}")
+    for nombre, grupo in sorted(etapas.items(), key=lambda item: -sum(map(_duracion, item[1]))):
+        duraciones = [_duracion(span) for span in grupo]
+        errores = sum(1 for span in grupo if span.get("status", {}).get("code") == 2)
+        print(f"{nombre:<28}{len(grupo):>9}{statistics.median(duraciones):>9.3f}s"
+              f"{_percentil(duraciones, 0.95):>9.3f}s{max(duraciones):>9.3f}s{errores:>9}")
+
+
+def mas_lentas(spans, top):
+    hijos = {}
+    for span in spans:
+        if span.get("parentSpanId"):
+            hijos.setdefault(span["traceId"], []).append(span)
+    raices = sorted((span for span in spans if not span.get("parentSpanId")), key=_duracion, reverse=True)
+    print(f"\n🐢 {min(top, len(raices))} solicitudes más lentas")
+    for raiz in raices[:top]:
+        totales = {}
+        for span in hijos.get(raiz["traceId"], []):
+            totales[span["name"]] = totales.get(span["name"], 0.0) + _duracion(span)
+        detalle = ", ".join(f"{nombre} {segundos:.2f}s" for nombre, segundos in
+                            sorted(totales.items(), key=lambda item: -item[1]))
+        print(f"   {raiz['name']} {_duracion(raiz):.2f}s [{raiz['traceId'][:12]}] {detalle}")
+        perfil = _atributo(raiz, "perfil")
+        if perfil:
+            print(f"      perfil: {perfil}")
+
+
+def main():
+    argumentos = sys.argv[1:]
+    top = 10
+    if "--top" in argumentos:
+        posicion = argumentos.index("--top")
+        top = int(argumentos[posicion + 1])
+        del argumentos[posicion:posicion + 2]
+    if len(argumentos) > 1:
+        print(__doc__)
+        sys.exit(1)
+    ruta = argumentos[0] if argumentos else os.getenv("TRAZAS_ARCHIVO", "trazas.jsonl")
+
+    spans = leer_spans(ruta)
+    if not spans:
+        sys.exit(f"No hay spans en {ruta}")
+    print(f"📊 {len(spans)} spans en {ruta}\n")
+    por_etapa(spans)
+    mas_lentas(spans, top)
+
+
+if __name__ == "__main__":
+    main()
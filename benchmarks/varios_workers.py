@@ -0,0 +1,207 @@
+"""Prueba de varios workers del backend en una sola máquina.
+
+Lanza N procesos que importan la app como lo haría cada worker y comparten el
+mismo directorio de bases de datos. Un mismo cliente (token) manda cada paso a
+un worker distinto, en ronda, y se verifica que vea siempre lo mismo:
+- Sesión admin: `auth admin` en un worker habilita los comandos en los demás,
+  y `logout admin` la cierra en todos.
+- Cache de usuarios: un cambio hecho en un worker lo ven los que ya tenían la
+  fila en su cache.
+- Estado del modelo: el archivo adjunto y el historial del chat del cliente
+  están disponibles en cualquier worker, y no se mezclan entre clientes.
+- Historial de mensajes: los mensajes de un cliente que llegan a la vez a
+  workers distintos se guardan todos, sin pisarse, y todos ven el mismo total.
+Al final mide comandos por segundo con todos los workers a la vez.
+
+Uso: python benchmarks/varios_workers.py [workers] [comandos_por_worker]
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CONTRASEÑA = "clave-de-prueba"
+
+
+def worker(directorio, conexion):
+    """Un worker: atiende (token, acción, argumentos) hasta recibir None."""
+    import contextlib
+    import io
+    os.chdir(directorio)
+    os.environ["ADMIN_PASSWORD"] = CONTRASEÑA
+    with contextlib.redirect_stdout(io.StringIO()):
+        from pyapp.arranque import iniciar_servicios
+        from pyapp.comandos import cliente_actual
+        from pyapp.database import procesar_comando_db
+        from pyapp.models import GeminiModel
+        from pyapp.transcript import transcript
+        iniciar_servicios()
+
+    acciones = {
+        "comando": procesar_comando_db,
+        "adjuntar": GeminiModel.adjuntar_documento,
+        "archivo": GeminiModel.obtener_archivo_cache,
+        "sembrar_historial": GeminiModel.restaurar_sesion,
+        "historial": GeminiModel._historial,
+        "bytes_cache": GeminiModel.bytes_cache,
+        "agregar_mensaje": transcript.agregar,
+        "flush": transcript.flush,
+        "total_mensajes": transcript.total,
+        "mensajes": transcript.rango,
+    }
+    conexion.send(os.getpid())
+    while True:
+        pedido = conexion.recv()
+        if pedido is None:
+            break
+        token, accion, argumentos = pedido
+        cliente_actual.set(token)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                if accion == "rafaga":
+                    inicio = time.perf_counter()
+                    for _ in range(argumentos[0]):
+                        procesar_comando_db("estadísticas")
+                    resultado = time.perf_counter() - inicio
+                else:
+                    resultado = acciones[accion](*argumentos)
+        except Exception as e:
+            resultado = f"EXCEPCIÓN {type(e).__name__}: {e}"
+        conexion.send(resultado)
+
+
+class Workers:
+    """Reparte los pasos entre los workers en ronda."""
+
+    def __init__(self, cantidad, directorio):
+        contexto = multiprocessing.get_context("spawn")
+        self.conexiones = []
+        self.procesos = []
+        for _ in range(cantidad):
+            propia, remota = contexto.Pipe()
+            proceso = contexto.Process(target=worker, args=(directorio, remota), daemon=True)
+            proceso.start()
+            self.conexiones.append(propia)
+            self.procesos.append(proceso)
+        self.pids = [conexion.recv() for conexion in self.conexiones]
+        self._siguiente = 0
+
+    def pedir(self, token, accion, *argumentos):
+        conexion = self.conexiones[self._siguiente % len(self.conexiones)]
+        self._siguiente += 1
+        conexion.send((token, accion, argumentos))
+        return conexion.recv()
+
+    def todos(self, token, accion, *argumentos):
+        for conexion in self.conexiones:
+            conexion.send((token, accion, argumentos))
+        return [conexion.recv() for conexion in self.conexiones]
+
+    def cada_uno(self, token, accion, argumentos):
+        """Manda a la vez a cada worker su pedido (una tupla de argumentos por worker)."""
+        for conexion, propios in zip(self.conexiones, argumentos):
+            conexion.send((token, accion, propios))
+        return [conexion.recv() for conexion in self.conexiones]
+
+    def cerrar(self):
+        for conexion in self.conexiones:
+            conexion.send(None)
+        for proceso in self.procesos:
+            proceso.join(timeout=10)
+
+
+def main():
+    argumentos = sys.argv[1:]
+    cantidad = int(argumentos[0]) if argumentos else 3
+    rafaga = int(argumentos[1]) if len(argumentos) > 1 else 200
+    if cantidad < 2:
+        sys.exit("Se necesitan al menos 2 workers")
+
+    directorio = tempfile.mkdtemp()
+    print(f"🚀 Lanzando {cantidad} workers (bases en {directorio})")
+    workers = Workers(cantidad, directorio)
+    fallas = []
+
+    def verificar(descripcion, condicion):
+        print(f"   {'✅' if condicion else '❌'} {descripcion}")
+        if not condicion:
+            fallas.append(descripcion)
+
+    try:
+        print("\n🔐 Sesión admin")
+        verificar("sin sesión, el comando se rechaza",
+                  "ACCESO DENEGADO" in workers.pedir("cliente-a", "comando", "listar usuarios"))
+        verificar("auth admin en un worker",
+                  "exitosa" in workers.pedir("cliente-a", "comando", f"auth admin {CONTRASEÑA}").lower())
+        respuestas = workers.todos("cliente-a", "comando", "listar usuarios")
+        verificar("la sesión vale en todos los workers", all("ACCESO DENEGADO" not in r for r in respuestas))
+        verificar("otro cliente sigue sin sesión",
+                  "ACCESO DENEGADO" in workers.pedir("cliente-b", "comando", "listar usuarios"))
+
+        print("\n🧠 Cache de usuarios")
+        creado = workers.pedir("cliente-a", "comando", "agregar usuario ana programa ventas contraseña x1")
+        user_id = next((p.strip("*:#") for p in creado.split() if p.strip("*:#").isdigit()), "1")
+        antes = workers.todos("cliente-a", "comando", f"buscar usuario {user_id}")  # Todos la cachean
+        verificar("todos los workers ven el usuario nuevo", all("ana" in r for r in antes))
+        workers.pedir("cliente-a", "comando", f"modificar usuario {user_id} programa compras")
+        despues = workers.todos("cliente-a", "comando", f"buscar usuario {user_id}")
+        verificar("un cambio en un worker invalida la cache de los demás", all("compras" in r for r in despues))
+
+        workers.pedir("cliente-a", "comando", "logout admin")
+        respuestas = workers.todos("cliente-a", "comando", "listar usuarios")
+        verificar("logout admin cierra la sesión en todos", all("ACCESO DENEGADO" in r for r in respuestas))
+
+        print("\n📎 Estado del modelo por cliente")
+        documento = {"nombre": "informe.txt", "contenido": "contenido del informe", "huella": "abc",
+                     "size_original": 21}
+        workers.pedir("cliente-a", "adjuntar", documento)
+        archivos = workers.todos("cliente-a", "archivo")
+        verificar("el archivo adjunto está en todos los workers", all(a == "contenido del informe" for a in archivos))
+        verificar("otro cliente no ve el archivo", workers.pedir("cliente-b", "archivo") is None)
+        historial = [{"role": "user", "parts": ["hola"]}, {"role": "model", "parts": ["¡hola!"]}]
+        workers.pedir("cliente-a", "sembrar_historial", historial)
+        historiales = workers.todos("cliente-a", "historial")
+        verificar("el historial del chat está en todos los workers", all(h == historial for h in historiales))
+        verificar("la memoria del cliente se mide igual en todos",
+                  len(set(workers.todos("cliente-a", "bytes_cache"))) == 1)
+
+        print("\n💬 Historial de mensajes")
+        rondas = 20
+        workers.pedir("cliente-c", "total_mensajes", "cliente-c")  # Un worker ya la tiene cargada
+        enviados = []
+        for ronda in range(rondas):
+            textos = [f"mensaje {ronda} del worker {i}" for i in range(cantidad)]
+            enviados.extend(textos)
+            workers.cada_uno("cliente-c", "agregar_mensaje",
+                             [("cliente-c", {"texto": texto, "es_usuario": True}) for texto in textos])
+        workers.todos("cliente-c", "flush")
+        totales = workers.todos("cliente-c", "total_mensajes", "cliente-c")
+        verificar(f"ningún mensaje se pierde ({len(enviados)} enviados, totales {sorted(set(totales))})",
+                  all(total == len(enviados) for total in totales))
+        guardados = workers.pedir("cliente-c", "mensajes", "cliente-c", 0, len(enviados))
+        verificar("cada mensaje se guarda una sola vez",
+                  sorted(mensaje["texto"] for mensaje in guardados) == sorted(enviados))
+        verificar("todos los workers leen el mismo historial",
+                  all(r == guardados for r in workers.todos("cliente-c", "mensajes", "cliente-c", 0, len(enviados))))
+
+        print(f"\n⏱️  {rafaga} comandos por worker, todos a la vez")
+        inicio = time.perf_counter()
+        for conexion in workers.conexiones:
+            conexion.send(("cliente-a", "rafaga", (rafaga,)))
+        tiempos = [conexion.recv() for conexion in workers.conexiones]
+        total = time.perf_counter() - inicio
+        print(f"   {cantidad * rafaga} comandos en {total:.2f}s "
+              f"({cantidad * rafaga / total:.0f}/s; por worker {rafaga / max(tiempos):.0f}/s)")
+    finally:
+        workers.cerrar()
+
+    if fallas:
+        sys.exit(f"\n❌ {len(fallas)} verificación(es) fallaron")
+    print("\n✅ Todas las verificaciones pasaron")
+
+
+if __name__ == "__main__":
+    main()
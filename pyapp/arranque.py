@@ -0,0 +1,262 @@
+import asyncio
+import contextlib
+import io
+import os
+import threading
+import time
+import zipfile
+from typing import Dict
+from .biblioteca import biblioteca
+from .bitacora import obtener_logger
+from .database import db
+from .estado_compartido import estado_compartido
+from .extractores import registro
+from .models import GeminiModel
+from .transcript import transcript
+
+log = obtener_logger(__name__)
+
+# Calentar SDK, SQLite y motores de extracción en segundo plano al arrancar ("0" lo desactiva)
+CALENTAR_AL_INICIAR = os.getenv("CALENTAR_AL_INICIAR", "1") != "0"
+
+
+class Preparacion:
+    """Estado del calentamiento de este worker (lo informa la ruta /listo).
+
+    El worker está listo cuando terminó el calentamiento, aunque alguna etapa haya
+    fallado (p. ej. un motor opcional): esas etapas se informan en `errores` y
+    simplemente pagarán su costo en el primer uso, como antes.
+    """
+
+    def __init__(self):
+        self._listo = threading.Event()
+        self._lock = threading.Lock()
+        self._etapas: Dict[str, float] = {}  # nombre -> milisegundos
+        self._errores: Dict[str, str] = {}
+        self._inicio = time.monotonic()
+
+    @contextlib.contextmanager
+    def etapa(self, nombre: str):
+        """Mide una etapa del calentamiento; si falla, registra el error y sigue."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            with self._lock:
+                self._errores[nombre] = str(e)
+            log.warning("⚠️  Calentamiento de %s falló: %s", nombre, e)
+        finally:
+            with self._lock:
+                self._etapas[nombre] = (time.perf_counter() - inicio) * 1000
+
+    def terminar(self):
+        self._listo.set()
+
+    @property
+    def listo(self) -> bool:
+        return self._listo.is_set()
+
+    def esperar(self, timeout: float = None) -> bool:
+        return self._listo.wait(timeout)
+
+    def resumen(self) -> Dict:
+        with self._lock:
+            return {
+                "listo": self.listo,
+                "segundos_desde_inicio": round(time.monotonic() - self._inicio, 1),
+                "etapas_ms": {nombre: round(ms, 1) for nombre, ms in self._etapas.items()},
+                "errores": dict(self._errores),
+            }
+
+
+# Instancia global
+preparacion = Preparacion()
+
+
+# ========== DOCUMENTOS DE PRUEBA ==========
+
+def _pdf_de_prueba(texto: str) -> bytes:
+    """PDF mínimo de una página con `texto` (Helvetica, sin compresión)."""
+    contenido = f"BT /F1 12 Tf 10 20 Td ({texto}) Tj ET".encode("latin-1")
+    objetos = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 200 50] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(contenido), contenido),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    salida = io.BytesIO()
+    salida.write(b"%PDF-1.4\n")
+    posiciones = []
+    for numero, objeto in enumerate(objetos, start=1):
+        posiciones.append(salida.tell())
+        salida.write(b"%d 0 obj\n%s\nendobj\n" % (numero, objeto))
+    inicio_xref = salida.tell()
+    salida.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1))
+    for posicion in posiciones:
+        salida.write(b"%010d 00000 n \n" % posicion)
+    salida.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                 % (len(objetos) + 1, inicio_xref))
+    return salida.getvalue()
+
+
+def _paquete_office(partes: Dict[str, str]) -> bytes:
+    salida = io.BytesIO()
+    with zipfile.ZipFile(salida, "w", zipfile.ZIP_DEFLATED) as paquete:
+        for nombre, xml in partes.items():
+            paquete.writestr(nombre, '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n' + xml)
+    return salida.getvalue()
+
+
+_TIPOS = "http://schemas.openxmlformats.org/package/2006/content-types"
+_RELACIONES = "http://schemas.openxmlformats.org/package/2006/relationships"
+_DOCUMENTO_OFICINA = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+
+def _docx_de_prueba(texto: str) -> bytes:
+    """DOCX mínimo con un párrafo y una tabla de una celda."""
+    w = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+    return _paquete_office({
+        "[Content_Types].xml": (
+            f'<Types xmlns="{_TIPOS}">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" ContentType="application/'
+            'vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            '</Types>'
+        ),
+        "_rels/.rels": (
+            f'<Relationships xmlns="{_RELACIONES}">'
+            f'<Relationship Id="rId1" Type="{_DOCUMENTO_OFICINA}/officeDocument" Target="word/document.xml"/>'
+            '</Relationships>'
+        ),
+        "word/document.xml": (
+            f'<w:document xmlns:w="{w}"><w:body>'
+            f'<w:p><w:r><w:t>{texto}</w:t></w:r></w:p>'
+            f'<w:tbl><w:tr><w:tc><w:p><w:r><w:t>{texto}</w:t></w:r></w:p></w:tc></w:tr></w:tbl>'
+            '</w:body></w:document>'
+        ),
+    })
+
+
+def _xlsx_de_prueba(texto: str) -> bytes:
+    """XLSX mínimo con una hoja de dos filas (texto en línea, sin sharedStrings)."""
+    s = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+    return _paquete_office({
+        "[Content_Types].xml": (
+            f'<Types xmlns="{_TIPOS}">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/'
+            'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/'
+            'vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            '</Types>'
+        ),
+        "_rels/.rels": (
+            f'<Relationships xmlns="{_RELACIONES}">'
+            f'<Relationship Id="rId1" Type="{_DOCUMENTO_OFICINA}/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ),
+        "xl/workbook.xml": (
+            f'<workbook xmlns="{s}" xmlns:r="{_DOCUMENTO_OFICINA}">'
+            '<sheets><sheet name="Hoja1" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ),
+        "xl/_rels/workbook.xml.rels": (
+            f'<Relationships xmlns="{_RELACIONES}">'
+            f'<Relationship Id="rId1" Type="{_DOCUMENTO_OFICINA}/worksheet" Target="worksheets/sheet1.xml"/>'
+            '</Relationships>'
+        ),
+        "xl/worksheets/sheet1.xml": (
+            f'<worksheet xmlns="{s}"><sheetData>'
+            f'<row r="1"><c r="A1" t="inlineStr"><is><t>{texto}</t></is></c></row>'
+            '<row r="2"><c r="A2"><v>1</v></c></row>'
+            '</sheetData></worksheet>'
+        ),
+    })
+
+
+def documentos_de_prueba() -> Dict[str, bytes]:
+    """Un documento diminuto por formato, para ejercitar cada motor de extracción."""
+    texto = "calentamiento"
+    return {
+        "pdf": _pdf_de_prueba(texto),
+        "docx": _docx_de_prueba(texto),
+        "xlsx": _xlsx_de_prueba(texto),
+        "texto": f"{texto}\n".encode("utf-8"),
+        "csv": f"columna\n{texto}\n".encode("utf-8"),
+        "tsv": f"columna\tvalor\n{texto}\t1\n".encode("utf-8"),
+    }
+
+
+# ========== ARRANQUE ==========
+
+def iniciar_servicios():
+    """Abre las bases de datos, crea las tablas y aplica las migraciones."""
+    inicio = time.perf_counter()
+    estado_compartido.iniciar()
+    db.iniciar()
+    transcript.iniciar()
+    biblioteca.iniciar()
+    log.info("🚀 Servicios iniciados en %.0f ms", (time.perf_counter() - inicio) * 1000)
+
+
+def detener_servicios():
+    """Confirma las escrituras pendientes y cierra las conexiones."""
+    transcript.flush()
+    for conexiones in (db.conexiones, transcript.conexiones, biblioteca.conexiones, estado_compartido.conexiones):
+        conexiones.cerrar()
+    log.info("👋 Servicios detenidos")
+
+
+def calentar():
+    """
+    Prepara lo que de otro modo pagaría la primera petición: el SDK de Gemini y su
+    modelo, una conexión de lectura de cada base y las librerías de cada motor de
+    extracción, que se importan al leer un documento de prueba. Los motores se
+    llaman directamente para no mezclar estas mediciones con las de uso real.
+    """
+    inicio = time.perf_counter()
+    try:
+        with preparacion.etapa("gemini"):
+            # Crea el modelo compartido del proceso: la primera sesión de chat ya lo encuentra
+            GeminiModel.get_chat_session([])
+
+        for nombre, conexiones in (("usuarios", db.conexiones), ("conversaciones", transcript.conexiones),
+                                   ("biblioteca", biblioteca.conexiones), ("estado", estado_compartido.conexiones)):
+            with preparacion.etapa(f"sqlite {nombre}"):
+                with conexiones.lectura() as conn:
+                    conn.execute("SELECT 1").fetchone()
+
+        for formato, datos in documentos_de_prueba().items():
+            for motor in registro.candidatos(formato):
+                with preparacion.etapa(f"{formato} {motor.nombre}"):
+                    motor.extraer(datos, None)
+    finally:
+        preparacion.terminar()
+        errores = preparacion.resumen()["errores"]
+        log.info("🔥 Calentamiento terminado en %.0f ms%s", (time.perf_counter() - inicio) * 1000,
+                 f" ({len(errores)} etapa(s) con error)" if errores else "")
+
+
+@contextlib.asynccontextmanager
+async def ciclo_de_vida():
+    """Tarea de ciclo de vida: prepara las bases al arrancar cada worker y las cierra al salir.
+
+    Importar la app no toca el disco; así cada worker importa rápido y el trabajo
+    de arranque queda en un solo lugar, fuera del loop de eventos. El calentamiento
+    sigue en segundo plano: hasta que termina, /listo responde 503.
+    """
+    await asyncio.to_thread(iniciar_servicios)
+    if CALENTAR_AL_INICIAR:
+        calentamiento = asyncio.create_task(asyncio.to_thread(calentar))
+    else:
+        preparacion.terminar()
+    try:
+        yield
+    finally:
+        if CALENTAR_AL_INICIAR and not calentamiento.done():
+            # El hilo no se puede interrumpir: esperarlo evita cerrar las bases en pleno uso
+            await asyncio.wait({calentamiento})
+        await asyncio.to_thread(detener_servicios)
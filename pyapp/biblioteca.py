@@ -0,0 +1,187 @@
+import os
+import time
+from typing import Dict, List, Optional
+from .bitacora import obtener_logger
+from .conexiones import GestorConexiones
+
+log = obtener_logger(__name__)
+
+# Límites de retención de la biblioteca (por variable de entorno)
+MAX_DOCUMENTOS = int(os.getenv("BIBLIOTECA_MAX_DOCUMENTOS", "200"))
+DIAS_RETENCION = int(os.getenv("BIBLIOTECA_DIAS", "30"))  # Sin usarse durante este plazo, se borra
+MAX_BYTES_BIBLIOTECA = int(os.getenv("BIBLIOTECA_MAX_MB", "256")) * 1024 * 1024
+
+_COLUMNAS = "huella, nombre, tipo, size, size_original, contenido, creado, usado, usos"
+
+
+class BibliotecaDocumentos:
+    """Documentos ya procesados, compartidos entre sesiones y clientes.
+
+    La biblioteca es global: la app no tiene cuentas de usuario, así que todos los
+    clientes ven y pueden usar los documentos que subieron los demás (el comando
+    `documentos` lo indica). Por eso un cliente nunca borra ni reemplaza documentos
+    ajenos: cada documento se identifica por el SHA-256 del archivo original (el
+    mismo que usa el spool) y las versiones con el mismo nombre conviven, cada una
+    con su huella. Se guarda con su texto ya extraído y comprimido, así que volver
+    a usarlo no requiere subirlo ni extraerlo. La retención se aplica al guardar:
+    primero por antigüedad de uso y luego por cantidad y tamaño, descartando los
+    menos usados recientemente.
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or os.getenv("BIBLIOTECA_DB", "biblioteca.db")
+        self.conexiones = GestorConexiones(self.db_path, tamaño_pool=2, inicializar=self.init_database)
+
+    def iniciar(self):
+        """Crea las tablas (lo llama el ciclo de vida de la app; si no, la primera consulta)."""
+        self.conexiones.iniciar()
+
+    def init_database(self):
+        """Crear las tablas si no existen."""
+        with self.conexiones.escritura() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS documentos (
+                    huella TEXT PRIMARY KEY,
+                    nombre TEXT NOT NULL,
+                    tipo TEXT NOT NULL DEFAULT '',
+                    size INTEGER NOT NULL DEFAULT 0,
+                    size_original INTEGER NOT NULL DEFAULT 0,
+                    contenido TEXT NOT NULL,
+                    creado REAL NOT NULL,
+                    usado REAL NOT NULL,
+                    usos INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documentos_nombre ON documentos (nombre COLLATE NOCASE)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documentos_usado ON documentos (usado)")
+
+    @staticmethod
+    def _fila_a_documento(fila) -> Dict:
+        huella, nombre, tipo, size, size_original, contenido, creado, usado, usos = fila
+        return {
+            "huella": huella,
+            "nombre": nombre,
+            "tipo": tipo,
+            "size": size,
+            "size_original": size_original,
+            "contenido": contenido,
+            "creado": creado,
+            "usado": usado,
+            "usos": usos,
+        }
+
+    def contiene(self, huella: str) -> bool:
+        """Indica si el archivo con esta huella ya está procesado en la biblioteca."""
+        with self.conexiones.lectura() as conn:
+            return conn.execute("SELECT 1 FROM documentos WHERE huella = ?", (huella,)).fetchone() is not None
+
+    def obtener(self, huella: str) -> Optional[Dict]:
+        """Documento por huella (registra el uso), o None si no está."""
+        with self.conexiones.lectura() as conn:
+            fila = conn.execute(f"SELECT {_COLUMNAS} FROM documentos WHERE huella = ?", (huella,)).fetchone()
+        if fila is None:
+            return None
+        self.registrar_uso(huella)
+        return self._fila_a_documento(fila)
+
+    def buscar(self, termino: str) -> List[Dict]:
+        """
+        Documentos que coinciden con `termino`, sin el contenido. Se prueba en orden:
+        prefijo de la huella, nombre exacto, nombre sin extensión y parte del nombre;
+        gana el primer criterio con resultados.
+        """
+        termino = termino.strip()
+        if not termino:
+            return []
+        patron = termino.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        criterios = [
+            ("nombre = ? COLLATE NOCASE", termino),
+            ("nombre LIKE ? ESCAPE '\\'", patron + ".%"),
+            ("nombre LIKE ? ESCAPE '\\'", "%" + patron + "%"),
+        ]
+        if len(termino) >= 6 and all(c in "0123456789abcdef" for c in termino.lower()):
+            criterios.insert(0, ("huella LIKE ?", termino.lower() + "%"))
+
+        with self.conexiones.lectura() as conn:
+            for condicion, valor in criterios:
+                filas = conn.execute(f'''
+                    SELECT huella, nombre, tipo, size, size_original, usado, usos
+                    FROM documentos WHERE {condicion} ORDER BY usado DESC LIMIT 10
+                ''', (valor,)).fetchall()
+                if filas:
+                    return [
+                        {"huella": h, "nombre": n, "tipo": t, "size": s, "size_original": so, "usado": u, "usos": us}
+                        for h, n, t, s, so, u, us in filas
+                    ]
+        return []
+
+    def listar(self, limite: int = 20) -> List[Dict]:
+        """Documentos usados más recientemente, sin el contenido."""
+        with self.conexiones.lectura() as conn:
+            filas = conn.execute('''
+                SELECT huella, nombre, tipo, size, size_original, usado, usos
+                FROM documentos ORDER BY usado DESC LIMIT ?
+            ''', (limite,)).fetchall()
+        return [
+            {"huella": h, "nombre": n, "tipo": t, "size": s, "size_original": so, "usado": u, "usos": us}
+            for h, n, t, s, so, u, us in filas
+        ]
+
+    def total(self) -> Dict[str, int]:
+        """Cantidad de documentos y bytes de texto guardados."""
+        with self.conexiones.lectura() as conn:
+            cantidad, bytes_texto = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length(contenido)), 0) FROM documentos"
+            ).fetchone()
+        return {"documentos": cantidad, "bytes": bytes_texto}
+
+    def guardar(self, huella: str, nombre: str, tipo: str, size: int, contenido: str,
+                size_original: int = 0):
+        """Agrega (o refresca) un documento procesado y aplica la retención."""
+        ahora = time.time()
+
+        def operacion(conn):
+            conn.execute('''
+                INSERT INTO documentos (huella, nombre, tipo, size, size_original, contenido, creado, usado, usos)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1)
+                ON CONFLICT (huella) DO UPDATE SET
+                    contenido = excluded.contenido,
+                    size_original = excluded.size_original,
+                    usado = excluded.usado,
+                    usos = documentos.usos + 1
+            ''', (huella, nombre, tipo or "", size or 0, size_original or 0, contenido, ahora, ahora))
+            return self._aplicar_retencion(conn, ahora)
+
+        eliminados = self.conexiones.escribir(operacion)
+        log.info("📚 Documento guardado en la biblioteca (%s, %d caracteres)", huella[:12], len(contenido))
+        if eliminados:
+            log.info("🧹 Retención de la biblioteca: %d documento(s) eliminados", eliminados)
+
+    def registrar_uso(self, huella: str):
+        """Marca el documento como usado ahora (lo protege de la retención)."""
+        ahora = time.time()
+        self.conexiones.escribir(lambda conn: conn.execute(
+            "UPDATE documentos SET usado = ?, usos = usos + 1 WHERE huella = ?", (ahora, huella)
+        ))
+
+    @staticmethod
+    def _aplicar_retencion(conn, ahora: float) -> int:
+        """Borra lo vencido y lo que exceda cantidad o tamaño (menos usados primero)."""
+        eliminados = conn.execute(
+            "DELETE FROM documentos WHERE usado < ?", (ahora - DIAS_RETENCION * 86400,)
+        ).rowcount
+        eliminados += conn.execute('''
+            DELETE FROM documentos WHERE huella IN (
+                SELECT huella FROM (
+                    SELECT huella,
+                           ROW_NUMBER() OVER (ORDER BY usado DESC) AS posicion,
+                           SUM(length(contenido)) OVER (ORDER BY usado DESC) AS acumulado
+                    FROM documentos
+                ) WHERE posicion > ? OR acumulado > ?
+            )
+        ''', (MAX_DOCUMENTOS, MAX_BYTES_BIBLIOTECA)).rowcount
+        return eliminados
+
+
+# Instancia global
+biblioteca = BibliotecaDocumentos()
@@ -0,0 +1,139 @@
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from typing import Dict
+
+# Nivel mínimo (DEBUG, INFO, WARNING, ERROR). En producción (`reflex run --env prod`)
+# solo se registran advertencias y errores: el resto cuesta una comparación de nivel
+NIVEL = os.getenv("LOG_NIVEL") or ("WARNING" if os.getenv("REFLEX_ENV_MODE") == "prod" else "INFO")
+# "texto" (legible, como los print de siempre) o "json" (una línea JSON por evento)
+FORMATO = os.getenv("LOG_FORMATO", "texto").lower()
+# Eventos frecuentes (por página, párrafo o fila, nivel DEBUG): se registra 1 de cada N
+MUESTREO_CADA = max(1, int(os.getenv("LOG_MUESTREO_CADA", "20")))
+# Mostrar texto de mensajes, respuestas y archivos en los logs ("1"); por defecto solo su largo
+MOSTRAR_CONTENIDO = os.getenv("LOG_CONTENIDO", "0") == "1"
+# Eventos pendientes de escribir como máximo; si la cola se llena se descartan (nunca se espera)
+CAPACIDAD_COLA = int(os.getenv("LOG_COLA", "10000"))
+# Caracteres de contenido que se muestran con LOG_CONTENIDO=1
+LARGO_CONTENIDO = 100
+
+
+class Contenido:
+    """Texto de un usuario o de un archivo: en los logs aparece redactado salvo LOG_CONTENIDO=1.
+
+    Se formatea recién en el hilo que escribe los logs (y solo si el evento pasa el nivel).
+    """
+
+    __slots__ = ("texto",)
+
+    def __init__(self, texto):
+        self.texto = texto or ""
+
+    def __str__(self) -> str:
+        if MOSTRAR_CONTENIDO:
+            recorte = self.texto[:LARGO_CONTENIDO]
+            return recorte + ("…" if len(self.texto) > LARGO_CONTENIDO else "")
+        return f"<{len(self.texto)} caracteres>"
+
+    __repr__ = __str__
+
+
+def contenido(texto) -> Contenido:
+    """Envuelve texto sensible para registrarlo (ver Contenido)."""
+    return Contenido(texto)
+
+
+class _ManejadorCola(logging.handlers.QueueHandler):
+    """Encola el registro tal cual, sin formatearlo ni esperar; si la cola está llena lo descarta."""
+
+    def __init__(self, cola: "queue.Queue"):
+        super().__init__(cola)
+        self.descartados = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # El formateo (y el de los argumentos) queda para el hilo escritor
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por evento: fecha, nivel, módulo, mensaje y los campos de `campos(...)`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        evento = {
+            "ts": round(record.created, 3),
+            "nivel": record.levelname,
+            "modulo": record.name,
+            "mensaje": record.getMessage(),
+        }
+        evento.update(getattr(record, "campos", {}))
+        if record.exc_info:
+            evento["excepcion"] = self.formatException(record.exc_info)
+        return json.dumps(evento, ensure_ascii=False, default=str)
+
+
+def campos(**valores) -> Dict:
+    """Campos estructurados para un evento: `log.info("...", extra=campos(segundos=1.2))`."""
+    return {"campos": valores}
+
+
+_contadores: Dict[str, "itertools.count"] = {}
+_lock_contadores = threading.Lock()
+
+
+def muestrear(logger: logging.Logger, evento: str) -> bool:
+    """
+    Indica si registrar esta ocurrencia de un evento frecuente (una por página, fila...).
+    Sin DEBUG habilitado retorna False sin más costo; con DEBUG, True 1 de cada MUESTREO_CADA.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return False
+    contador = _contadores.get(evento)
+    if contador is None:
+        with _lock_contadores:
+            contador = _contadores.setdefault(evento, itertools.count())
+    return next(contador) % MUESTREO_CADA == 0
+
+
+def _configurar() -> "_ManejadorCola":
+    raiz = logging.getLogger("pyapp")
+    raiz.setLevel(NIVEL.upper())
+    raiz.propagate = False
+
+    salida = logging.StreamHandler(sys.stdout)
+    if FORMATO == "json":
+        salida.setFormatter(FormatoJSON())
+    else:
+        salida.setFormatter(logging.Formatter("%(message)s"))
+
+    cola: "queue.Queue" = queue.Queue(maxsize=CAPACIDAD_COLA)
+    manejador = _ManejadorCola(cola)
+    raiz.addHandler(manejador)
+    escritor = logging.handlers.QueueListener(cola, salida, respect_handler_level=True)
+    escritor.start()
+    atexit.register(escritor.stop)  # Escribe lo pendiente al salir
+    return manejador
+
+
+_manejador = _configurar()
+
+
+def obtener_logger(nombre: str) -> logging.Logger:
+    """Logger de un módulo de la app (`obtener_logger(__name__)`)."""
+    return logging.getLogger(nombre if nombre.startswith("pyapp") else f"pyapp.{nombre}")
+
+
+def descartados() -> int:
+    """Eventos perdidos porque la cola estaba llena."""
+    return _manejador.descartados
@@ -0,0 +1,107 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+# Registros de usuario que se mantienen en memoria (LRU)
+CAPACIDAD_CACHE_USUARIOS = int(os.getenv("CACHE_USUARIOS", "1024"))
+
+# Marca de "este ID no existe" (los IDs AUTOINCREMENT nunca se reutilizan)
+_AUSENTE = object()
+
+
+class CacheUsuarios:
+    """Cache LRU acotada de filas de `usuarios` indexada por ID.
+
+    Se llena al leer y se actualiza (o invalida) en el mismo camino que cada
+    escritura, así los chequeos de existencia y las búsquedas por ID no tocan
+    SQLite. También recuerda los IDs inexistentes.
+
+    Para que una lectura lenta no pise una escritura más nueva, `poblar` recibe la
+    generación tomada antes de leer y descarta la fila si hubo escrituras entre medio.
+    """
+
+    def __init__(self, capacidad: int = CAPACIDAD_CACHE_USUARIOS):
+        self.capacidad = max(1, capacidad)
+        self._filas: "OrderedDict[int, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generacion = 0
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _guardar(self, user_id: int, fila):
+        self._filas[user_id] = fila
+        self._filas.move_to_end(user_id)
+        while len(self._filas) > self.capacidad:
+            self._filas.popitem(last=False)
+
+    def obtener(self, user_id: int) -> Tuple[bool, Optional[tuple]]:
+        """Retorna (encontrado_en_cache, fila). La fila es None si el ID no existe."""
+        with self._lock:
+            fila = self._filas.get(user_id)
+            if fila is None:
+                self.fallos += 1
+                return False, None
+            self._filas.move_to_end(user_id)
+            self.aciertos += 1
+            return True, (None if fila is _AUSENTE else fila)
+
+    def generacion(self) -> int:
+        """Generación actual; tomarla antes de leer de SQLite y pasarla a `poblar`."""
+        with self._lock:
+            return self._generacion
+
+    def poblar(self, user_id: int, fila: Optional[tuple], generacion: int):
+        """Guarda una fila leída de SQLite (None = no existe) si no hubo escrituras desde `generacion`."""
+        with self._lock:
+            if generacion == self._generacion:
+                self._guardar(user_id, _AUSENTE if fila is None else tuple(fila))
+
+    def poblar_varios(self, filas: Iterable[tuple], generacion: int):
+        """Guarda varias filas leídas juntas (por ejemplo, resultados de una búsqueda)."""
+        with self._lock:
+            if generacion == self._generacion:
+                for fila in filas:
+                    self._guardar(fila[0], tuple(fila))
+
+    def escribir(self, fila: tuple):
+        """Write-through: la fila acaba de insertarse o modificarse."""
+        with self._lock:
+            self._generacion += 1
+            self._guardar(fila[0], tuple(fila))
+
+    def eliminar(self, user_id: int):
+        """El usuario fue eliminado: se recuerda como inexistente."""
+        with self._lock:
+            self._generacion += 1
+            self._guardar(user_id, _AUSENTE)
+
+    def invalidar(self, user_ids: Iterable[int]):
+        """Olvida los IDs dados (se vuelven a leer de SQLite la próxima vez)."""
+        with self._lock:
+            self._generacion += 1
+            for user_id in user_ids:
+                self._filas.pop(user_id, None)
+
+    def invalidar_ausentes(self):
+        """Olvida los IDs marcados como inexistentes (tras inserciones masivas)."""
+        with self._lock:
+            self._generacion += 1
+            for user_id in [i for i, fila in self._filas.items() if fila is _AUSENTE]:
+                del self._filas[user_id]
+
+    def limpiar(self):
+        """Vacía la cache."""
+        with self._lock:
+            self._generacion += 1
+            self._filas.clear()
+
+    def estadisticas(self) -> Dict[str, int]:
+        """Contadores de aciertos/fallos y ocupación."""
+        with self._lock:
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "entradas": len(self._filas),
+                "capacidad": self.capacidad,
+            }
@@ -0,0 +1,98 @@
+import asyncio
+import threading
+from typing import Dict, Set
+from .bitacora import obtener_logger
+from .transcript import transcript
+
+log = obtener_logger(__name__)
+
+# Cada cuánto se revisa qué clientes (con trabajo en curso o conversación en memoria) siguen conectados
+INTERVALO_VIGILANCIA = 5  # segundos
+
+
+class TrabajoCancelado(BaseException):
+    """Se lanza dentro de la extracción cuando el cliente cancela.
+
+    Hereda de BaseException (como asyncio.CancelledError) para que los
+    `except Exception` de los extractores no la conviertan en un mensaje de error.
+    """
+
+
+class TareasCliente:
+    """Registro del trabajo en curso de cada cliente para poder cancelarlo.
+
+    Por cada token guarda las tareas asyncio (llamadas al modelo) y una señal
+    de cancelación que revisan los hilos de extracción de archivos.
+    """
+
+    def __init__(self):
+        self._tareas: Dict[str, Set[asyncio.Task]] = {}
+        self._señales: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, token: str, tarea: asyncio.Task):
+        """Registra una tarea del cliente."""
+        with self._lock:
+            self._tareas.setdefault(token, set()).add(tarea)
+
+    def señal(self, token: str) -> threading.Event:
+        """Señal de cancelación vigente del cliente; se renueva si la anterior ya se usó."""
+        with self._lock:
+            señal = self._señales.get(token)
+            if señal is None or señal.is_set():
+                señal = self._señales[token] = threading.Event()
+            return señal
+
+    def liberar(self, token: str, tarea: asyncio.Task):
+        """Quita una tarea terminada del registro."""
+        with self._lock:
+            tareas = self._tareas.get(token)
+            if tareas is not None:
+                tareas.discard(tarea)
+                if not tareas:
+                    del self._tareas[token]
+                    self._señales.pop(token, None)
+
+    def cancelar(self, token: str) -> int:
+        """Cancela todo el trabajo en curso del cliente. Retorna cuántas tareas se cancelaron."""
+        with self._lock:
+            tareas = list(self._tareas.get(token, ()))
+            señal = self._señales.get(token)
+        if señal is not None:
+            señal.set()  # Detiene extracciones en hilos
+        for tarea in tareas:
+            tarea.cancel()
+        return len(tareas)
+
+    def tokens_activos(self) -> Set[str]:
+        """Tokens con trabajo en curso."""
+        with self._lock:
+            return set(self._tareas)
+
+
+# Instancia global
+tareas = TareasCliente()
+
+
+async def vigilar_desconexiones(app_reflex):
+    """Tarea de ciclo de vida: cancela el trabajo de los clientes que se desconectaron
+    y libera su conversación en memoria.
+
+    Un cliente se considera desconectado si falta en dos revisiones seguidas,
+    para tolerar reconexiones breves del websocket.
+    """
+    sospechosos: Set[str] = set()
+    while True:
+        await asyncio.sleep(INTERVALO_VIGILANCIA)
+        namespace = app_reflex.event_namespace
+        if namespace is None:
+            continue
+        conectados = namespace.token_to_sid
+        en_memoria = transcript.tokens_en_memoria()
+        ausentes = {t for t in tareas.tokens_activos() | en_memoria if t not in conectados}
+        for token in ausentes & sospechosos:
+            cancelados = tareas.cancelar(token)
+            if cancelados:
+                log.info("🔌 Cliente desconectado, %d tarea(s) cancelada(s)", cancelados)
+            transcript.limpiar(token)  # La conversación se vuelve a cargar si se reconecta
+        sospechosos = ausentes - sospechosos
@@ -0,0 +1,171 @@
+import re
+from contextvars import ContextVar
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from .trazas import traza
+
+# Primera palabra del mensaje (para descartar rápido lo que no es un comando)
+_PRIMERA_PALABRA = re.compile(r"\s*(\S+)")
+_PALABRA = re.compile(r"\S+")
+# Los comandos se reconocen con o sin acentos: "estadísticas" == "estadisticas"
+_SIN_ACENTOS = str.maketrans("áéíóúüñ", "aeiouun")
+# Token del cliente que envió el mensaje en curso (sesiones admin y estado por cliente).
+# Lo fija el controlador antes de crear la tarea del mensaje; las tareas y el pool
+# de lectores copian el contexto, así llega hasta los manejadores de comandos.
+cliente_actual: ContextVar[str] = ContextVar("cliente_actual", default="local")
+
+# Clave del nodo del trie donde termina una frase (las palabras nunca son vacías)
+_FIN = ""
+
+
+def normalizar(palabra: str) -> str:
+    """Forma canónica de una palabra: minúsculas y sin acentos."""
+    return palabra.lower().translate(_SIN_ACENTOS)
+
+
+class Invocacion:
+    """Mensaje ya tokenizado que recibe el manejador de un comando.
+
+    - `partes`: palabras originales del mensaje completo.
+    - `normalizadas`: las mismas palabras en forma canónica.
+    - `resto`: texto original que sigue a la frase del comando.
+    """
+
+    __slots__ = ("mensaje", "partes", "normalizadas", "largo_frase", "archivo_info",
+                 "_posiciones", "_fin_frase")
+
+    def __init__(self, mensaje: str, partes: List[str], normalizadas: List[str],
+                 posiciones: Dict[str, List[int]], fines: List[int], largo_frase: int,
+                 archivo_info: Optional[Dict] = None):
+        self.mensaje = mensaje
+        self.partes = partes
+        self.normalizadas = normalizadas
+        self.largo_frase = largo_frase
+        self.archivo_info = archivo_info
+        self._posiciones = posiciones
+        self._fin_frase = fines[largo_frase - 1]
+
+    @property
+    def resto(self) -> str:
+        return self.mensaje[self._fin_frase:].strip()
+
+    @property
+    def cliente(self) -> str:
+        """Token del cliente que envió el mensaje."""
+        return cliente_actual.get()
+
+    @property
+    def argumentos(self) -> List[str]:
+        """Palabras originales que siguen a la frase del comando."""
+        return self.partes[self.largo_frase:]
+
+    def tiene(self, palabra: str) -> bool:
+        return normalizar(palabra) in self._posiciones
+
+    def indice(self, palabra: str, desde: int = 0) -> Optional[int]:
+        """Posición de la primera aparición de `palabra` desde `desde`, o None."""
+        for i in self._posiciones.get(normalizar(palabra), ()):
+            if i >= desde:
+                return i
+        return None
+
+    def entero_despues(self, palabra: str, defecto: int) -> int:
+        """Número que sigue a `palabra` (p. ej. "longitud 20"), o `defecto`."""
+        i = self.indice(palabra)
+        if i is None or i + 1 >= len(self.partes):
+            return defecto
+        try:
+            return int(self.partes[i + 1])
+        except ValueError:
+            return defecto
+
+
+class Comando(NamedTuple):
+    frases: Tuple[str, ...]
+    manejador: Callable[[Invocacion], Optional[str]]
+
+
+class RouterComandos:
+    """Enrutador de comandos del chat basado en un trie de palabras clave.
+
+    Cada comando se declara con sus frases ("agregar usuario", "crear usuario") y
+    solo se reconoce al inicio del mensaje, así una pregunta que menciona
+    "estadísticas" sigue yendo al modelo. Los mensajes cuya primera palabra no
+    inicia ninguna frase se descartan sin tokenizar el resto.
+    """
+
+    def __init__(self):
+        self._raiz: Dict[str, dict] = {}
+        self.comandos: List[Comando] = []
+
+    def registrar(self, frases: Tuple[str, ...], manejador: Callable[[Invocacion], Optional[str]]) -> Comando:
+        """Registra un manejador para una o más frases."""
+        comando = Comando(tuple(frases), manejador)
+        for frase in frases:
+            palabras = [normalizar(p) for p in frase.split()]
+            if not palabras:
+                raise ValueError("La frase de un comando no puede estar vacía")
+            nodo = self._raiz
+            for palabra in palabras:
+                nodo = nodo.setdefault(palabra, {})
+            if _FIN in nodo:
+                raise ValueError(f"La frase '{frase}' ya está registrada")
+            nodo[_FIN] = comando
+        self.comandos.append(comando)
+        return comando
+
+    def comando(self, *frases: str):
+        """Decorador: `@router.comando("listar usuarios", "ver usuarios")`."""
+        def decorador(manejador):
+            self.registrar(frases, manejador)
+            return manejador
+        return decorador
+
+    def es_candidato(self, mensaje: str) -> bool:
+        """Descarte rápido: ¿la primera palabra puede iniciar algún comando?"""
+        primera = _PRIMERA_PALABRA.match(mensaje)
+        return primera is not None and normalizar(primera.group(1)) in self._raiz
+
+    def resolver(self, mensaje: str, archivo_info: Optional[Dict] = None) -> Optional[Tuple[Comando, Invocacion]]:
+        """Encuentra el comando (frase más larga) con que empieza el mensaje."""
+        if not self.es_candidato(mensaje):
+            return None
+
+        # Tokenización en una pasada: palabras, forma canónica, posiciones y fin de cada palabra
+        partes: List[str] = []
+        normalizadas: List[str] = []
+        fines: List[int] = []
+        posiciones: Dict[str, List[int]] = {}
+        for i, coincidencia in enumerate(_PALABRA.finditer(mensaje)):
+            palabra = coincidencia.group()
+            canonica = normalizar(palabra)
+            partes.append(palabra)
+            normalizadas.append(canonica)
+            fines.append(coincidencia.end())
+            posiciones.setdefault(canonica, []).append(i)
+
+        nodo = self._raiz
+        encontrado = None
+        for i, palabra in enumerate(normalizadas):
+            nodo = nodo.get(palabra)
+            if nodo is None:
+                break
+            if _FIN in nodo:
+                encontrado = (nodo[_FIN], i + 1)
+        if encontrado is None:
+            return None
+        comando, largo_frase = encontrado
+        return comando, Invocacion(mensaje, partes, normalizadas, posiciones, fines, largo_frase, archivo_info)
+
+    def despachar(self, mensaje: str, archivo_info: Optional[Dict] = None) -> Optional[str]:
+        """Ejecuta el comando del mensaje. Retorna None si el mensaje no es un comando."""
+        with traza("comandos.despachar") as span:
+            resultado = self.resolver(mensaje, archivo_info)
+            if resultado is None:
+                return None
+            comando, invocacion = resultado
+            span.atributos["comando"] = comando.frases[0]
+            return comando.manejador(invocacion)
+
+
+# Instancia global
+router = RouterComandos()
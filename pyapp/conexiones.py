@@ -0,0 +1,245 @@
+import asyncio
+import contextvars
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional
+
+# Máximo de operaciones de escritura confirmadas juntas en un mismo commit
+MAX_LOTE_ESCRITURA = 64
+
+
+class GestorConexiones:
+    """Pool de conexiones SQLite reutilizables en modo WAL.
+
+    - Lecturas: un pool pequeño de conexiones de solo lectura que pueden usarse en paralelo.
+    - Escrituras: una única conexión protegida por un lock, con transacciones
+      `BEGIN IMMEDIATE` para que nunca haya que "subir" un bloqueo de lectura a escritura.
+    - Todas las conexiones tienen busy timeout y cache de sentencias preparadas.
+    
+    API asíncrona: `escribir_async` encola la operación en un hilo escritor dedicado
+    que agrupa todo lo pendiente en una sola transacción (group commit, un fsync por
+    lote) y `leer_async` corre la lectura en un pool de hilos lectores. Así el loop
+    de eventos nunca espera a SQLite.
+
+    Crear el gestor no abre nada: la base (y `inicializar`, que crea las tablas) se
+    prepara en `iniciar()`, que el arranque de la app llama explícitamente y que,
+    si no, corre sola con la primera operación.
+    """
+
+    def __init__(self, db_path: str, tamaño_pool: int = 4, busy_timeout_ms: int = 5000,
+                 cache_sentencias: int = 128, inicializar: Optional[Callable[[], None]] = None):
+        self.db_path = db_path
+        self._inicializar = inicializar
+        self._iniciada = False
+        self._iniciando = False
+        self._lock_inicio = threading.RLock()
+        self.tamaño_pool = max(1, tamaño_pool)
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_sentencias = cache_sentencias
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._creadas = 0
+        self._lock_pool = threading.Lock()
+        self._lock_escritura = threading.RLock()
+        self._conexion_escritura = None
+        self._todas: List[sqlite3.Connection] = []
+        self._cola_escritura: "queue.Queue" = queue.Queue()
+        self._hilo_escritor = None
+        self._ejecutor_lectura = None
+
+    def iniciar(self):
+        """Prepara la base una sola vez (idempotente y segura entre hilos)."""
+        if self._iniciada:
+            return
+        with self._lock_inicio:
+            # `inicializar` usa escritura(), que vuelve a pasar por aquí desde el mismo hilo
+            if self._iniciada or self._iniciando:
+                return
+            self._iniciando = True
+            try:
+                if self._inicializar is not None:
+                    self._inicializar()
+                self._iniciada = True
+            finally:
+                self._iniciando = False
+
+    @property
+    def iniciada(self) -> bool:
+        return self._iniciada
+
+    def _conectar(self, solo_lectura: bool = False) -> sqlite3.Connection:
+        """Abre una conexión configurada (WAL, pragmas y busy timeout)."""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=self.cache_sentencias,
+            isolation_level=None,  # Transacciones explícitas
+        )
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")  # Seguro en WAL, sin fsync por commit
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA cache_size = -8000")  # ~8 MB de cache de páginas
+        conn.execute("PRAGMA foreign_keys = ON")
+        if solo_lectura:
+            conn.execute("PRAGMA query_only = ON")
+        self._todas.append(conn)
+        return conn
+
+    def _tomar_lectura(self) -> sqlite3.Connection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock_pool:
+            if self._creadas < self.tamaño_pool:
+                self._creadas += 1
+                return self._conectar(solo_lectura=True)
+        return self._pool.get()
+
+    @contextmanager
+    def lectura(self) -> Iterator[sqlite3.Connection]:
+        """Presta una conexión de solo lectura del pool."""
+        self.iniciar()
+        conn = self._tomar_lectura()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._pool.put(conn)
+
+    @contextmanager
+    def escritura(self) -> Iterator[sqlite3.Connection]:
+        """Ejecuta el bloque dentro de una transacción de escritura (commit o rollback automático)."""
+        self.iniciar()
+        with self._lock_escritura:
+            if self._conexion_escritura is None:
+                self._conexion_escritura = self._conectar()
+            conn = self._conexion_escritura
+            if conn.in_transaction:
+                # Escritura anidada dentro del mismo hilo: se suma a la transacción en curso
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            else:
+                conn.execute("COMMIT")
+
+    # ---------- Escritor dedicado con group commit ----------
+
+    def ejecutar_escritura(self, operacion: Callable[[sqlite3.Connection], Any]) -> Future:
+        """
+        Encola `operacion(conn)` para el hilo escritor y retorna un Future con su resultado.
+        La operación corre dentro de un SAVEPOINT propio: si falla, se deshace solo ella
+        y el resto del lote se confirma igual.
+        """
+        futuro: Future = Future()
+        self.iniciar()
+        self._asegurar_escritor()
+        self._cola_escritura.put((operacion, futuro))
+        return futuro
+
+    def escribir(self, operacion: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Versión bloqueante de ejecutar_escritura (para código que ya corre en un hilo)."""
+        if threading.current_thread() is self._hilo_escritor:
+            # Llamada anidada desde otra operación: ya estamos dentro del lote
+            return operacion(self._conexion_escritura)
+        return self.ejecutar_escritura(operacion).result()
+
+    async def escribir_async(self, operacion: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Espera el resultado de una escritura sin bloquear el loop de eventos."""
+        return await asyncio.wrap_future(self.ejecutar_escritura(operacion))
+
+    async def leer_async(self, operacion: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Ejecuta `operacion(conn)` con una conexión de lectura en el pool de hilos lectores."""
+        def leer():
+            with self.lectura() as conn:
+                return operacion(conn)
+        return await self.en_pool_lectura(leer)
+
+    async def en_pool_lectura(self, funcion: Callable[[], Any]) -> Any:
+        """Corre una función bloqueante en el pool de hilos lectores (con el contexto actual)."""
+        loop = asyncio.get_running_loop()
+        contexto = contextvars.copy_context()  # run_in_executor no propaga contextvars
+        return await loop.run_in_executor(self._pool_lectura(), contexto.run, funcion)
+
+    def _pool_lectura(self) -> ThreadPoolExecutor:
+        with self._lock_pool:
+            if self._ejecutor_lectura is None:
+                # Más hilos que conexiones: algunos pueden estar esperando una escritura
+                self._ejecutor_lectura = ThreadPoolExecutor(
+                    max_workers=self.tamaño_pool * 2, thread_name_prefix="sqlite-lector"
+                )
+            return self._ejecutor_lectura
+
+    def _asegurar_escritor(self):
+        if self._hilo_escritor is None:
+            with self._lock_pool:
+                if self._hilo_escritor is None:
+                    self._hilo_escritor = threading.Thread(
+                        target=self._bucle_escritor, name="sqlite-escritor", daemon=True
+                    )
+                    self._hilo_escritor.start()
+
+    def _bucle_escritor(self):
+        """Toma todo lo encolado (hasta MAX_LOTE_ESCRITURA) y lo confirma en una transacción."""
+        while True:
+            lote = [self._cola_escritura.get()]
+            while len(lote) < MAX_LOTE_ESCRITURA:
+                try:
+                    lote.append(self._cola_escritura.get_nowait())
+                except queue.Empty:
+                    break
+
+            resultados = []
+            try:
+                with self.escritura() as conn:
+                    for numero, (operacion, futuro) in enumerate(lote):
+                        if not futuro.set_running_or_notify_cancel():
+                            resultados.append(None)
+                            continue
+                        conn.execute(f"SAVEPOINT op_{numero}")
+                        try:
+                            resultados.append((True, operacion(conn)))
+                            conn.execute(f"RELEASE op_{numero}")
+                        except BaseException as e:
+                            conn.execute(f"ROLLBACK TO op_{numero}")
+                            conn.execute(f"RELEASE op_{numero}")
+                            resultados.append((False, e))
+            except BaseException as e:
+                # Falló el commit: ninguna operación del lote quedó confirmada
+                for _, futuro in lote:
+                    if futuro.running():
+                        futuro.set_exception(e)
+                continue
+
+            # Los resultados se entregan recién después del commit
+            for (_, futuro), resultado in zip(lote, resultados):
+                if resultado is None:
+                    continue
+                exito, valor = resultado
+                if exito:
+                    futuro.set_result(valor)
+                else:
+                    futuro.set_exception(valor)
+
+    def cerrar(self):
+        """Cierra todas las conexiones abiertas."""
+        with self._lock_escritura, self._lock_pool:
+            for conn in self._todas:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._todas.clear()
+            self._conexion_escritura = None
+            self._pool = queue.LifoQueue()
+            self._creadas = 0
@@ -1,15 +1,57 @@
 import reflex as rx
 from typing import List, Dict, Any
+import asyncio
 import base64
-import time
+import hashlib
 from .models import GeminiModel
+from .biblioteca import biblioteca
+from .bitacora import contenido, obtener_logger
+from .extractores import detectar_formato, registro
+from .cancelacion import TrabajoCancelado, tareas
+from .comandos import cliente_actual
+from .transcript import transcript
+from .trazas import iniciar_span, traza
+from .memoria import (
+    LIMITE_ESTADO_BYTES,
+    MAX_TEXTO_VENTANA,
+    formatear_bytes,
+    guardar_en_spool,
+    tamaño_serializado,
+)
+
+log = obtener_logger(__name__)
+
+# Cantidad máxima de mensajes que se mantienen en el estado (y se envían al navegador).
+# La ventana es de tamaño fijo: "cargar anteriores" descarta los más nuevos y "cargar
+# posteriores" los más viejos. No hay virtualización de la lista: cada mensaje de la
+# ventana está en el estado serializado y en el DOM (solo `content-visibility` evita
+# pintar los que no se ven), por eso el límite es lo que acota la memoria del cliente
+VENTANA_MENSAJES = 40
+# Cantidad de mensajes que trae cada "cargar anteriores" / "cargar posteriores"
+PAGINA_ANTERIORES = 20
 
 class Estado(rx.State):
     mensaje: str = ""
-    mensajes: List[Dict] = []
+    mensajes: List[Dict] = []  # Solo la ventana visible; el historial completo vive en `transcript`
+    inicio_ventana: int = 0  # Índice en el historial completo del primer mensaje visible
+    total_mensajes: int = 0  # Mensajes del historial completo
     cargando: bool = False
     archivo_adjunto: Dict[str, Any] = {}
     mostrar_adjunto: bool = False
+    # Contabilidad de memoria del cliente (ver _aplicar_limites)
+    bytes_estado: int = 0
+    bytes_cache: int = 0
+    aviso_memoria: str = ""
+
+    @rx.var
+    def hay_anteriores(self) -> bool:
+        """Indica si hay mensajes anteriores a la ventana visible."""
+        return self.inicio_ventana > 0
+
+    @rx.var
+    def hay_posteriores(self) -> bool:
+        """Indica si la ventana no llega hasta el mensaje más reciente."""
+        return self.inicio_ventana + len(self.mensajes) < self.total_mensajes
 
     @rx.var
     def tamaño_archivo_formateado(self) -> str:
@@ -19,181 +61,382 @@ class Estado(rx.State):
             return f"({size_kb:.1f} KB)"
         return ""
 
+    @rx.var
+    def uso_memoria(self) -> str:
+        """Uso de memoria del cliente: estado serializado y caches del modelo."""
+        return f"Estado: {formatear_bytes(self.bytes_estado)} · Cache modelo: {formatear_bytes(self.bytes_cache)}"
+
     @rx.event
     async def handle_upload(self, files: List[rx.UploadFile]):
         """Manejar la subida de archivos usando el patrón oficial de Reflex."""
-        print("=== UPLOAD HANDLER LLAMADO (PATRÓN OFICIAL) ===")
-        print(f"📁 Archivos recibidos: {len(files)}")
+        with traza("handle_upload", archivos=len(files)) as solicitud:
+            log.debug("=== UPLOAD HANDLER LLAMADO (PATRÓN OFICIAL) ===")
+            log.debug("📁 Archivos recibidos: %d", len(files))
         
-        if not files:
-            print("❌ No se recibieron archivos")
-            return
+            if not files:
+                log.warning("❌ No se recibieron archivos")
+                return
         
-        # Tomar solo el primer archivo
-        file = files[0]
-        print(f"📄 Procesando archivo: {file.name}")  # Cambiado de filename a name
-        print(f"🏷️  Tipo: {file.content_type}")
+            # Tomar solo el primer archivo
+            file = files[0]
+            log.info("📄 Procesando archivo %s (%s)", contenido(file.name), file.content_type)
         
-        # Leer el archivo para obtener el tamaño
-        upload_data = await file.read()
-        file_size = len(upload_data)
-        print(f"📏 Tamaño: {file_size} bytes")
+            # Leer el archivo para obtener el tamaño
+            with traza("upload.leer"):
+                upload_data = await file.read()
+            file_size = len(upload_data)
+            solicitud.atributos["bytes"] = file_size
+            log.debug("📏 Tamaño: %d bytes", file_size)
         
-        # Validar tipos de archivo soportados
-        extensiones_soportadas = ['.pdf', '.docx', '.xlsx', '.xls', '.txt']
-        extension = '.' + file.name.split('.')[-1].lower() if '.' in file.name else ''
+            # Validar tipos de archivo soportados
+            extensiones_soportadas = ['.pdf', '.docx', '.xlsx', '.xls', '.txt', '.log', '.csv', '.tsv']
+            extension = '.' + file.name.split('.')[-1].lower() if '.' in file.name else ''
         
-        print(f"🔍 Extensión detectada: {extension}")
+            log.debug("🔍 Extensión detectada: %s", extension)
         
-        if extension not in extensiones_soportadas:
-            print(f"❌ Extensión no soportada: {extension}")
-            self.mensajes.append({
-                "texto": f"Tipo de archivo no soportado: {file.name}. Solo se admiten archivos PDF, DOCX, XLSX y TXT.",
-                "es_usuario": False
-            })
-            return
+            # Extensión desconocida: se acepta si el contenido es de un formato que sabemos leer
+            formato = None
+            if extension not in extensiones_soportadas:
+                formato = detectar_formato(upload_data, file.name, file.content_type or "")
+                if registro.soporta(formato):
+                    log.info("🔍 Contenido reconocido como %s", formato)
         
-        # Validar tamaño del archivo (máximo 10MB)
-        max_size = 10 * 1024 * 1024  # 10MB en bytes
-        if file_size > max_size:
-            print(f"❌ Archivo demasiado grande: {file_size} bytes (máximo: {max_size} bytes)")
-            self.mensajes.append({
-                "texto": f"El archivo {file.name} es demasiado grande. El tamaño máximo permitido es 10MB.",
-                "es_usuario": False
-            })
-            return
+            if extension not in extensiones_soportadas and not registro.soporta(formato):
+                log.warning("❌ Extensión no soportada: %s", extension)
+                await self._agregar_mensaje({
+                    "texto": f"Tipo de archivo no soportado: {file.name}. Solo se admiten archivos PDF, DOCX, XLSX, TXT, LOG, CSV y TSV.",
+                    "es_usuario": False
+                })
+                return
         
-        print("✅ Validaciones pasadas correctamente")
+            # Validar tamaño del archivo (máximo 10MB)
+            max_size = 10 * 1024 * 1024  # 10MB en bytes
+            if file_size > max_size:
+                log.warning("❌ Archivo demasiado grande: %d bytes (máximo: %d bytes)", file_size, max_size)
+                await self._agregar_mensaje({
+                    "texto": f"El archivo {file.name} es demasiado grande. El tamaño máximo permitido es 10MB.",
+                    "es_usuario": False
+                })
+                return
         
-        try:
-            print("📖 Procesando contenido del archivo...")
-            
-            # Convertir a base64 para almacenar
-            content_base64 = base64.b64encode(upload_data).decode('utf-8')
-            data_url = f"data:{file.content_type or 'application/octet-stream'};base64,{content_base64}"
-            
-            # Guardar información del archivo
-            self.archivo_adjunto = {
-                "name": file.name,
-                "type": file.content_type or "",
-                "size": file_size,
-                "content": data_url
-            }
+            log.debug("✅ Validaciones pasadas correctamente")
+        
+            try:
+                log.debug("📖 Procesando contenido del archivo...")
             
-            # Mostrar el nombre del archivo adjunto
-            self.mostrar_adjunto = True
-            print(f"✅ Archivo guardado y listo para enviar: {file.name}")
+                # Guardar información del archivo
+                huella = hashlib.sha256(upload_data).hexdigest()
+                self.archivo_adjunto = {
+                    "name": file.name,
+                    "type": file.content_type or "",
+                    "size": file_size,
+                    "huella": huella,
+                }
             
-            # Limpiar archivos seleccionados
-            yield rx.clear_selected_files("file_upload")
+                # El data URL ocupa ~4/3 del archivo; si no entra en el límite del estado, va a disco
+                tamaño_data_url = 4 * ((file_size + 2) // 3)
+                if await asyncio.to_thread(biblioteca.contiene, huella):
+                    # Ya procesado antes: el texto sale de la biblioteca, sin base64 en el estado
+                    await asyncio.to_thread(guardar_en_spool, upload_data)
+                    self.archivo_adjunto["en_spool"] = True
+                    log.info("📚 Archivo ya presente en la biblioteca")
+                elif self._bytes_estado() + tamaño_data_url > LIMITE_ESTADO_BYTES:
+                    await asyncio.to_thread(guardar_en_spool, upload_data)
+                    self.archivo_adjunto["en_spool"] = True
+                    log.info("💽 Archivo descargado a disco (fuera del estado, %d bytes)", file_size)
+                else:
+                    # Convertir a base64 para almacenar
+                    with traza("base64.codificar", bytes=file_size):
+                        content_base64 = base64.b64encode(upload_data).decode('utf-8')
+                    self.archivo_adjunto["content"] = f"data:{file.content_type or 'application/octet-stream'};base64,{content_base64}"
+                await self._aplicar_limites()
             
-        except Exception as e:
-            error_msg = f"Error al procesar el archivo: {str(e)}"
-            print(f"❌ {error_msg}")
-            self.mensajes.append({
-                "texto": error_msg,
-                "es_usuario": False
-            })
+                # Mostrar el nombre del archivo adjunto
+                self.mostrar_adjunto = True
+                log.info("✅ Archivo guardado y listo para enviar")
+            
+                # Limpiar archivos seleccionados
+                with traza("ui.yield", activar=False):
+                    yield rx.clear_selected_files("file_upload")
+            
+            except Exception as e:
+                error_msg = f"Error al procesar el archivo: {str(e)}"
+                log.error("❌ %s", error_msg)
+                await self._agregar_mensaje({
+                    "texto": error_msg,
+                    "es_usuario": False
+                })
 
+    @rx.event(background=True)
     async def enviar_mensaje(self):
-        print("=== INICIANDO ENVÍO DE MENSAJE ===")
-        inicio_tiempo = time.time()
+        """
+        Envía el mensaje al modelo. Corre como tarea en segundo plano para que el
+        cliente pueda seguir enviando eventos (por ejemplo, cancelar) mientras espera.
+        """
+        log.debug("=== INICIANDO ENVÍO DE MENSAJE ===")
+        solicitud = iniciar_span("enviar_mensaje")  # Raíz de la traza; la tarea del modelo la hereda
         
-        # No procesar si no hay mensaje o si ya está cargando
-        mensaje_vacio = len(self.mensaje.strip()) == 0
-        archivo_vacio = len(self.archivo_adjunto) == 0
-        
-        print(f"Mensaje vacío: {mensaje_vacio}")
-        print(f"Archivo vacío: {archivo_vacio}")
-        print(f"Cargando: {self.cargando}")
-        
-        # Usar rx.cond para evaluar condiciones con variables de estado
-        if mensaje_vacio and archivo_vacio or self.cargando:
-            print("❌ No se puede enviar: mensaje y archivo vacíos o ya está cargando")
-            return
+        async with self:
+            # No procesar si no hay mensaje o si ya está cargando
+            mensaje_vacio = len(self.mensaje.strip()) == 0
+            archivo_vacio = len(self.archivo_adjunto) == 0
+            
+            log.debug("Mensaje vacío: %s, archivo vacío: %s, cargando: %s", mensaje_vacio, archivo_vacio, self.cargando)
+            
+            if mensaje_vacio and archivo_vacio or self.cargando:
+                log.info("❌ No se puede enviar: mensaje y archivo vacíos o ya está cargando")
+                solicitud.terminar()
+                return
 
-        # Poner en estado de carga
-        self.cargando = True
-        
-        # Preparar el mensaje con o sin archivo adjunto
-        texto_mensaje = self.mensaje.strip()
-        tiene_adjunto = bool(self.archivo_adjunto)
-        
-        print(f"📝 Texto del mensaje: '{texto_mensaje}'")
-        print(f"📎 Tiene archivo adjunto: {tiene_adjunto}")
-        
-        if tiene_adjunto:
-            print(f"📄 Archivo adjunto:")
-            print(f"  - Nombre: {self.archivo_adjunto.get('name', 'N/A')}")
-            print(f"  - Tipo: {self.archivo_adjunto.get('type', 'N/A')}")
-            print(f"  - Tamaño: {self.archivo_adjunto.get('size', 0)} bytes")
-        
-        # Crear el mensaje para mostrar al usuario
-        mensaje_usuario = {
-            "texto": texto_mensaje,
-            "es_usuario": True,
-            "tiene_adjunto": tiene_adjunto,
-            "nombre_archivo": self.archivo_adjunto.get("name", "") if tiene_adjunto else ""
-        }
-        
-        # Agregar mensaje del usuario a la lista
-        self.mensajes.append(mensaje_usuario)
-        print("✅ Mensaje del usuario agregado a la lista")
-        
-        # Guardar el mensaje para enviarlo a la API y limpiar el input
-        mensaje_enviado = texto_mensaje
-        self.mensaje = ""
-        
-        # Guardar archivo para enviar y limpiar después
-        archivo_para_enviar = self.archivo_adjunto.copy() if tiene_adjunto else None
-        self.archivo_adjunto = {}
-        self.mostrar_adjunto = False
-        
-        print("🧹 Estado limpiado (mensaje e input)")
-        
-        yield # Actualiza la UI para mostrar el mensaje del usuario y el spinner
+            # Poner en estado de carga
+            self.cargando = True
+            token = self.router.session.client_token
+            
+            # Preparar el mensaje con o sin archivo adjunto
+            texto_mensaje = self.mensaje.strip()
+            tiene_adjunto = bool(self.archivo_adjunto)
+            solicitud.atributos["adjunto"] = tiene_adjunto
+            
+            log.info("📝 Mensaje %s, adjunto: %s", contenido(texto_mensaje), tiene_adjunto)
+            
+            if tiene_adjunto:
+                log.debug("📄 Archivo adjunto %s (%s, %d bytes)", contenido(self.archivo_adjunto.get("name", "")),
+                          self.archivo_adjunto.get("type", "N/A"), self.archivo_adjunto.get("size", 0))
+            
+            # Crear el mensaje para mostrar al usuario
+            mensaje_usuario = {
+                "texto": texto_mensaje,
+                "es_usuario": True,
+                "tiene_adjunto": tiene_adjunto,
+                "nombre_archivo": self.archivo_adjunto.get("name", "") if tiene_adjunto else ""
+            }
+            
+            # Agregar mensaje del usuario a la lista
+            await self._agregar_mensaje(mensaje_usuario)
+            if tiene_adjunto:
+                transcript.registrar_documento(
+                    token,
+                    self.archivo_adjunto.get("name", ""),
+                    self.archivo_adjunto.get("type", ""),
+                    self.archivo_adjunto.get("size", 0),
+                )
+            log.debug("✅ Mensaje del usuario agregado a la lista")
+            
+            # Guardar el mensaje para enviarlo a la API y limpiar el input
+            mensaje_enviado = texto_mensaje
+            self.mensaje = ""
+            
+            # Guardar archivo para enviar y limpiar después
+            archivo_para_enviar = self.archivo_adjunto.copy() if tiene_adjunto else None
+            self.archivo_adjunto = {}
+            self.mostrar_adjunto = False
+            
+            log.debug("🧹 Estado limpiado (mensaje e input)")
+        # Al salir del bloque la UI muestra el mensaje del usuario y el spinner
 
+        tarea = None
         try:
-            print("🤖 Enviando a Gemini...")
-            tiempo_inicio_gemini = time.time()
+            log.debug("🤖 Enviando a Gemini...")
             
-            # Obtener respuesta del modelo
+            # Obtener respuesta del modelo en una tarea propia, registrada para poder cancelarla
             if tiene_adjunto and archivo_para_enviar:
-                print("📎 Enviando mensaje CON archivo adjunto")
-                respuesta = await GeminiModel.generar_respuesta(
-                    mensaje_enviado, 
-                    archivo_para_enviar
-                )
+                log.debug("📎 Enviando mensaje CON archivo adjunto")
             else:
-                print("💬 Enviando mensaje SIN archivo adjunto")
-                respuesta = await GeminiModel.generar_respuesta(mensaje_enviado)
+                log.debug("💬 Enviando mensaje SIN archivo adjunto")
+            señal_cancelacion = tareas.señal(token)
+            cliente_actual.set(token)  # La tarea hereda el cliente (sesión admin propia)
+            with traza("generar_respuesta"):
+                tarea = asyncio.create_task(
+                    GeminiModel.generar_respuesta(mensaje_enviado, archivo_para_enviar, señal_cancelacion)
+                )
+                tareas.registrar(token, tarea)
+                respuesta = await tarea
             
-            tiempo_respuesta = time.time() - tiempo_inicio_gemini
-            print(f"⏱️  TIEMPO DE RESPUESTA DE GEMINI: {tiempo_respuesta:.2f} segundos")
-            print(f"✅ Respuesta recibida de Gemini (longitud: {len(respuesta)} caracteres)")
-            print(f"📄 Primeros 100 caracteres: {respuesta[:100]}...")
+            log.info("✅ Respuesta recibida de Gemini (%d caracteres): %s", len(respuesta), contenido(respuesta))
             
             # Agregar respuesta de la IA a la lista
-            self.mensajes.append({"texto": respuesta, "es_usuario": False})
-            print("✅ Respuesta de IA agregada a la lista")
+            with traza("ui.actualizar"):
+                async with self:
+                    await self._agregar_mensaje({"texto": respuesta, "es_usuario": False})
+            log.debug("✅ Respuesta de IA agregada a la lista")
+            
+        except (asyncio.CancelledError, TrabajoCancelado):
+            log.info("⏹️  Generación cancelada por el cliente")
+            async with self:
+                await self._agregar_mensaje({"texto": "⏹️ Generación cancelada.", "es_usuario": False})
             
         except Exception as e:
             error_msg = f"Error al procesar la solicitud: {str(e)}"
-            print(f"❌ ERROR: {error_msg}")
-            self.mensajes.append({"texto": error_msg, "es_usuario": False})
+            log.error("❌ ERROR: %s", error_msg)
+            solicitud.error = error_msg
+            async with self:
+                await self._agregar_mensaje({"texto": error_msg, "es_usuario": False})
             
         finally:
+            if tarea is not None:
+                tareas.liberar(token, tarea)
             # Quitar estado de carga
-            self.cargando = False
-            tiempo_total = time.time() - inicio_tiempo
-            print(f"⏱️  TIEMPO TOTAL DEL PROCESO: {tiempo_total:.2f} segundos")
-            print("🏁 Proceso completado, carga finalizada")
-            yield # Actualiza la UI para mostrar el mensaje de la IA
+            async with self:
+                self.cargando = False
+                await self._aplicar_limites()
+            log.debug("🏁 Proceso completado, carga finalizada")
             
             # Ejecutar el script para hacer scroll después de que todo se renderizó
-            yield rx.call_script(
-                "document.getElementById('chat-container').scrollTop = document.getElementById('chat-container').scrollHeight"
-            )
+            try:
+                with traza("ui.yield", activar=False):
+                    yield rx.call_script(
+                        "document.getElementById('chat-container').scrollTop = document.getElementById('chat-container').scrollHeight"
+                    )
+            finally:
+                solicitud.terminar()  # Registra el resumen de tiempos y exporta la traza
+
+    @rx.event(background=True)
+    async def cancelar_generacion(self):
+        """Cancela la generación, la extracción y cualquier trabajo pendiente de este cliente."""
+        cancelados = tareas.cancelar(self.router.session.client_token)
+        log.info("⏹️  Cancelación solicitada: %d tarea(s)", cancelados)
+
+    async def _agregar_mensaje(self, mensaje: Dict):
+        """
+        Agrega un mensaje al historial completo y a la ventana visible, recortándola.
+        El historial se toca en un hilo: cargar una conversación fría lee SQLite.
+        """
+        token = self.router.session.client_token
+        indice = await asyncio.to_thread(transcript.agregar, token, dict(mensaje))
+        if self.inicio_ventana + len(self.mensajes) < indice:
+            # La ventana estaba en mensajes anteriores: vuelve al final de la conversación
+            self.mensajes = await asyncio.to_thread(transcript.rango, token, indice + 1 - VENTANA_MENSAJES, indice)
+        self.mensajes.append(mensaje)
+        self.total_mensajes = indice + 1
+        if len(self.mensajes) > VENTANA_MENSAJES:
+            self.mensajes = self.mensajes[-VENTANA_MENSAJES:]
+        self.inicio_ventana = indice + 1 - len(self.mensajes)
+
+    async def restaurar_conversacion(self):
+        """Al cargar la página, recupera la ventana reciente desde el almacén persistente.
+
+        Cubre reinicios del backend y reconexiones a otro worker: la conversación se
+        retoma sin que el usuario tenga que volver a subir archivos ni a preguntar.
+        """
+        if self.mensajes:
+            return
+        token = self.router.session.client_token
+        total = await asyncio.to_thread(transcript.total, token)
+        if total == 0:
+            return
+        log.info("♻️  Restaurando conversación (%d mensajes guardados)", total)
+        self.mensajes = await asyncio.to_thread(transcript.recientes, token, VENTANA_MENSAJES)
+        self.inicio_ventana = total - len(self.mensajes)
+        self.total_mensajes = total
+        # El historial del modelo se siembra solo si el estado compartido no tiene uno
+        cliente_actual.set(token)
+        historial = await asyncio.to_thread(transcript.historial_modelo, token)
+        await asyncio.to_thread(GeminiModel.restaurar_sesion, historial)
+        await self._aplicar_limites()
+
+    async def cargar_anteriores(self):
+        """Trae la página de mensajes anterior a la ventana visible y descarta los más nuevos."""
+        if self.inicio_ventana <= 0:
+            return
+        desde = max(0, self.inicio_ventana - PAGINA_ANTERIORES)
+        anteriores = await asyncio.to_thread(
+            transcript.rango, self.router.session.client_token, desde, self.inicio_ventana
+        )
+        self.mensajes = (anteriores + self.mensajes)[:VENTANA_MENSAJES]
+        self.inicio_ventana = desde
+        await self._aplicar_limites()
+
+    async def cargar_posteriores(self):
+        """Trae la página de mensajes posterior a la ventana visible y descarta los más viejos."""
+        fin = self.inicio_ventana + len(self.mensajes)
+        if fin >= self.total_mensajes:
+            return
+        posteriores = await asyncio.to_thread(
+            transcript.rango, self.router.session.client_token, fin, fin + PAGINA_ANTERIORES
+        )
+        ventana = self.mensajes + posteriores
+        descartados = max(0, len(ventana) - VENTANA_MENSAJES)
+        self.mensajes = ventana[descartados:]
+        self.inicio_ventana += descartados
+        await self._aplicar_limites()
+
+    def _bytes_estado(self) -> int:
+        """Tamaño serializado de los campos del estado que crecen con el uso."""
+        return tamaño_serializado({
+            "mensaje": self.mensaje,
+            "mensajes": self.mensajes,
+            "archivo_adjunto": self.archivo_adjunto,
+        })
+
+    async def _aplicar_limites(self):
+        """
+        Mide el estado y los caches del modelo y aplica los límites configurados.
+        Primero descarga el adjunto a disco, luego recorta los mensajes más grandes
+        de la ventana (el texto completo sigue en el historial) y por último achica
+        la ventana. Si hubo que intervenir, deja un aviso visible para el usuario.
+        """
+        avisos = []
+        bytes_estado = self._bytes_estado()
+        
+        if bytes_estado > LIMITE_ESTADO_BYTES and self.archivo_adjunto.get("content"):
+            contenido = self.archivo_adjunto["content"].split(",", 1)[-1]
+            adjunto = {k: v for k, v in self.archivo_adjunto.items() if k != "content"}
+            # Decodificar y escribir hasta ~10 MB: fuera del loop
+            adjunto["huella"] = await asyncio.to_thread(lambda: guardar_en_spool(base64.b64decode(contenido)))
+            adjunto["en_spool"] = True
+            self.archivo_adjunto = adjunto
+            bytes_estado = self._bytes_estado()
+        
+        if bytes_estado > LIMITE_ESTADO_BYTES:
+            # Recortar los mensajes más largos de la ventana, de mayor a menor
+            por_tamaño = sorted(range(len(self.mensajes)), key=lambda i: len(self.mensajes[i]["texto"]), reverse=True)
+            for i in por_tamaño:
+                texto = self.mensajes[i]["texto"]
+                if len(texto) <= MAX_TEXTO_VENTANA:
+                    break
+                self.mensajes[i] = {
+                    **self.mensajes[i],
+                    "texto": texto[:MAX_TEXTO_VENTANA] + "\n\n[… mensaje recortado en pantalla por límite de memoria]",
+                }
+                bytes_estado -= len(texto) - MAX_TEXTO_VENTANA
+                if bytes_estado <= LIMITE_ESTADO_BYTES:
+                    break
+            avisos.append("se recortaron mensajes largos en pantalla")
+            bytes_estado = self._bytes_estado()
+        
+        if bytes_estado > LIMITE_ESTADO_BYTES and len(self.mensajes) > 1:
+            # Achicar la ventana: los mensajes siguen disponibles con "Cargar mensajes anteriores"
+            while bytes_estado > LIMITE_ESTADO_BYTES and len(self.mensajes) > 1:
+                bytes_estado -= tamaño_serializado(self.mensajes[0])
+                self.mensajes = self.mensajes[1:]
+                self.inicio_ventana += 1
+            avisos.append("se ocultaron mensajes antiguos")
+            bytes_estado = self._bytes_estado()
+        
+        # Caches del modelo de este cliente (estado compartido en SQLite): fuera del loop.
+        # to_thread copia el contexto, así que el hilo ve el cliente_actual fijado aquí
+        cliente_actual.set(self.router.session.client_token)
+        aviso_cache, self.bytes_cache = await asyncio.to_thread(GeminiModel.aplicar_limite_cache)
+        if aviso_cache:
+            avisos.append(aviso_cache)
+        
+        self.bytes_estado = bytes_estado
+        
+        if avisos:
+            self.aviso_memoria = "⚠️ Límite de memoria alcanzado: " + "; ".join(avisos) + "."
+            log.warning(self.aviso_memoria)
+
+    def cerrar_aviso_memoria(self):
+        """Oculta el aviso de límite de memoria."""
+        self.aviso_memoria = ""
+
+    def enviar_formulario(self, form_data: Dict[str, Any]):
+        """Recibe el texto del input solo al confirmar (Enter o botón) y dispara el envío."""
+        if self.cargando:
+            # Igual que antes: mientras carga no se envía ni se borra lo escrito
+            return
+        self.mensaje = form_data.get("mensaje", "") or ""
+        return [rx.set_value("campo_mensaje", ""), Estado.enviar_mensaje]
 
     def manejar_tecla(self, key: str):
         if key == "Enter":
@@ -201,8 +444,7 @@ class Estado(rx.State):
     
     def eliminar_adjunto(self):
         """Eliminar el archivo adjunto."""
-        print("🗑️  Eliminando archivo adjunto")
         archivo_eliminado = self.archivo_adjunto.get("name", "archivo")
         self.archivo_adjunto = {}
         self.mostrar_adjunto = False
-        print(f"✅ Archivo eliminado: {archivo_eliminado}")
\ No newline at end of file
+        log.debug("🗑️  Archivo adjunto eliminado: %s", contenido(archivo_eliminado))
\ No newline at end of file
@@ -1,87 +1,257 @@
 import sqlite3
+import base64
+import functools
+import csv
 import os
 import secrets
 import string
+import threading
 import time
 from datetime import datetime, timedelta
 from typing import List, Dict, Tuple, Optional
+from .bitacora import obtener_logger
+from .cache_usuarios import CacheUsuarios
+from .comandos import Invocacion, cliente_actual, router
+from .conexiones import GestorConexiones
+from .estado_compartido import EstadoCompartido, estado_compartido
+
+log = obtener_logger(__name__)
+
+# Recalcula desde cero las tablas de estadísticas (migración y comando de reconstrucción)
+_RECONSTRUIR_ESTADISTICAS = [
+    "DELETE FROM estadisticas_programa",
+    '''INSERT INTO estadisticas_programa (programa, cantidad)
+       SELECT programa, COUNT(*) FROM usuarios GROUP BY programa''',
+    '''INSERT OR REPLACE INTO estadisticas_generales (id, total, reciente_id) VALUES (
+           1,
+           (SELECT COUNT(*) FROM usuarios),
+           (SELECT id FROM usuarios ORDER BY fecha DESC, id DESC LIMIT 1)
+       )''',
+]
+
+# Migraciones del esquema: (versión, descripción, sentencias). La versión aplicada
+# se guarda en PRAGMA user_version, así los usuarios.db existentes se actualizan solos.
+MIGRACIONES = [
+    (1, "índices secundarios en fecha, usuario y programa", [
+        "CREATE INDEX IF NOT EXISTS idx_usuarios_fecha ON usuarios (fecha DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_usuarios_usuario ON usuarios (usuario COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS idx_usuarios_programa ON usuarios (programa COLLATE NOCASE)",
+    ]),
+    (2, "índice de texto completo (FTS5 trigram) para búsquedas por subcadena", [
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS usuarios_fts USING fts5(
+               usuario, programa, content='usuarios', content_rowid='id', tokenize='trigram'
+           )''',
+        '''CREATE TRIGGER IF NOT EXISTS usuarios_fts_ai AFTER INSERT ON usuarios BEGIN
+               INSERT INTO usuarios_fts (rowid, usuario, programa) VALUES (new.id, new.usuario, new.programa);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS usuarios_fts_ad AFTER DELETE ON usuarios BEGIN
+               INSERT INTO usuarios_fts (usuarios_fts, rowid, usuario, programa)
+               VALUES ('delete', old.id, old.usuario, old.programa);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS usuarios_fts_au AFTER UPDATE OF usuario, programa ON usuarios BEGIN
+               INSERT INTO usuarios_fts (usuarios_fts, rowid, usuario, programa)
+               VALUES ('delete', old.id, old.usuario, old.programa);
+               INSERT INTO usuarios_fts (rowid, usuario, programa) VALUES (new.id, new.usuario, new.programa);
+           END''',
+        "INSERT INTO usuarios_fts (usuarios_fts) VALUES ('rebuild')",
+    ]),
+    (3, "estadísticas agregadas mantenidas por triggers", [
+        '''CREATE TABLE IF NOT EXISTS estadisticas_generales (
+               id INTEGER PRIMARY KEY CHECK (id = 1),
+               total INTEGER NOT NULL DEFAULT 0,
+               reciente_id INTEGER
+           )''',
+        '''CREATE TABLE IF NOT EXISTS estadisticas_programa (
+               programa TEXT PRIMARY KEY,
+               cantidad INTEGER NOT NULL
+           ) WITHOUT ROWID''',
+        "CREATE INDEX IF NOT EXISTS idx_estadisticas_cantidad ON estadisticas_programa (cantidad DESC)",
+        '''CREATE TRIGGER IF NOT EXISTS usuarios_estadisticas_ai AFTER INSERT ON usuarios BEGIN
+               UPDATE estadisticas_generales SET
+                   total = total + 1,
+                   reciente_id = (SELECT id FROM usuarios ORDER BY fecha DESC, id DESC LIMIT 1)
+               WHERE id = 1;
+               INSERT INTO estadisticas_programa (programa, cantidad) VALUES (new.programa, 1)
+                   ON CONFLICT (programa) DO UPDATE SET cantidad = cantidad + 1;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS usuarios_estadisticas_ad AFTER DELETE ON usuarios BEGIN
+               UPDATE estadisticas_generales SET
+                   total = total - 1,
+                   reciente_id = CASE WHEN reciente_id = old.id
+                       THEN (SELECT id FROM usuarios ORDER BY fecha DESC, id DESC LIMIT 1)
+                       ELSE reciente_id END
+               WHERE id = 1;
+               UPDATE estadisticas_programa SET cantidad = cantidad - 1 WHERE programa = old.programa;
+               DELETE FROM estadisticas_programa WHERE programa = old.programa AND cantidad <= 0;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS usuarios_estadisticas_au_programa AFTER UPDATE OF programa ON usuarios
+           WHEN old.programa IS NOT new.programa BEGIN
+               UPDATE estadisticas_programa SET cantidad = cantidad - 1 WHERE programa = old.programa;
+               DELETE FROM estadisticas_programa WHERE programa = old.programa AND cantidad <= 0;
+               INSERT INTO estadisticas_programa (programa, cantidad) VALUES (new.programa, 1)
+                   ON CONFLICT (programa) DO UPDATE SET cantidad = cantidad + 1;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS usuarios_estadisticas_au_fecha AFTER UPDATE OF fecha ON usuarios BEGIN
+               UPDATE estadisticas_generales SET
+                   reciente_id = (SELECT id FROM usuarios ORDER BY fecha DESC, id DESC LIMIT 1)
+               WHERE id = 1;
+           END''',
+    ] + _RECONSTRUIR_ESTADISTICAS),
+    (4, "versión de los datos de usuarios (para invalidar las caches de los demás workers)", [
+        '''CREATE TABLE IF NOT EXISTS version_datos (
+               id INTEGER PRIMARY KEY CHECK (id = 1),
+               version INTEGER NOT NULL
+           )''',
+        "INSERT OR IGNORE INTO version_datos (id, version) VALUES (1, 0)",
+        '''CREATE TRIGGER IF NOT EXISTS usuarios_version_ai AFTER INSERT ON usuarios BEGIN
+               UPDATE version_datos SET version = version + 1 WHERE id = 1;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS usuarios_version_ad AFTER DELETE ON usuarios BEGIN
+               UPDATE version_datos SET version = version + 1 WHERE id = 1;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS usuarios_version_au AFTER UPDATE ON usuarios BEGIN
+               UPDATE version_datos SET version = version + 1 WHERE id = 1;
+           END''',
+    ]),
+]
+VERSION_ESQUEMA = MIGRACIONES[-1][0]
+
+# El tokenizador trigram solo indexa términos de al menos 3 caracteres
+MIN_TERMINO_FTS = 3
+
+# Alfabeto de contraseñas: minúsculas, mayúsculas, números y símbolos seguros
+# (evitamos algunos problemáticos)
+_CLASES_CONTRASEÑA = [
+    frozenset(string.ascii_lowercase),
+    frozenset(string.ascii_uppercase),
+    frozenset(string.digits),
+    frozenset("!@#$%&*+-=?"),
+]
+_ALFABETO = string.ascii_lowercase + string.ascii_uppercase + string.digits + "!@#$%&*+-=?"
+_LIMITE_BYTE = 256 - 256 % len(_ALFABETO)  # Bytes mayores introducirían sesgo
+_TABLA_ALFABETO = bytes(ord(_ALFABETO[b % len(_ALFABETO)]) for b in range(256))
+_BYTES_DESCARTADOS = bytes(range(_LIMITE_BYTE, 256))
+
+# Importación/exportación masiva
+LARGO_MAXIMO_CAMPO = 200
+MAX_ERRORES_REPORTE = 50
+BLOQUE_EXPORTACION = 500
+DIRECTORIO_EXPORTACIONES = "exportaciones"
+VIDA_EXPORTACION = 3600  # segundos
+
+# Usuarios por página en "listar usuarios"
+TAMAÑO_PAGINA = int(os.getenv("DB_TAMANO_PAGINA", "20"))
 
 class AdminAuth:
-    """Clase para manejar la autenticación de administrador."""
-    
-    def __init__(self):
+    """Sesiones de administrador, una por cliente (token de Reflex).
+
+    Cada navegador se autentica por separado: el `auth admin` de un cliente no
+    habilita a los demás. La expiración es deslizante (cada comando autorizado
+    renueva el plazo). Las sesiones viven en el estado compartido (espacio
+    "admin") con su vencimiento, así valen en cualquier worker del backend.
+    """
+
+    ESPACIO = "admin"
+
+    def __init__(self, session_duration: int = 300, estado: EstadoCompartido = None):
         # Contraseña admin desde variable de entorno o default
         self.admin_password = os.getenv("ADMIN_PASSWORD", "admin123")
-        self.authenticated = False
-        self.auth_time = None
-        self.session_duration = 300  # 5 minutos de sesión
-        print(f"🔐 Sistema de autenticación admin iniciado")
+        self.session_duration = session_duration  # 5 minutos de sesión
+        self.estado = estado or estado_compartido
+
+    def iniciar(self):
+        """Informa la configuración al arrancar la app (no al importar el módulo)."""
+        log.info("🔐 Sistema de autenticación admin iniciado")
         if os.getenv("ADMIN_PASSWORD"):
-            print("✅ Contraseña admin cargada desde variable de entorno")
+            log.info("✅ Contraseña admin cargada desde variable de entorno")
         else:
-            print("⚠️  Usando contraseña admin por defecto. Configura ADMIN_PASSWORD en .env")
-    
-    def verificar_contraseña(self, password: str) -> bool:
-        """Verificar si la contraseña admin es correcta."""
-        if password == self.admin_password:
-            self.authenticated = True
-            self.auth_time = datetime.now()
-            return True
-        return False
-    
-    def esta_autenticado(self) -> bool:
-        """Verificar si el admin está autenticado y la sesión es válida."""
-        if not self.authenticated or not self.auth_time:
-            return False
-        
-        # Verificar si la sesión ha expirado
-        tiempo_transcurrido = datetime.now() - self.auth_time
-        if tiempo_transcurrido.total_seconds() > self.session_duration:
-            self.cerrar_sesion()
+            log.warning("⚠️  Usando contraseña admin por defecto. Configura ADMIN_PASSWORD en .env")
+
+    def verificar_contraseña(self, token: str, password: str) -> bool:
+        """Verificar la contraseña admin y, si es correcta, abrir la sesión del cliente."""
+        if not secrets.compare_digest(password.encode("utf-8"), self.admin_password.encode("utf-8")):
             return False
-        
+        # Una sesión vigente conserva sus datos (p. ej. el cursor del último listado)
+        self.estado.actualizar(self.ESPACIO, token, lambda datos: datos or {}, ttl=self.session_duration)
         return True
-    
-    def cerrar_sesion(self):
-        """Cerrar la sesión admin."""
-        self.authenticated = False
-        self.auth_time = None
-    
-    def tiempo_restante_sesion(self) -> int:
+
+    def esta_autenticado(self, token: str) -> bool:
+        """Verificar si el cliente tiene una sesión admin vigente."""
+        return self.estado.obtener(self.ESPACIO, token) is not None
+
+    def cerrar_sesion(self, token: str):
+        """Cerrar la sesión admin del cliente."""
+        self.estado.eliminar(self.ESPACIO, token)
+
+    def tiempo_restante_sesion(self, token: str) -> int:
         """Obtener tiempo restante de sesión en segundos."""
-        if not self.esta_autenticado():
-            return 0
-        
-        tiempo_transcurrido = datetime.now() - self.auth_time
-        restante = self.session_duration - tiempo_transcurrido.total_seconds()
-        return max(0, int(restante))
-    
-    def extender_sesion(self):
-        """Extender la sesión actual."""
-        if self.authenticated:
-            self.auth_time = datetime.now()
+        restante = self.estado.segundos_restantes(self.ESPACIO, token)
+        return max(0, int(restante)) if restante is not None else 0
+
+    def extender_sesion(self, token: str) -> bool:
+        """Renovar la sesión del cliente. Retorna False si no había sesión vigente."""
+        return self.estado.actualizar(self.ESPACIO, token, lambda datos: datos, ttl=self.session_duration) is not None
+
+    def datos_sesion(self, token: str) -> Dict:
+        """Estado propio de la sesión del cliente (p. ej. el cursor de `listar usuarios siguiente`)."""
+        return self.estado.obtener(self.ESPACIO, token) or {}
+
+    def guardar_dato_sesion(self, token: str, clave: str, valor):
+        """Guarda (o con valor None, borra) un dato de la sesión vigente del cliente."""
+        def modificar(datos):
+            if datos is None:
+                return None  # Sin sesión vigente no hay dónde guardarlo
+            datos = dict(datos)
+            if valor is None:
+                datos.pop(clave, None)
+            else:
+                datos[clave] = valor
+            return datos
+        self.estado.actualizar(self.ESPACIO, token, modificar)
+
+    def sesiones_activas(self) -> int:
+        """Cantidad de sesiones admin vigentes."""
+        return self.estado.contar(self.ESPACIO)
 
 class SimpleDatabase:
     """Clase simple para manejar la base de datos de usuarios con generador de contraseñas y autenticación admin."""
     
-    def __init__(self, db_path: str = "usuarios.db"):
+    def __init__(self, db_path: str = "usuarios.db", tamaño_pagina: int = TAMAÑO_PAGINA):
         self.db_path = db_path
+        self.tamaño_pagina = tamaño_pagina
+        # (tamaño, página) -> último (fecha, id); es igual para todos los clientes.
+        # El cursor de "listar usuarios siguiente" es por cliente y vive en su sesión admin.
+        self._cursores: Dict[Tuple[int, int], Tuple[str, int]] = {}
+        # Avanza cada vez que se vacían: una consulta que empezó antes no guarda su cursor
+        self._generacion_cursores = 0
+        # Todas las operaciones pasan por el pool (WAL, busy timeout y sentencias cacheadas).
+        # Las tablas se crean en iniciar() al arrancar la app, o con la primera consulta.
+        self.conexiones = GestorConexiones(db_path, inicializar=self.init_database)
+        self.fts_disponible = False
+        self.estadisticas_disponibles = False
+        # Filas de usuarios por ID, actualizadas en cada escritura
+        self.cache = CacheUsuarios()
+        # Versión de los datos que reflejan la cache y los cursores; si otro worker
+        # modifica usuarios, la versión en la base avanza y ambos se vacían. Las escrituras
+        # de este worker actualizan la cache pero vacían los cursores
+        self._version_datos: Optional[int] = None
+        self._lock_version = threading.Lock()
         self.auth = AdminAuth()
-        self.init_database()
-        print(f"✅ Base de datos iniciada: {self.db_path}")
+
+    def iniciar(self):
+        """Crea las tablas y aplica las migraciones (lo llama el ciclo de vida de la app)."""
+        self.conexiones.iniciar()
+        self.auth.iniciar()
     
     def verificar_autenticacion(self) -> Tuple[bool, str]:
-        """Verificar si el admin está autenticado."""
-        if not self.auth.esta_autenticado():
+        """Verificar si el cliente actual está autenticado como admin (y renovar su sesión)."""
+        if not self.auth.extender_sesion(cliente_actual.get()):
             return False, "🔐 **ACCESO DENEGADO**\n\nDebes autenticarte como administrador primero.\nUsa: `auth admin [contraseña]`"
-        
-        # Extender sesión si está autenticado
-        self.auth.extender_sesion()
         return True, ""
     
     def autenticar_admin(self, password: str) -> str:
         """Autenticar como administrador."""
-        if self.auth.verificar_contraseña(password):
+        if self.auth.verificar_contraseña(cliente_actual.get(), password):
             tiempo_sesion = self.auth.session_duration // 60  # Convertir a minutos
             return (f"🔓 **AUTENTICACIÓN EXITOSA**\n\n"
                    f"✅ Sesión admin iniciada\n"
@@ -94,8 +264,8 @@ class SimpleDatabase:
     
     def obtener_estado_sesion(self) -> str:
         """Obtener información sobre la sesión actual."""
-        if self.auth.esta_autenticado():
-            tiempo_restante = self.auth.tiempo_restante_sesion()
+        tiempo_restante = self.auth.tiempo_restante_sesion(cliente_actual.get())
+        if tiempo_restante > 0:
             minutos = tiempo_restante // 60
             segundos = tiempo_restante % 60
             return (f"🔓 **SESIÓN ACTIVA**\n\n"
@@ -109,8 +279,9 @@ class SimpleDatabase:
     
     def cerrar_sesion_admin(self) -> str:
         """Cerrar sesión de administrador."""
-        if self.auth.esta_autenticado():
-            self.auth.cerrar_sesion()
+        token = cliente_actual.get()
+        if self.auth.esta_autenticado(token):
+            self.auth.cerrar_sesion(token)
             return (f"🔐 **SESIÓN CERRADA**\n\n"
                    f"✅ Sesión admin terminada\n"
                    f"🛡️ Base de datos protegida")
@@ -119,7 +290,7 @@ class SimpleDatabase:
     
     def init_database(self):
         """Crear la tabla si no existe."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.conexiones.escritura() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS usuarios (
@@ -130,8 +301,34 @@ class SimpleDatabase:
                     fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
-            conn.commit()
-            print("✅ Tabla usuarios creada/verificada")
+            log.debug("✅ Tabla usuarios creada/verificada")
+            self._migrar(conn)
+            self.fts_disponible = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'usuarios_fts'"
+            ).fetchone() is not None
+            self.estadisticas_disponibles = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'usuarios_estadisticas_ai'"
+            ).fetchone() is not None
+        log.info("✅ Base de datos iniciada: %s", self.db_path)
+
+    def _migrar(self, conn):
+        """Aplica las migraciones pendientes según PRAGMA user_version."""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for numero, descripcion, sentencias in MIGRACIONES:
+            if numero <= version:
+                continue
+            conn.execute(f"SAVEPOINT migracion_{numero}")
+            try:
+                for sentencia in sentencias:
+                    conn.execute(sentencia)
+                conn.execute(f"RELEASE migracion_{numero}")
+                log.info("🛠️  Migración %d aplicada: %s", numero, descripcion)
+            except sqlite3.OperationalError as e:
+                # Por ejemplo, SQLite compilado sin FTS5: se sigue sin esa mejora
+                conn.execute(f"ROLLBACK TO migracion_{numero}")
+                conn.execute(f"RELEASE migracion_{numero}")
+                log.warning("⚠️  Migración %d omitida (%s): %s", numero, descripcion, e)
+            conn.execute(f"PRAGMA user_version = {numero}")
     
     def generar_contraseña_compleja(self, longitud: int = 16) -> str:
         """
@@ -143,38 +340,100 @@ class SimpleDatabase:
         Returns:
             str: La contraseña generada.
         """
+        return self.generar_contraseñas_lote(1, longitud)[0]
+    
+    def generar_contraseñas_lote(self, cantidad: int, longitud: int = 16) -> List[str]:
+        """
+        Genera `cantidad` contraseñas seguras a partir de bytes aleatorios pedidos en bloque.
+        
+        Cada byte se mapea al alfabeto con `bytes.translate`, descartando los bytes
+        >= 219 (el mayor múltiplo de 73) para que todos los caracteres sean
+        equiprobables. Las candidatas que no tienen minúscula, mayúscula, número y
+        símbolo se descartan completas, así el resultado es uniforme sobre todas las
+        contraseñas válidas.
+        """
         if longitud < 8:
             longitud = 8  # Mínimo de seguridad
         
-        # Definir los conjuntos de caracteres a utilizar
-        letras_minusculas = string.ascii_lowercase
-        letras_mayusculas = string.ascii_uppercase
-        numeros = string.digits
-        simbolos = "!@#$%&*+-=?"  # Símbolos seguros (evitamos algunos problemáticos)
-        
-        # Combinar todos los caracteres en un solo alfabeto
-        alfabeto = letras_minusculas + letras_mayusculas + numeros + simbolos
-        
-        max_intentos = 100  # Evitar bucle infinito
-        for intento in range(max_intentos):
-            # Generar una contraseña eligiendo caracteres del alfabeto
-            contraseña = ''.join(secrets.choice(alfabeto) for _ in range(longitud))
-            
-            # Asegurarse de que la contraseña contenga al menos un carácter de cada tipo
-            if (any(c in letras_minusculas for c in contraseña)
-                    and any(c in letras_mayusculas for c in contraseña)
-                    and any(c in numeros for c in contraseña)
-                    and any(c in simbolos for c in contraseña)):
-                return contraseña
-        
-        # Si después de 100 intentos no se genera una contraseña válida, forzar una
-        # Esto es muy improbable, pero por seguridad
-        return (secrets.choice(letras_minusculas) + 
-                secrets.choice(letras_mayusculas) + 
-                secrets.choice(numeros) + 
-                secrets.choice(simbolos) + 
-                ''.join(secrets.choice(alfabeto) for _ in range(longitud - 4)))
+        contraseñas: List[str] = []
+        while len(contraseñas) < cantidad:
+            faltan = cantidad - len(contraseñas)
+            # Margen para los bytes descartados (~15%) y las candidatas sin todas las clases
+            crudos = secrets.token_bytes(int(faltan * longitud * 1.6) + longitud)
+            caracteres = crudos.translate(_TABLA_ALFABETO, _BYTES_DESCARTADOS).decode("ascii")
+            for i in range(0, len(caracteres) - longitud + 1, longitud):
+                candidata = caracteres[i:i + longitud]
+                if all(not clase.isdisjoint(candidata) for clase in _CLASES_CONTRASEÑA):
+                    contraseñas.append(candidata)
+                    if len(contraseñas) == cantidad:
+                        break
+        return contraseñas
     
+    @staticmethod
+    def _leer_version(conn) -> Optional[int]:
+        fila = conn.execute("SELECT version FROM version_datos WHERE id = 1").fetchone()
+        return fila[0] if fila else None
+
+    def sincronizar_cache(self):
+        """Vacía la cache y los cursores si otro worker modificó usuarios desde la última consulta."""
+        with self.conexiones.lectura() as conn:
+            version = self._leer_version(conn)
+        with self._lock_version:
+            if version == self._version_datos:
+                return
+            if self._version_datos is not None:
+                log.info("🔄 Usuarios modificados por otro worker (versión %d), cache vaciada", version)
+            self.cache.limpiar()
+            self._vaciar_cursores()
+            self._version_datos = version
+
+    def _vaciar_cursores(self):
+        self._cursores.clear()
+        self._generacion_cursores += 1
+
+    def _escribir(self, operacion):
+        """
+        Ejecuta una escritura en el hilo escritor (group commit) y retorna su resultado.
+        La operación no toca la cache: retorna las filas y quien la llama las escribe en
+        la cache cuando esto retorna, ya confirmadas. Si falla, la cache se vacía.
+        """
+        def con_version(conn):
+            antes = self._leer_version(conn)
+            resultado = operacion(conn)
+            return resultado, antes, self._leer_version(conn)
+
+        try:
+            resultado, antes, despues = self.conexiones.escribir(con_version)
+        except Exception:
+            self.cache.limpiar()
+            raise
+        with self._lock_version:
+            # Los cursores de la paginación apuntan a filas que pudieron moverse con este cambio
+            if despues != antes:
+                self._vaciar_cursores()
+            # Si nadie más escribió desde la última sincronización, la cache ya refleja este cambio
+            if antes == self._version_datos:
+                self._version_datos = despues
+        return resultado
+
+    @staticmethod
+    def _leer_usuario(conn, user_id: int) -> Optional[tuple]:
+        return conn.execute("SELECT * FROM usuarios WHERE id = ?", (user_id,)).fetchone()
+
+    def _obtener_usuario(self, user_id: int, conn=None) -> Optional[tuple]:
+        """Fila del usuario (o None si no existe), servida desde la cache cuando es posible."""
+        encontrado, fila = self.cache.obtener(user_id)
+        if encontrado:
+            return fila
+        if conn is not None:
+            # Dentro de una escritura: ve cambios del lote aún sin confirmar, no se cachea
+            return self._leer_usuario(conn, user_id)
+        generacion = self.cache.generacion()
+        with self.conexiones.lectura() as conn_lectura:
+            fila = self._leer_usuario(conn_lectura, user_id)
+        self.cache.poblar(user_id, fila, generacion)
+        return fila
+
     def agregar_usuario(self, usuario: str, programa: str, contraseña: str = None, longitud_contraseña: int = 16) -> str:
         """
         Agregar un nuevo usuario. Si no se proporciona contraseña, se genera automáticamente.
@@ -194,13 +453,12 @@ class SimpleDatabase:
                 contraseña_generada = contraseña
                 mensaje_contraseña = f"🔐 Contraseña personalizada establecida"
             
-            with sqlite3.connect(self.db_path) as conn:
+            def operacion(conn):
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT INTO usuarios (usuario, programa, contraseña, fecha)
                     VALUES (?, ?, ?, CURRENT_TIMESTAMP)
                 ''', (usuario, programa, contraseña_generada))
-                conn.commit()
                 
                 resultado = f"✅ Usuario '{usuario}' agregado exitosamente con ID {cursor.lastrowid}\n"
                 resultado += f"👤 Usuario: {usuario}\n"
@@ -208,45 +466,295 @@ class SimpleDatabase:
                 resultado += f"{mensaje_contraseña}\n"
                 resultado += f"🔐 Operación autorizada por admin"
                 
-                return resultado
+                return resultado, self._leer_usuario(conn, cursor.lastrowid)
+            resultado, fila = self._escribir(operacion)
+            # Recién después del commit: la cache solo tiene datos confirmados
+            self.cache.escribir(fila)
+            return resultado
                 
         except sqlite3.IntegrityError:
             return f"❌ Error: Ya existe un usuario con datos similares"
         except Exception as e:
             return f"❌ Error al agregar usuario: {str(e)}"
     
-    def obtener_usuarios(self, limite: int = None) -> str:
-        """Obtener lista de todos los usuarios. REQUIERE AUTENTICACIÓN ADMIN."""
+    @staticmethod
+    def codificar_cursor(fecha: str, user_id: int, pagina: int) -> str:
+        """Codifica la posición (fecha, id) del último usuario mostrado como token opaco."""
+        crudo = f"{fecha}|{user_id}|{pagina}".encode("utf-8")
+        return base64.urlsafe_b64encode(crudo).decode("ascii").rstrip("=")
+    
+    @staticmethod
+    def decodificar_cursor(token: str) -> Tuple[str, int, int]:
+        """Inverso de codificar_cursor. Lanza ValueError si el token no es válido."""
+        try:
+            relleno = "=" * (-len(token) % 4)
+            fecha, user_id, pagina = base64.urlsafe_b64decode(token + relleno).decode("utf-8").rsplit("|", 2)
+            return fecha, int(user_id), int(pagina)
+        except Exception:
+            raise ValueError(f"Cursor inválido: {token}")
+    
+    def obtener_usuarios(self, limite: int = None, pagina: int = None, cursor: str = None) -> str:
+        """
+        Obtener una página de usuarios (más recientes primero). REQUIERE AUTENTICACIÓN ADMIN.
+        
+        Usa paginación por clave (fecha, id): cada página continúa desde el último
+        usuario de la anterior, sin OFFSET ni leer la tabla completa.
+        
+        Args:
+            limite: Tamaño de página (por defecto self.tamaño_pagina)
+            pagina: Número de página, empezando en 1
+            cursor: Token de continuación devuelto por la página anterior
+        """
         # Verificar autenticación
         autenticado, mensaje_error = self.verificar_autenticacion()
         if not autenticado:
             return mensaje_error
         
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                query = "SELECT id, usuario, programa, contraseña, fecha FROM usuarios ORDER BY fecha DESC"
-                if limite:
-                    query += f" LIMIT {limite}"
+            tamaño = limite or self.tamaño_pagina
+            generacion = self._generacion_cursores
+            with self.conexiones.lectura() as conn:
+                posicion = None
+                if cursor:
+                    fecha, user_id, pagina_anterior = self.decodificar_cursor(cursor)
+                    posicion = (fecha, user_id)
+                    pagina = pagina_anterior + 1
+                elif pagina and pagina > 1:
+                    posicion = self._cursores.get((tamaño, pagina - 1))
+                    if posicion is None:
+                        # Ubicar el límite recorriendo solo el índice (fecha, id)
+                        posicion = conn.execute('''
+                            SELECT fecha, id FROM usuarios
+                            ORDER BY fecha DESC, id DESC
+                            LIMIT 1 OFFSET ?
+                        ''', ((pagina - 1) * tamaño - 1,)).fetchone()
+                        if posicion is None:
+                            return f"📋 La página {pagina} está vacía."
+                pagina = pagina or 1
                 
-                cursor.execute(query)
-                usuarios = cursor.fetchall()
-                
-                if not usuarios:
-                    return "📋 No hay usuarios registrados en la base de datos."
+                if posicion is None:
+                    filas = conn.execute('''
+                        SELECT id, usuario, programa, contraseña, fecha FROM usuarios
+                        ORDER BY fecha DESC, id DESC
+                        LIMIT ?
+                    ''', (tamaño + 1,))
+                else:
+                    filas = conn.execute('''
+                        SELECT id, usuario, programa, contraseña, fecha FROM usuarios
+                        WHERE (fecha, id) < (?, ?)
+                        ORDER BY fecha DESC, id DESC
+                        LIMIT ?
+                    ''', (posicion[0], posicion[1], tamaño + 1))
                 
-                resultado = f"📋 Lista de usuarios ({len(usuarios)} total) - 🔐 Acceso autorizado:\n\n"
-                for user in usuarios:
-                    resultado += f"🔹 ID: {user[0]}\n"
-                    resultado += f"   Usuario: {user[1]}\n"
-                    resultado += f"   Programa: {user[2]}\n"
-                    resultado += f"   Contraseña: {user[3]}\n"
-                    resultado += f"   Fecha: {user[4]}\n\n"
+                partes, ultimo, hay_mas = self._formatear_pagina(filas, tamaño)
+                if ultimo is None:
+                    if pagina == 1:
+                        return "📋 No hay usuarios registrados en la base de datos."
+                    return f"📋 No hay más usuarios (página {pagina} vacía)."
                 
-                return resultado
+                with self._lock_version:
+                    if generacion == self._generacion_cursores:
+                        if len(self._cursores) > 1000:
+                            self._cursores.clear()
+                        self._cursores[(tamaño, pagina)] = (ultimo[4], ultimo[0])
+                encabezado = f"📋 Lista de usuarios - página {pagina} ({len(partes)} usuarios) - 🔐 Acceso autorizado:\n\n"
+                if hay_mas:
+                    siguiente = self.codificar_cursor(ultimo[4], ultimo[0], pagina)
+                    self.auth.guardar_dato_sesion(cliente_actual.get(), "ultimo_cursor", siguiente)
+                    pie = (f"➡️ Hay más usuarios: `listar usuarios siguiente` o "
+                           f"`listar usuarios pagina {pagina + 1}` (cursor: `{siguiente}`)")
+                else:
+                    self.auth.guardar_dato_sesion(cliente_actual.get(), "ultimo_cursor", None)
+                    pie = "✅ Fin de la lista"
+                return encabezado + "".join(partes) + pie
+        except ValueError as e:
+            return f"❌ {str(e)}"
         except Exception as e:
             return f"❌ Error al obtener usuarios: {str(e)}"
     
+    def obtener_siguiente_pagina(self) -> str:
+        """Continuar el último listado desde su cursor."""
+        ultimo_cursor = self.auth.datos_sesion(cliente_actual.get()).get("ultimo_cursor")
+        if not ultimo_cursor:
+            return self.obtener_usuarios(pagina=1)
+        return self.obtener_usuarios(cursor=ultimo_cursor)
+    
+    @staticmethod
+    def _formatear_pagina(filas, tamaño: int):
+        """Formatea las filas a medida que se leen del cursor (sin fetchall)."""
+        partes = []
+        ultimo = None
+        hay_mas = False
+        for user in filas:
+            if len(partes) == tamaño:
+                hay_mas = True
+                break
+            partes.append(
+                f"🔹 ID: {user[0]}\n"
+                f"   Usuario: {user[1]}\n"
+                f"   Programa: {user[2]}\n"
+                f"   Contraseña: {user[3]}\n"
+                f"   Fecha: {user[4]}\n\n"
+            )
+            ultimo = user
+        return partes, ultimo, hay_mas
+    
+    def importar_usuarios(self, archivo_info: Dict, longitud_contraseña: int = 16) -> str:
+        """
+        Importar usuarios desde un XLSX/CSV adjunto. REQUIERE AUTENTICACIÓN ADMIN.
+        
+        Columnas: usuario, programa y (opcional) contraseña; la primera fila puede ser
+        de encabezados. Las contraseñas faltantes se generan en lote y todas las filas
+        válidas se insertan con executemany en una sola transacción.
+        """
+        # Verificar autenticación
+        autenticado, mensaje_error = self.verificar_autenticacion()
+        if not autenticado:
+            return mensaje_error
+        
+        if not archivo_info:
+            return ("❌ Adjunta un archivo XLSX o CSV con las columnas usuario, programa y (opcional) contraseña, "
+                    "y escribe 'importar usuarios'\n\n🔐 **REQUIERE AUTENTICACIÓN ADMIN**")
+        
+        try:
+            from .file_processor import FileProcessor
+            
+            inicio = time.time()
+            nombre_archivo = archivo_info.get("name", "archivo")
+            filas = FileProcessor.iter_table_rows(FileProcessor.read_attachment(archivo_info), nombre_archivo)
+            
+            # Detectar encabezados y posiciones de columnas
+            columnas = {"usuario": 0, "programa": 1, "contraseña": 2}
+            validas = []
+            errores = []
+            vistos = set()
+            for numero, fila in enumerate(filas, start=1):
+                if numero == 1:
+                    encabezados = [c.lower().replace("contrasena", "contraseña") for c in fila]
+                    if "usuario" in encabezados and "programa" in encabezados:
+                        columnas = {nombre: encabezados.index(nombre) for nombre in columnas if nombre in encabezados}
+                        continue
+                
+                def valor(campo):
+                    idx = columnas.get(campo)
+                    return fila[idx].strip() if idx is not None and idx < len(fila) else ""
+                
+                usuario, programa, contraseña = valor("usuario"), valor("programa"), valor("contraseña")
+                if not usuario or not programa:
+                    errores.append(f"Fila {numero}: falta {'usuario' if not usuario else 'programa'}")
+                elif len(usuario) > LARGO_MAXIMO_CAMPO or len(programa) > LARGO_MAXIMO_CAMPO:
+                    errores.append(f"Fila {numero}: usuario o programa supera {LARGO_MAXIMO_CAMPO} caracteres")
+                elif (usuario.lower(), programa.lower()) in vistos:
+                    errores.append(f"Fila {numero}: duplicada en el archivo ({usuario} / {programa})")
+                else:
+                    vistos.add((usuario.lower(), programa.lower()))
+                    validas.append([numero, usuario, programa, contraseña])
+            
+            if not validas:
+                detalle = "\n".join(f"   • {e}" for e in errores[:MAX_ERRORES_REPORTE])
+                return f"❌ No se importó ningún usuario de '{nombre_archivo}'.\n{detalle}"
+            
+            # Contraseñas faltantes, generadas en un solo lote
+            sin_contraseña = [fila for fila in validas if not fila[3]]
+            for fila, contraseña in zip(sin_contraseña, self.generar_contraseñas_lote(len(sin_contraseña), longitud_contraseña)):
+                fila[3] = contraseña
+            
+            def operacion(conn):
+                conn.executemany('''
+                    INSERT INTO usuarios (usuario, programa, contraseña, fecha)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ''', [(u, p, c) for _, u, p, c in validas])
+            self._escribir(operacion)
+            # Los IDs nuevos pueden estar recordados como inexistentes
+            self.cache.invalidar_ausentes()
+            
+            tiempo = time.time() - inicio
+            resultado = [
+                f"📥 Importación de '{nombre_archivo}' completada - 🔐 Operación autorizada por admin\n",
+                f"✅ Usuarios importados: {len(validas)}",
+                f"🔐 Contraseñas generadas automáticamente: {len(sin_contraseña)}",
+                f"⚠️ Filas con errores: {len(errores)}",
+                f"⏱️ Tiempo: {tiempo:.2f}s",
+            ]
+            if errores:
+                resultado.append("\n**Errores por fila:**")
+                resultado.extend(f"   • {e}" for e in errores[:MAX_ERRORES_REPORTE])
+                if len(errores) > MAX_ERRORES_REPORTE:
+                    resultado.append(f"   … y {len(errores) - MAX_ERRORES_REPORTE} más")
+            if sin_contraseña:
+                resultado.append("\n**Contraseñas generadas:**")
+                resultado.extend(f"   • {u} ({p}): {c}" for _, u, p, c in sin_contraseña[:MAX_ERRORES_REPORTE])
+                if len(sin_contraseña) > MAX_ERRORES_REPORTE:
+                    resultado.append(f"   … usa 'exportar usuarios' para obtener el resto")
+            return "\n".join(resultado)
+        except Exception as e:
+            return f"❌ Error al importar usuarios: {str(e)}"
+    
+    def exportar_usuarios(self, formato: str = "csv") -> str:
+        """
+        Exportar la tabla de usuarios a un CSV/XLSX descargable. REQUIERE AUTENTICACIÓN ADMIN.
+        
+        Las filas se escriben al archivo a medida que se leen (por bloques), sin
+        armar la tabla completa en memoria.
+        """
+        # Verificar autenticación
+        autenticado, mensaje_error = self.verificar_autenticacion()
+        if not autenticado:
+            return mensaje_error
+        
+        formato = "xlsx" if formato == "xlsx" else "csv"
+        try:
+            import reflex as rx
+            
+            directorio = rx.get_upload_dir() / DIRECTORIO_EXPORTACIONES
+            directorio.mkdir(parents=True, exist_ok=True)
+            self._limpiar_exportaciones(directorio)
+            # Nombre no adivinable: el archivo contiene contraseñas
+            nombre = f"usuarios_{datetime.now():%Y%m%d_%H%M%S}_{secrets.token_urlsafe(12)}.{formato}"
+            ruta = directorio / nombre
+            encabezados = ["id", "usuario", "programa", "contraseña", "fecha"]
+            
+            total = 0
+            with self.conexiones.lectura() as conn:
+                cursor = conn.execute("SELECT id, usuario, programa, contraseña, fecha FROM usuarios ORDER BY id")
+                if formato == "csv":
+                    with open(ruta, "w", newline="", encoding="utf-8-sig") as f:
+                        writer = csv.writer(f)
+                        writer.writerow(encabezados)
+                        while filas := cursor.fetchmany(BLOQUE_EXPORTACION):
+                            writer.writerows(filas)
+                            total += len(filas)
+                else:
+                    import openpyxl
+                    workbook = openpyxl.Workbook(write_only=True)  # Escribe fila a fila
+                    hoja = workbook.create_sheet("usuarios")
+                    hoja.append(encabezados)
+                    while filas := cursor.fetchmany(BLOQUE_EXPORTACION):
+                        for fila in filas:
+                            hoja.append(list(fila))
+                        total += len(filas)
+                    workbook.save(ruta)
+            
+            # rx.get_upload_url es una expresión del frontend; aquí hace falta la URL concreta
+            from reflex.constants import Endpoint
+            url = f"{Endpoint.UPLOAD.get_url()}/{DIRECTORIO_EXPORTACIONES}/{nombre}"
+            return (f"📤 Exportación lista ({total} usuarios, {formato.upper()}) - 🔐 Operación autorizada por admin\n\n"
+                    f"🔗 Descargar: {url}\n\n"
+                    f"⚠️ El archivo contiene contraseñas y se borra automáticamente en {VIDA_EXPORTACION // 60} minutos")
+        except Exception as e:
+            return f"❌ Error al exportar usuarios: {str(e)}"
+    
+    @staticmethod
+    def _limpiar_exportaciones(directorio):
+        """Borra exportaciones anteriores que ya vencieron."""
+        limite = time.time() - VIDA_EXPORTACION
+        for archivo in directorio.iterdir():
+            try:
+                if archivo.stat().st_mtime < limite:
+                    archivo.unlink()
+            except OSError:
+                pass
+    
     def buscar_usuario(self, busqueda: str) -> str:
         """Buscar usuario por ID, nombre de usuario o programa. REQUIERE AUTENTICACIÓN ADMIN."""
         # Verificar autenticación
@@ -255,12 +763,24 @@ class SimpleDatabase:
             return mensaje_error
         
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            # Buscar por ID si es número (cache primero)
+            if busqueda.isdigit():
+                usuario = self._obtener_usuario(int(busqueda))
+                return self._formatear_busqueda(busqueda, [usuario] if usuario else [])
+
+            generacion = self.cache.generacion()
+            with self.conexiones.lectura() as conn:
                 cursor = conn.cursor()
-                
-                # Buscar por ID si es número
-                if busqueda.isdigit():
-                    cursor.execute("SELECT * FROM usuarios WHERE id = ?", (int(busqueda),))
+
+                if self.fts_disponible and len(busqueda) >= MIN_TERMINO_FTS:
+                    # Subcadena en usuario o programa usando el índice trigram
+                    frase = '"' + busqueda.replace('"', '""') + '"'
+                    cursor.execute('''
+                        SELECT u.* FROM usuarios_fts f
+                        JOIN usuarios u ON u.id = f.rowid
+                        WHERE usuarios_fts MATCH ?
+                        ORDER BY u.id
+                    ''', (frase,))
                 else:
                     # Buscar por usuario o programa
                     cursor.execute('''
@@ -269,18 +789,23 @@ class SimpleDatabase:
                     ''', (f'%{busqueda}%', f'%{busqueda}%'))
                 
                 usuarios = cursor.fetchall()
-                
-                if not usuarios:
-                    return f"❌ No se encontraron usuarios que coincidan con '{busqueda}'"
-                
-                resultado = f"🔍 Resultados de búsqueda para '{busqueda}' - 🔐 Acceso autorizado:\n\n"
-                for user in usuarios:
-                    resultado += f"🔹 ID: {user[0]} | Usuario: {user[1]} | Programa: {user[2]} | Contraseña: {user[3]} | Fecha: {user[4]}\n"
-                
-                return resultado
+            
+            self.cache.poblar_varios(usuarios, generacion)
+            return self._formatear_busqueda(busqueda, usuarios)
         except Exception as e:
             return f"❌ Error en búsqueda: {str(e)}"
     
+    @staticmethod
+    def _formatear_busqueda(busqueda: str, usuarios: List[tuple]) -> str:
+        if not usuarios:
+            return f"❌ No se encontraron usuarios que coincidan con '{busqueda}'"
+        
+        resultado = f"🔍 Resultados de búsqueda para '{busqueda}' - 🔐 Acceso autorizado:\n\n"
+        for user in usuarios:
+            resultado += f"🔹 ID: {user[0]} | Usuario: {user[1]} | Programa: {user[2]} | Contraseña: {user[3]} | Fecha: {user[4]}\n"
+        
+        return resultado
+    
     def modificar_usuario(self, user_id: int, usuario: str = None, programa: str = None, contraseña: str = None) -> str:
         """Modificar un usuario existente. REQUIERE AUTENTICACIÓN ADMIN."""
         # Verificar autenticación
@@ -289,13 +814,12 @@ class SimpleDatabase:
             return mensaje_error
         
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            def operacion(conn):
                 cursor = conn.cursor()
                 
                 # Verificar que el usuario existe
-                cursor.execute("SELECT * FROM usuarios WHERE id = ?", (user_id,))
-                if not cursor.fetchone():
-                    return f"❌ No existe usuario con ID {user_id}"
+                if self._obtener_usuario(user_id, conn) is None:
+                    return f"❌ No existe usuario con ID {user_id}", None
                 
                 # Construir la consulta de actualización
                 campos = []
@@ -314,7 +838,7 @@ class SimpleDatabase:
                     valores.append(contraseña)
                 
                 if not campos:
-                    return "❌ No se especificaron campos para modificar"
+                    return "❌ No se especificaron campos para modificar", None
                 
                 # Siempre actualizar la fecha
                 campos.append("fecha = CURRENT_TIMESTAMP")
@@ -322,9 +846,13 @@ class SimpleDatabase:
                 
                 query = f"UPDATE usuarios SET {', '.join(campos)} WHERE id = ?"
                 cursor.execute(query, valores)
-                conn.commit()
                 
-                return f"✅ Usuario con ID {user_id} modificado exitosamente - 🔐 Operación autorizada por admin"
+                return (f"✅ Usuario con ID {user_id} modificado exitosamente - 🔐 Operación autorizada por admin",
+                        self._leer_usuario(conn, user_id))
+            resultado, fila = self._escribir(operacion)
+            if fila is not None:
+                self.cache.escribir(fila)
+            return resultado
         except Exception as e:
             return f"❌ Error al modificar usuario: {str(e)}"
     
@@ -336,22 +864,25 @@ class SimpleDatabase:
             return mensaje_error
         
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            def operacion(conn):
                 cursor = conn.cursor()
                 
                 # Verificar que el usuario existe
-                cursor.execute("SELECT usuario FROM usuarios WHERE id = ?", (user_id,))
-                result = cursor.fetchone()
+                result = self._obtener_usuario(user_id, conn)
                 if not result:
-                    return f"❌ No existe usuario con ID {user_id}"
+                    return f"❌ No existe usuario con ID {user_id}", False
                 
-                nombre_usuario = result[0]
+                nombre_usuario = result[1]
                 
                 # Eliminar el usuario
                 cursor.execute("DELETE FROM usuarios WHERE id = ?", (user_id,))
-                conn.commit()
                 
-                return f"✅ Usuario '{nombre_usuario}' (ID {user_id}) eliminado exitosamente - 🔐 Operación autorizada por admin"
+                return (f"✅ Usuario '{nombre_usuario}' (ID {user_id}) eliminado exitosamente - 🔐 Operación autorizada por admin",
+                        True)
+            resultado, eliminado = self._escribir(operacion)
+            if eliminado:
+                self.cache.eliminar(user_id)
+            return resultado
         except Exception as e:
             return f"❌ Error al eliminar usuario: {str(e)}"
     
@@ -365,16 +896,15 @@ class SimpleDatabase:
             return mensaje_error
         
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            def operacion(conn):
                 cursor = conn.cursor()
                 
                 # Verificar que el usuario existe
-                cursor.execute("SELECT usuario FROM usuarios WHERE id = ?", (user_id,))
-                result = cursor.fetchone()
+                result = self._obtener_usuario(user_id, conn)
                 if not result:
-                    return f"❌ No existe usuario con ID {user_id}"
+                    return f"❌ No existe usuario con ID {user_id}", None
                 
-                nombre_usuario = result[0]
+                nombre_usuario = result[1]
                 
                 # Generar nueva contraseña
                 nueva_contraseña = self.generar_contraseña_compleja(longitud)
@@ -385,15 +915,64 @@ class SimpleDatabase:
                     SET contraseña = ?, fecha = CURRENT_TIMESTAMP 
                     WHERE id = ?
                 ''', (nueva_contraseña, user_id))
-                conn.commit()
                 
                 return (f"🔄 Contraseña regenerada para '{nombre_usuario}' (ID {user_id})\n"
                        f"🔐 Nueva contraseña: {nueva_contraseña}\n"
-                       f"🔐 Operación autorizada por admin")
+                       f"🔐 Operación autorizada por admin"), self._leer_usuario(conn, user_id)
+            resultado, fila = self._escribir(operacion)
+            if fila is not None:
+                self.cache.escribir(fila)
+            return resultado
                 
         except Exception as e:
             return f"❌ Error al regenerar contraseña: {str(e)}"
     
+    def rotar_contraseñas_programa(self, programa: str, longitud: int = 16) -> str:
+        """
+        Regenerar las contraseñas de todos los usuarios de un programa en una sola
+        transacción. REQUIERE AUTENTICACIÓN ADMIN.
+        """
+        # Verificar autenticación
+        autenticado, mensaje_error = self.verificar_autenticacion()
+        if not autenticado:
+            return mensaje_error
+        
+        try:
+            inicio = time.time()
+
+            def operacion(conn):
+                usuarios = conn.execute(
+                    "SELECT id, usuario FROM usuarios WHERE programa = ? COLLATE NOCASE ORDER BY id",
+                    (programa,),
+                ).fetchall()
+                nuevas = self.generar_contraseñas_lote(len(usuarios), longitud)
+                conn.executemany(
+                    "UPDATE usuarios SET contraseña = ?, fecha = CURRENT_TIMESTAMP WHERE id = ?",
+                    [(contraseña, user_id) for contraseña, (user_id, _) in zip(nuevas, usuarios)],
+                )
+                return usuarios, nuevas
+
+            usuarios, nuevas = self._escribir(operacion)
+            self.cache.invalidar(user_id for user_id, _ in usuarios)
+            if not usuarios:
+                return f"❌ No hay usuarios del programa '{programa}'"
+            tiempo = time.time() - inicio
+            
+            resultado = [
+                f"🔄 Contraseñas rotadas para el programa '{programa}' - 🔐 Operación autorizada por admin\n",
+                f"👥 Usuarios actualizados: {len(usuarios)}",
+                f"⏱️ Tiempo: {tiempo:.3f}s\n",
+            ]
+            resultado.extend(
+                f"   • ID {user_id} ({usuario}): {contraseña}"
+                for contraseña, (user_id, usuario) in list(zip(nuevas, usuarios))[:MAX_ERRORES_REPORTE]
+            )
+            if len(usuarios) > MAX_ERRORES_REPORTE:
+                resultado.append(f"   … usa 'exportar usuarios' para obtener el resto")
+            return "\n".join(resultado)
+        except Exception as e:
+            return f"❌ Error al rotar contraseñas: {str(e)}"
+    
     def obtener_estadisticas(self) -> str:
         """Obtener estadísticas de la base de datos. REQUIERE AUTENTICACIÓN ADMIN."""
         # Verificar autenticación
@@ -402,289 +981,420 @@ class SimpleDatabase:
             return mensaje_error
         
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Total usuarios
-                cursor.execute("SELECT COUNT(*) FROM usuarios")
-                total = cursor.fetchone()[0]
-                
-                # Programas más usados
-                cursor.execute('''
-                    SELECT programa, COUNT(*) as cantidad 
-                    FROM usuarios 
-                    GROUP BY programa 
-                    ORDER BY cantidad DESC 
-                    LIMIT 5
-                ''')
-                programas = cursor.fetchall()
-                
-                # Usuario más reciente
-                cursor.execute('''
-                    SELECT usuario, fecha 
-                    FROM usuarios 
-                    ORDER BY fecha DESC 
-                    LIMIT 1
-                ''')
-                reciente = cursor.fetchone()
-                
+            with self.conexiones.lectura() as conn:
+                if self.estadisticas_disponibles:
+                    # Números precalculados por los triggers: no depende del tamaño de la tabla
+                    total, programas, reciente = self._estadisticas_agregadas(conn)
+                else:
+                    total, programas, reciente = self._estadisticas_calculadas(conn)
+
                 resultado = f"📊 Estadísticas de la base de datos - 🔐 Acceso autorizado:\n\n"
                 resultado += f"👥 Total de usuarios: {total}\n\n"
-                
+
                 if programas:
                     resultado += "🏆 Programas más usados:\n"
                     for programa, cantidad in programas:
                         resultado += f"   • {programa}: {cantidad} usuarios\n"
                     resultado += "\n"
-                
+
                 if reciente:
                     resultado += f"🆕 Usuario más reciente: {reciente[0]} ({reciente[1]})\n"
-                
+
                 return resultado
         except Exception as e:
             return f"❌ Error al obtener estadísticas: {str(e)}"
 
+    @staticmethod
+    def _estadisticas_agregadas(conn, limite: int = 5):
+        """Lee total, programas más usados y usuario más reciente de las tablas agregadas."""
+        fila = conn.execute('''
+            SELECT g.total, u.usuario, u.fecha
+            FROM estadisticas_generales g LEFT JOIN usuarios u ON u.id = g.reciente_id
+            WHERE g.id = 1
+        ''').fetchone()
+        programas = conn.execute('''
+            SELECT programa, cantidad FROM estadisticas_programa
+            ORDER BY cantidad DESC, programa LIMIT ?
+        ''', (limite,)).fetchall()
+        if fila is None:
+            return 0, programas, None
+        total, usuario, fecha = fila
+        return total, programas, ((usuario, fecha) if usuario is not None else None)
+
+    @staticmethod
+    def _estadisticas_calculadas(conn, limite: int = 5):
+        """Calcula las mismas estadísticas recorriendo la tabla usuarios."""
+        total = conn.execute("SELECT COUNT(*) FROM usuarios").fetchone()[0]
+        programas = conn.execute('''
+            SELECT programa, COUNT(*) as cantidad
+            FROM usuarios
+            GROUP BY programa
+            ORDER BY cantidad DESC, programa
+            LIMIT ?
+        ''', (limite,)).fetchall()
+        reciente = conn.execute('''
+            SELECT usuario, fecha
+            FROM usuarios
+            ORDER BY fecha DESC, id DESC
+            LIMIT 1
+        ''').fetchone()
+        return total, programas, reciente
+
+    def verificar_estadisticas(self) -> str:
+        """Compara las estadísticas agregadas con un recálculo completo. REQUIERE AUTENTICACIÓN ADMIN."""
+        autenticado, mensaje_error = self.verificar_autenticacion()
+        if not autenticado:
+            return mensaje_error
+        if not self.estadisticas_disponibles:
+            return "⚠️ Las estadísticas agregadas no están disponibles; se calculan en cada consulta"
+
+        try:
+            with self.conexiones.lectura() as conn:
+                # Una sola transacción de lectura: ambas versiones salen del mismo snapshot
+                conn.execute("BEGIN")
+                total, _, reciente = self._estadisticas_agregadas(conn)
+                total_real, _, reciente_real = self._estadisticas_calculadas(conn)
+                diferencias = conn.execute('''
+                    SELECT programa, SUM(agregado), SUM(real) FROM (
+                        SELECT programa, cantidad AS agregado, 0 AS real FROM estadisticas_programa
+                        UNION ALL
+                        SELECT programa, 0, COUNT(*) FROM usuarios GROUP BY programa
+                    ) GROUP BY programa HAVING SUM(agregado) != SUM(real)
+                ''').fetchall()
+
+            problemas = []
+            if total != total_real:
+                problemas.append(f"   • Total: {total} guardado vs {total_real} real")
+            if reciente != reciente_real:
+                problemas.append(f"   • Usuario más reciente: {reciente} guardado vs {reciente_real} real")
+            for programa, agregado, real in diferencias[:MAX_ERRORES_REPORTE]:
+                problemas.append(f"   • Programa {programa}: {agregado} guardado vs {real} real")
+
+            if not problemas:
+                return (f"✅ **ESTADÍSTICAS CONSISTENTES**\n\n"
+                       f"👥 {total_real} usuarios verificados contra las tablas agregadas")
+            return (f"⚠️ **ESTADÍSTICAS INCONSISTENTES**\n\n" + "\n".join(problemas) +
+                   f"\n\n🔧 Usa `reconstruir estadísticas` para recalcularlas")
+        except Exception as e:
+            return f"❌ Error al verificar estadísticas: {str(e)}"
+
+    def obtener_estadisticas_cache(self) -> str:
+        """Aciertos, fallos y ocupación de la cache de usuarios. REQUIERE AUTENTICACIÓN ADMIN."""
+        autenticado, mensaje_error = self.verificar_autenticacion()
+        if not autenticado:
+            return mensaje_error
+        
+        datos = self.cache.estadisticas()
+        consultas = datos["aciertos"] + datos["fallos"]
+        tasa = (datos["aciertos"] / consultas * 100) if consultas else 0.0
+        return (f"🧠 **CACHE DE USUARIOS**\n\n"
+               f"✅ Aciertos: {datos['aciertos']}\n"
+               f"❌ Fallos: {datos['fallos']}\n"
+               f"🎯 Tasa de aciertos: {tasa:.1f}%\n"
+               f"📦 Entradas: {datos['entradas']} / {datos['capacidad']}")
+    
+    def reconstruir_estadisticas(self) -> str:
+        """Recalcula las tablas agregadas desde la tabla usuarios. REQUIERE AUTENTICACIÓN ADMIN."""
+        autenticado, mensaje_error = self.verificar_autenticacion()
+        if not autenticado:
+            return mensaje_error
+        if not self.estadisticas_disponibles:
+            return "⚠️ Las estadísticas agregadas no están disponibles; se calculan en cada consulta"
+
+        try:
+            def operacion(conn):
+                for sentencia in _RECONSTRUIR_ESTADISTICAS:
+                    conn.execute(sentencia)
+                return conn.execute("SELECT total FROM estadisticas_generales WHERE id = 1").fetchone()[0]
+
+            total = self.conexiones.escribir(operacion)
+            return (f"🔧 **ESTADÍSTICAS RECONSTRUIDAS**\n\n"
+                   f"👥 Total de usuarios: {total}")
+        except Exception as e:
+            return f"❌ Error al reconstruir estadísticas: {str(e)}"
+
 # Instancia global
 db = SimpleDatabase()
 
+# ========== COMANDOS DEL CHAT ==========
+# Cada comando se declara en el router con sus frases; solo se reconocen al
+# inicio del mensaje y con o sin acentos ("estadísticas" == "estadisticas").
+
+_FORMATO_ADMIN = "\n\n🔐 **REQUIERE AUTENTICACIÓN ADMIN**"
+
+# Los comandos sin argumentos retornan None si el mensaje sigue ("cerrar sesión de
+# Windows", "estadísticas de ventas"): es una pregunta para el modelo.
+
+# ---------- Autenticación (no requieren auth) ----------
+
+@router.comando("auth admin")
+def _comando_auth_admin(inv: Invocacion) -> str:
+    """Autenticarse como admin."""
+    if not inv.argumentos:
+        return "❌ Formato: 'auth admin [contraseña]'"
+    return db.autenticar_admin(" ".join(inv.argumentos))
+
+@router.comando("session status", "estado sesion")
+def _comando_estado_sesion(inv: Invocacion) -> Optional[str]:
+    if inv.argumentos:
+        return None
+    return db.obtener_estado_sesion()
+
+@router.comando("logout admin", "cerrar sesion")
+def _comando_logout(inv: Invocacion) -> Optional[str]:
+    if inv.argumentos:
+        return None
+    return db.cerrar_sesion_admin()
+
+@router.comando("generar contraseña")
+def _comando_generar_contraseña(inv: Invocacion) -> str:
+    """Generar contraseña (NO REQUIERE AUTH - es solo una herramienta)."""
+    try:
+        argumentos = inv.argumentos
+        if argumentos and argumentos[0].isdigit():
+            longitud = int(argumentos[0])  # "generar contraseña 20"
+        else:
+            longitud = inv.entero_despues("longitud", 16)
+
+        contraseña_generada = db.generar_contraseña_compleja(longitud)
+        return (f"🔐 Contraseña generada (longitud {longitud}):\n"
+               f"**{contraseña_generada}**\n\n"
+               f"✅ La contraseña incluye:\n"
+               f"• Letras mayúsculas y minúsculas\n"
+               f"• Números\n"
+               f"• Símbolos especiales\n"
+               f"• Generada con seguridad criptográfica\n\n"
+               f"ℹ️ Este comando no requiere autenticación admin")
+    except Exception:
+        return "❌ Formato: 'generar contraseña' o 'generar contraseña longitud [número]'"
+
+# ---------- Requieren autenticación admin ----------
+
+@router.comando("agregar usuario", "crear usuario")
+def _comando_agregar_usuario(inv: Invocacion) -> str:
+    try:
+        partes = inv.partes
+        idx_programa = inv.indice("programa", inv.largo_frase)
+        if idx_programa is None:
+            return ("❌ Formato:\n"
+                   "• 'agregar usuario [nombre] programa [programa]' (contraseña automática)\n"
+                   "• 'agregar usuario [nombre] programa [programa] longitud [número]' (contraseña auto con longitud)\n"
+                   "• 'agregar usuario [nombre] programa [programa] contraseña [contraseña]' (contraseña manual)"
+                   + _FORMATO_ADMIN)
+        usuario = " ".join(partes[inv.largo_frase:idx_programa])
+        idx_contraseña = inv.indice("contraseña", idx_programa)
+
+        # Formato 2: "agregar usuario [nombre] programa [programa] contraseña [contraseña]" (contraseña manual)
+        if idx_contraseña is not None:
+            programa = " ".join(partes[idx_programa + 1:idx_contraseña])
+            contraseña = " ".join(partes[idx_contraseña + 1:])
+            return db.agregar_usuario(usuario, programa, contraseña)
+
+        # Formato 1: "agregar usuario [nombre] programa [programa] [longitud n]" (contraseña automática)
+        fin_programa = len(partes)
+        longitud = 16
+        idx_longitud = inv.indice("longitud", idx_programa)
+        if idx_longitud is not None and idx_longitud + 1 < len(partes) and partes[idx_longitud + 1].isdigit():
+            longitud = int(partes[idx_longitud + 1])
+            fin_programa = idx_longitud
+        programa = " ".join(partes[idx_programa + 1:fin_programa])
+        return db.agregar_usuario(usuario, programa, longitud_contraseña=longitud)
+    except Exception:
+        return ("❌ Error en formato. Usa:\n"
+               "• 'agregar usuario Juan programa AutoCAD' (contraseña automática)\n"
+               "• 'agregar usuario Juan programa AutoCAD longitud 20' (contraseña auto de 20 chars)\n"
+               "• 'agregar usuario Juan programa AutoCAD contraseña mi_pass_123' (manual)"
+               + _FORMATO_ADMIN)
+
+@router.comando("importar usuarios")
+def _comando_importar_usuarios(inv: Invocacion) -> str:
+    return db.importar_usuarios(inv.archivo_info, inv.entero_despues("longitud", 16))
+
+@router.comando("exportar usuarios")
+def _comando_exportar_usuarios(inv: Invocacion) -> str:
+    return db.exportar_usuarios("xlsx" if inv.tiene("xlsx") or inv.tiene("excel") else "csv")
+
+@router.comando("rotar contraseñas")
+def _comando_rotar_contraseñas(inv: Invocacion) -> str:
+    """Rotación masiva de contraseñas de un programa."""
+    partes = inv.partes
+    idx_programa = inv.indice("programa", inv.largo_frase)
+    if idx_programa is None:
+        return "❌ Formato: 'rotar contraseñas programa [programa]' o '... longitud [número]'" + _FORMATO_ADMIN
+    fin_programa = len(partes)
+    longitud = 16
+    idx_longitud = inv.indice("longitud", idx_programa)
+    if idx_longitud is not None:
+        fin_programa = idx_longitud
+        try:
+            longitud = int(partes[idx_longitud + 1])
+        except (IndexError, ValueError):
+            pass
+    programa = " ".join(partes[idx_programa + 1:fin_programa])
+    if not programa:
+        return "❌ Especifica el programa: 'rotar contraseñas programa [programa]'" + _FORMATO_ADMIN
+    return db.rotar_contraseñas_programa(programa, longitud)
+
+@router.comando("regenerar contraseña", "nueva contraseña")
+def _comando_regenerar_contraseña(inv: Invocacion) -> str:
+    formato = "❌ Formato: 'regenerar contraseña [id]' o 'regenerar contraseña [id] longitud [número]'" + _FORMATO_ADMIN
+    id_usuario = next((int(parte) for parte in inv.argumentos if parte.isdigit()), None)
+    if id_usuario is None:
+        return formato
+    try:
+        return db.regenerar_contraseña(id_usuario, inv.entero_despues("longitud", 16))
+    except Exception:
+        return formato
+
+@router.comando("listar usuarios", "mostrar usuarios", "ver usuarios")
+def _comando_listar_usuarios(inv: Invocacion) -> str:
+    try:
+        if inv.tiene("siguiente"):
+            return db.obtener_siguiente_pagina()
+        idx = inv.indice("cursor")
+        if idx is not None:
+            return db.obtener_usuarios(cursor=inv.partes[idx + 1].strip("`"))
+        idx = inv.indice("pagina")
+        if idx is not None:
+            return db.obtener_usuarios(pagina=max(1, int(inv.partes[idx + 1])))
+    except (IndexError, ValueError):
+        return "❌ Formato: 'listar usuarios', 'listar usuarios pagina [n]' o 'listar usuarios siguiente'" + _FORMATO_ADMIN
+    return db.obtener_usuarios()
+
+@router.comando("buscar usuario")
+def _comando_buscar_usuario(inv: Invocacion) -> str:
+    busqueda = inv.resto
+    if not busqueda:
+        return "❌ Especifica qué buscar: 'buscar usuario [nombre/id/programa]'" + _FORMATO_ADMIN
+    return db.buscar_usuario(busqueda)
+
+@router.comando("modificar usuario")
+def _comando_modificar_usuario(inv: Invocacion) -> str:
+    try:
+        # Formato más simple: "modificar usuario [id] [campo] [valor]"
+        partes = inv.partes
+
+        if len(partes) < 4:
+            return "❌ Formato: 'modificar usuario [id] [campo] [valor]'" + _FORMATO_ADMIN
+
+        id_usuario = int(partes[2])
+
+        # Obtener el resto del mensaje después del ID
+        resto_mensaje = " ".join(partes[3:])
+
+        nuevo_usuario = None
+        nuevo_programa = None
+        nueva_contraseña = None
+
+        # Detectar qué campo se quiere modificar
+        if resto_mensaje.startswith("contraseña "):
+            nueva_contraseña = resto_mensaje.replace("contraseña ", "", 1).strip()
+        elif resto_mensaje.startswith("programa "):
+            nuevo_programa = resto_mensaje.replace("programa ", "", 1).strip()
+        elif resto_mensaje.startswith("usuario "):
+            nuevo_usuario = resto_mensaje.replace("usuario ", "", 1).strip()
+        else:
+            # Formato complejo: buscar palabras clave
+            if " contraseña " in resto_mensaje:
+                idx = resto_mensaje.find(" contraseña ")
+                nueva_contraseña = resto_mensaje[idx + 12:].strip()
+
+            if " programa " in resto_mensaje:
+                idx = resto_mensaje.find(" programa ")
+                end_idx = resto_mensaje.find(" contraseña ")
+                if end_idx == -1:
+                    end_idx = len(resto_mensaje)
+                nuevo_programa = resto_mensaje[idx + 10:end_idx].strip()
+
+        if not nuevo_usuario and not nuevo_programa and not nueva_contraseña:
+            return "❌ Especifica qué modificar: 'modificar usuario [id] contraseña [nueva]' o 'modificar usuario [id] programa [nuevo]'" + _FORMATO_ADMIN
+
+        return db.modificar_usuario(id_usuario, nuevo_usuario, nuevo_programa, nueva_contraseña)
+
+    except ValueError:
+        return "❌ ID debe ser un número. Formato: 'modificar usuario [id] contraseña [nueva]'" + _FORMATO_ADMIN
+    except Exception as e:
+        return f"❌ Error: {str(e)}. Formato: 'modificar usuario [id] contraseña [nueva]'" + _FORMATO_ADMIN
+
+@router.comando("eliminar usuario", "borrar usuario")
+def _comando_eliminar_usuario(inv: Invocacion) -> str:
+    try:
+        return db.eliminar_usuario(int(inv.argumentos[0]))
+    except (IndexError, ValueError):
+        return "❌ Formato: 'eliminar usuario [id]'" + _FORMATO_ADMIN
+
+@router.comando("cache usuarios")
+def _comando_cache_usuarios(inv: Invocacion) -> Optional[str]:
+    if inv.argumentos:
+        return None
+    return db.obtener_estadisticas_cache()
+
+@router.comando("verificar estadísticas")
+def _comando_verificar_estadisticas(inv: Invocacion) -> Optional[str]:
+    if inv.argumentos:
+        return None
+    return db.verificar_estadisticas()
+
+@router.comando("reconstruir estadísticas")
+def _comando_reconstruir_estadisticas(inv: Invocacion) -> Optional[str]:
+    if inv.argumentos:
+        return None
+    return db.reconstruir_estadisticas()
+
+@router.comando("estadísticas", "ver estadísticas")
+def _comando_estadisticas(inv: Invocacion) -> Optional[str]:
+    if inv.argumentos:
+        return None  # "Estadísticas de ventas de este mes": es una pregunta, no el comando
+    return db.obtener_estadisticas()
+
+@router.comando("ayuda db", "help db")
+def _comando_ayuda(inv: Invocacion) -> Optional[str]:
+    if inv.argumentos:
+        return None
+    return (f"🔐 **COMANDOS DE BASE DE DATOS**\n\n"
+           f"**AUTENTICACIÓN:**\n"
+           f"• `auth admin [contraseña]` - Autenticarse como admin\n"
+           f"• `session status` - Ver estado de sesión\n"
+           f"• `logout admin` - Cerrar sesión\n\n"
+           f"**SIN AUTENTICACIÓN:**\n"
+           f"• `generar contraseña [longitud]` - Generar contraseña\n"
+           f"• `ayuda db` - Mostrar esta ayuda\n\n"
+           f"**CON AUTENTICACIÓN ADMIN:**\n"
+           f"• `agregar usuario [nombre] programa [programa]` - Crear usuario\n"
+           f"• `listar usuarios [pagina n | siguiente]` - Ver usuarios por páginas\n"
+           f"• `buscar usuario [término]` - Buscar usuario\n"
+           f"• `modificar usuario [id] [campo] [valor]` - Modificar usuario\n"
+           f"• `eliminar usuario [id]` - Eliminar usuario\n"
+           f"• `regenerar contraseña [id]` - Nueva contraseña\n"
+           f"• `rotar contraseñas programa [programa]` - Rotar todo un programa\n"
+           f"• `estadísticas` - Ver estadísticas\n"
+           f"• `verificar estadísticas` / `reconstruir estadísticas` - Consistencia\n"
+           f"• `cache usuarios` - Aciertos y fallos de la cache\n"
+           f"• `importar usuarios` (con XLSX/CSV adjunto) - Alta masiva\n"
+           f"• `exportar usuarios [csv|xlsx]` - Descargar la tabla\n\n"
+           f"**BIBLIOTECA DE DOCUMENTOS:**\n"
+           f"• `documentos` - Ver los documentos ya procesados\n"
+           f"• `usar documento [nombre]` - Usar un documento sin volver a subirlo\n\n"
+           f"ℹ️ Los comandos se escriben al inicio del mensaje\n"
+           f"🛡️ **SEGURIDAD:** Cada navegador tiene su propia sesión admin; expira tras 5 minutos sin uso")
+
 # Funciones de conveniencia
-def procesar_comando_db(mensaje: str) -> str:
+def procesar_comando_db(mensaje: str, archivo_info: Optional[Dict] = None) -> Optional[str]:
     """
     Procesar comandos de base de datos desde el chat.
     Esta función interpreta el mensaje y ejecuta la operación correspondiente.
+    `archivo_info` es el adjunto del mensaje, usado por 'importar usuarios'.
+    Si no es un comando de BD, retorna None para que Gemini procese normal.
     """
-    mensaje_lower = mensaje.lower().strip()
-    
-    # ========== COMANDOS DE AUTENTICACIÓN (NO REQUIEREN AUTH) ==========
-    
-    # Comando para autenticarse como admin
-    if mensaje_lower.startswith("auth admin"):
-        try:
-            partes = mensaje.split()
-            if len(partes) >= 3:
-                password = " ".join(partes[2:])
-                return db.autenticar_admin(password)
-            else:
-                return "❌ Formato: 'auth admin [contraseña]'"
-        except:
-            return "❌ Formato: 'auth admin [contraseña]'"
-    
-    # Comando para ver estado de sesión
-    elif "session status" in mensaje_lower or "estado sesion" in mensaje_lower:
-        return db.obtener_estado_sesion()
-    
-    # Comando para cerrar sesión
-    elif "logout admin" in mensaje_lower or "cerrar sesion" in mensaje_lower:
-        return db.cerrar_sesion_admin()
-    
-    # Comando para generar contraseña (NO REQUIERE AUTH - es solo una herramienta)
-    elif "generar contraseña" in mensaje_lower:
-        try:
-            longitud = 16  # Default
-            
-            # Buscar longitud personalizada
-            if "longitud" in mensaje_lower:
-                partes = mensaje.split()
-                try:
-                    idx_longitud = next(i for i, word in enumerate(partes) if word.lower() == "longitud")
-                    longitud = int(partes[idx_longitud + 1])
-                except:
-                    pass
-            
-            contraseña_generada = db.generar_contraseña_compleja(longitud)
-            return (f"🔐 Contraseña generada (longitud {longitud}):\n"
-                   f"**{contraseña_generada}**\n\n"
-                   f"✅ La contraseña incluye:\n"
-                   f"• Letras mayúsculas y minúsculas\n"
-                   f"• Números\n"
-                   f"• Símbolos especiales\n"
-                   f"• Generada con seguridad criptográfica\n\n"
-                   f"ℹ️ Este comando no requiere autenticación admin")
-        except:
-            return "❌ Formato: 'generar contraseña' o 'generar contraseña longitud [número]'"
-    
-    # ========== COMANDOS QUE REQUIEREN AUTENTICACIÓN ADMIN ==========
-    
-    # Comandos para agregar usuario
-    elif "agregar usuario" in mensaje_lower or "crear usuario" in mensaje_lower:
-        try:
-            partes = mensaje.split()
-            
-            # Formato 1: "agregar usuario [nombre] programa [programa]" (sin contraseña - auto-generar)
-            if "programa" in mensaje_lower and "contraseña" not in mensaje_lower:
-                idx_programa = next(i for i, word in enumerate(partes) if word.lower() == "programa")
-                usuario = " ".join(partes[2:idx_programa])
-                programa = " ".join(partes[idx_programa+1:])
-                
-                # Verificar si se especifica longitud de contraseña
-                longitud = 16  # Default
-                if "longitud" in mensaje_lower:
-                    try:
-                        idx_longitud = next(i for i, word in enumerate(partes) if word.lower() == "longitud")
-                        longitud = int(partes[idx_longitud + 1])
-                        programa = " ".join(partes[idx_programa+1:idx_longitud])  # Ajustar programa
-                    except:
-                        pass
-                
-                return db.agregar_usuario(usuario, programa, longitud_contraseña=longitud)
-            
-            # Formato 2: "agregar usuario [nombre] programa [programa] contraseña [contraseña]" (contraseña manual)
-            elif "programa" in mensaje_lower and "contraseña" in mensaje_lower:
-                idx_programa = next(i for i, word in enumerate(partes) if word.lower() == "programa")
-                idx_contraseña = next(i for i, word in enumerate(partes) if word.lower() == "contraseña")
-                
-                usuario = " ".join(partes[2:idx_programa])
-                programa = " ".join(partes[idx_programa+1:idx_contraseña])
-                contraseña = " ".join(partes[idx_contraseña+1:])
-                
-                return db.agregar_usuario(usuario, programa, contraseña)
-            
-            else:
-                return ("❌ Formato:\n"
-                       "• 'agregar usuario [nombre] programa [programa]' (contraseña automática)\n"
-                       "• 'agregar usuario [nombre] programa [programa] longitud [número]' (contraseña auto con longitud)\n"
-                       "• 'agregar usuario [nombre] programa [programa] contraseña [contraseña]' (contraseña manual)\n\n"
-                       "🔐 **REQUIERE AUTENTICACIÓN ADMIN**")
-        except:
-            return ("❌ Error en formato. Usa:\n"
-                   "• 'agregar usuario Juan programa AutoCAD' (contraseña automática)\n"
-                   "• 'agregar usuario Juan programa AutoCAD longitud 20' (contraseña auto de 20 chars)\n"
-                   "• 'agregar usuario Juan programa AutoCAD contraseña mi_pass_123' (manual)\n\n"
-                   "🔐 **REQUIERE AUTENTICACIÓN ADMIN**")
-    
-    # Comandos para regenerar contraseña
-    elif "regenerar contraseña" in mensaje_lower or "nueva contraseña" in mensaje_lower:
-        try:
-            partes = mensaje.split()
-            
-            # Buscar el ID
-            id_usuario = None
-            longitud = 16  # Default
-            
-            for i, parte in enumerate(partes):
-                if parte.isdigit():
-                    id_usuario = int(parte)
-                    break
-                    
-            if id_usuario is None:
-                return "❌ Formato: 'regenerar contraseña [id]' o 'regenerar contraseña [id] longitud [número]'\n\n🔐 **REQUIERE AUTENTICACIÓN ADMIN**"
-            
-            # Buscar longitud personalizada
-            if "longitud" in mensaje_lower:
-                try:
-                    idx_longitud = next(i for i, word in enumerate(partes) if word.lower() == "longitud")
-                    longitud = int(partes[idx_longitud + 1])
-                except:
-                    pass
-            
-            return db.regenerar_contraseña(id_usuario, longitud)
-        except:
-            return "❌ Formato: 'regenerar contraseña [id]' o 'regenerar contraseña [id] longitud [número]'\n\n🔐 **REQUIERE AUTENTICACIÓN ADMIN**"
-    
-    # Comandos para listar usuarios
-    elif "listar usuarios" in mensaje_lower or "mostrar usuarios" in mensaje_lower or "ver usuarios" in mensaje_lower:
-        return db.obtener_usuarios()
-    
-    # Comandos para buscar usuario
-    elif "buscar usuario" in mensaje_lower:
-        try:
-            busqueda = mensaje.split("buscar usuario", 1)[1].strip()
-            if busqueda:
-                return db.buscar_usuario(busqueda)
-            else:
-                return "❌ Especifica qué buscar: 'buscar usuario [nombre/id/programa]'\n\n🔐 **REQUIERE AUTENTICACIÓN ADMIN**"
-        except:
-            return "❌ Formato: 'buscar usuario [nombre/id/programa]'\n\n🔐 **REQUIERE AUTENTICACIÓN ADMIN**"
-    
-    # Comandos para modificar usuario
-    elif "modificar usuario" in mensaje_lower:
-        try:
-            # Formato más simple: "modificar usuario [id] [campo] [valor]"
-            partes = mensaje.split()
-            
-            if len(partes) < 4:
-                return "❌ Formato: 'modificar usuario [id] [campo] [valor]'\n\n🔐 **REQUIERE AUTENTICACIÓN ADMIN**"
-            
-            id_usuario = int(partes[2])
-            
-            # Obtener el resto del mensaje después del ID
-            resto_mensaje = " ".join(partes[3:])
-            
-            nuevo_usuario = None
-            nuevo_programa = None
-            nueva_contraseña = None
-            
-            # Detectar qué campo se quiere modificar
-            if resto_mensaje.startswith("contraseña "):
-                nueva_contraseña = resto_mensaje.replace("contraseña ", "", 1).strip()
-            elif resto_mensaje.startswith("programa "):
-                nuevo_programa = resto_mensaje.replace("programa ", "", 1).strip()
-            elif resto_mensaje.startswith("usuario "):
-                nuevo_usuario = resto_mensaje.replace("usuario ", "", 1).strip()
-            else:
-                # Formato complejo: buscar palabras clave
-                if " contraseña " in resto_mensaje:
-                    idx = resto_mensaje.find(" contraseña ")
-                    nueva_contraseña = resto_mensaje[idx + 12:].strip()
-                
-                if " programa " in resto_mensaje:
-                    idx = resto_mensaje.find(" programa ")
-                    end_idx = resto_mensaje.find(" contraseña ")
-                    if end_idx == -1:
-                        end_idx = len(resto_mensaje)
-                    nuevo_programa = resto_mensaje[idx + 10:end_idx].strip()
-                
-                if resto_mensaje.startswith("usuario "):
-                    end_idx = resto_mensaje.find(" programa ")
-                    if end_idx == -1:
-                        end_idx = resto_mensaje.find(" contraseña ")
-                    if end_idx == -1:
-                        end_idx = len(resto_mensaje)
-                    nuevo_usuario = resto_mensaje[8:end_idx].strip()
-            
-            if not nuevo_usuario and not nuevo_programa and not nueva_contraseña:
-                return "❌ Especifica qué modificar: 'modificar usuario [id] contraseña [nueva]' o 'modificar usuario [id] programa [nuevo]'\n\n🔐 **REQUIERE AUTENTICACIÓN ADMIN**"
-            
-            return db.modificar_usuario(id_usuario, nuevo_usuario, nuevo_programa, nueva_contraseña)
-            
-        except ValueError:
-            return "❌ ID debe ser un número. Formato: 'modificar usuario [id] contraseña [nueva]'\n\n🔐 **REQUIERE AUTENTICACIÓN ADMIN**"
-        except Exception as e:
-            return f"❌ Error: {str(e)}. Formato: 'modificar usuario [id] contraseña [nueva]'\n\n🔐 **REQUIERE AUTENTICACIÓN ADMIN**"
-    
-    # Comandos para eliminar usuario
-    elif "eliminar usuario" in mensaje_lower or "borrar usuario" in mensaje_lower:
-        try:
-            # Buscar el ID
-            partes = mensaje.split()
-            id_usuario = int(partes[2])
-            return db.eliminar_usuario(id_usuario)
-        except:
-            return "❌ Formato: 'eliminar usuario [id]'\n\n🔐 **REQUIERE AUTENTICACIÓN ADMIN**"
-    
-    # Comandos para estadísticas
-    elif "estadisticas" in mensaje_lower or "estadísticas" in mensaje_lower:
-        return db.obtener_estadisticas()
-    
-    # Comando de ayuda
-    elif "ayuda db" in mensaje_lower or "help db" in mensaje_lower:
-        return (f"🔐 **COMANDOS DE BASE DE DATOS**\n\n"
-               f"**AUTENTICACIÓN:**\n"
-               f"• `auth admin [contraseña]` - Autenticarse como admin\n"
-               f"• `session status` - Ver estado de sesión\n"
-               f"• `logout admin` - Cerrar sesión\n\n"
-               f"**SIN AUTENTICACIÓN:**\n"
-               f"• `generar contraseña [longitud]` - Generar contraseña\n"
-               f"• `ayuda db` - Mostrar esta ayuda\n\n"
-               f"**CON AUTENTICACIÓN ADMIN:**\n"
-               f"• `agregar usuario [nombre] programa [programa]` - Crear usuario\n"
-               f"• `listar usuarios` - Ver todos los usuarios\n"
-               f"• `buscar usuario [término]` - Buscar usuario\n"
-               f"• `modificar usuario [id] [campo] [valor]` - Modificar usuario\n"
-               f"• `eliminar usuario [id]` - Eliminar usuario\n"
-               f"• `regenerar contraseña [id]` - Nueva contraseña\n"
-               f"• `estadísticas` - Ver estadísticas\n\n"
-               f"🛡️ **SEGURIDAD:** Sesiones admin duran 5 minutos")
-    
-    # Si no es un comando de BD, retornar None para que Gemini procese normal
-    return None
\ No newline at end of file
+    db.sincronizar_cache()
+    return router.despachar(mensaje, archivo_info)
+
+async def procesar_comando_db_async(mensaje: str, archivo_info: Optional[Dict] = None) -> str:
+    """
+    Versión asíncrona de procesar_comando_db para usar desde el loop de eventos.
+    El comando corre en el pool de hilos lectores y sus escrituras van al hilo
+    escritor (group commit), así ningún cliente bloquea a los demás mientras espera.
+    """
+    if not router.es_candidato(mensaje):
+        return None  # Mensaje normal: se descarta sin salir del loop
+    return await db.conexiones.en_pool_lectura(functools.partial(procesar_comando_db, mensaje, archivo_info))
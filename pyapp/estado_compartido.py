@@ -0,0 +1,130 @@
+import json
+import os
+import time
+from typing import Any, Callable, Optional
+from .conexiones import GestorConexiones
+
+# Cada cuántas escrituras (por proceso) se borran las entradas vencidas
+PURGA_CADA = 200
+
+
+class EstadoCompartido:
+    """Almacén clave-valor compartido por todos los workers del backend.
+
+    Reemplaza el estado que antes vivía en la memoria de cada proceso (sesiones
+    admin, archivo procesado e historial del chat de cada cliente), así cualquier
+    worker puede atender cualquier petición. Funciona como un Redis local sobre
+    SQLite en modo WAL: valores JSON agrupados por espacio ("admin", "archivo",
+    "chat"), con vencimiento opcional. `actualizar` es una lectura-modificación-
+    escritura atómica entre procesos (corre dentro de `BEGIN IMMEDIATE`).
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or os.getenv("ESTADO_DB", "estado.db")
+        self.conexiones = GestorConexiones(self.db_path, tamaño_pool=2, inicializar=self.init_database)
+        self._escrituras = 0
+
+    def iniciar(self):
+        """Crea la tabla (lo llama el ciclo de vida de la app; si no, la primera consulta)."""
+        self.conexiones.iniciar()
+
+    def init_database(self):
+        """Crear la tabla si no existe."""
+        with self.conexiones.escritura() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS valores (
+                    espacio TEXT NOT NULL,
+                    clave TEXT NOT NULL,
+                    valor TEXT NOT NULL,
+                    expira REAL,
+                    PRIMARY KEY (espacio, clave)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_valores_expira ON valores (expira) WHERE expira IS NOT NULL")
+
+    @staticmethod
+    def _leer(conn, espacio: str, clave: str, ahora: float):
+        """(valor, expira) vigente o None."""
+        fila = conn.execute('''
+            SELECT valor, expira FROM valores
+            WHERE espacio = ? AND clave = ? AND (expira IS NULL OR expira > ?)
+        ''', (espacio, clave, ahora)).fetchone()
+        if fila is None:
+            return None
+        return json.loads(fila[0]), fila[1]
+
+    def _escribir(self, conn, espacio: str, clave: str, valor: Any, expira: Optional[float]):
+        conn.execute('''
+            INSERT OR REPLACE INTO valores (espacio, clave, valor, expira) VALUES (?, ?, ?, ?)
+        ''', (espacio, clave, json.dumps(valor, ensure_ascii=False), expira))
+        self._escrituras += 1
+        if self._escrituras % PURGA_CADA == 0:
+            conn.execute("DELETE FROM valores WHERE expira <= ?", (time.time(),))
+
+    def obtener(self, espacio: str, clave: str, defecto: Any = None) -> Any:
+        """Valor guardado (o `defecto` si no existe o venció)."""
+        with self.conexiones.lectura() as conn:
+            leido = self._leer(conn, espacio, clave, time.time())
+        return defecto if leido is None else leido[0]
+
+    def segundos_restantes(self, espacio: str, clave: str) -> Optional[float]:
+        """Tiempo hasta el vencimiento; None si no existe, infinito si no vence."""
+        ahora = time.time()
+        with self.conexiones.lectura() as conn:
+            leido = self._leer(conn, espacio, clave, ahora)
+        if leido is None:
+            return None
+        return float("inf") if leido[1] is None else leido[1] - ahora
+
+    def guardar(self, espacio: str, clave: str, valor: Any, ttl: Optional[float] = None):
+        """Guarda `valor` (serializable a JSON); con `ttl` vence a los `ttl` segundos."""
+        expira = time.time() + ttl if ttl else None
+        self.conexiones.escribir(lambda conn: self._escribir(conn, espacio, clave, valor, expira))
+
+    def guardar_si_falta(self, espacio: str, clave: str, valor: Any, ttl: Optional[float] = None) -> bool:
+        """Guarda `valor` solo si no hay uno vigente. Retorna True si lo guardó."""
+        return self.actualizar(espacio, clave, lambda actual: valor if actual is None else actual, ttl,
+                               renovar=False) is valor
+
+    def actualizar(self, espacio: str, clave: str, funcion: Callable[[Any], Any],
+                   ttl: Optional[float] = None, renovar: bool = True) -> Any:
+        """
+        Reemplaza el valor por `funcion(valor_actual)` (None si no existe) de forma atómica
+        entre procesos. Si la función retorna None, la entrada se borra. Con `ttl`, el
+        plazo se renueva (o, con renovar=False, solo se fija al crearla); sin `ttl` se
+        conserva el que tenía. Retorna el valor nuevo.
+        """
+        def operacion(conn):
+            ahora = time.time()
+            leido = self._leer(conn, espacio, clave, ahora)
+            actual, expira = leido if leido is not None else (None, None)
+            nuevo = funcion(actual)
+            if nuevo is None:
+                if leido is not None:
+                    conn.execute("DELETE FROM valores WHERE espacio = ? AND clave = ?", (espacio, clave))
+                return None
+            if ttl and (renovar or leido is None):
+                expira = ahora + ttl
+            self._escribir(conn, espacio, clave, nuevo, expira)
+            return nuevo
+        return self.conexiones.escribir(operacion)
+
+    def eliminar(self, espacio: str, clave: str) -> bool:
+        """Borra la entrada. Retorna True si existía."""
+        def operacion(conn):
+            return conn.execute(
+                "DELETE FROM valores WHERE espacio = ? AND clave = ?", (espacio, clave)
+            ).rowcount > 0
+        return self.conexiones.escribir(operacion)
+
+    def contar(self, espacio: str) -> int:
+        """Entradas vigentes del espacio."""
+        with self.conexiones.lectura() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM valores WHERE espacio = ? AND (expira IS NULL OR expira > ?)",
+                (espacio, time.time()),
+            ).fetchone()[0]
+
+
+# Instancia global
+estado_compartido = EstadoCompartido()
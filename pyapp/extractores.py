@@ -0,0 +1,270 @@
+import importlib.util
+import io
+import os
+import threading
+import time
+import zipfile
+from typing import Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+from .bitacora import obtener_logger
+from .cancelacion import TrabajoCancelado
+from .trazas import traza
+
+log = obtener_logger(__name__)
+
+# Capacidades que puede declarar un motor de extracción
+CAPACIDADES = {
+    "streaming",  # Memoria acotada: no carga el documento completo
+    "paginas",  # Acepta un rango de páginas (opción `paginas`, un slice)
+    "tablas",  # Conserva las tablas como filas "celda | celda"
+    "secciones",  # Extrae por secciones con huella (re-extracción incremental)
+    "mmap",  # Acepta un archivo mapeado en memoria en vez de bytes
+}
+
+# Bytes que se miran para reconocer el formato
+PREFIJO_DETECCION = 8 * 1024
+# Peso de la última medición en el promedio móvil del rendimiento de cada motor
+PESO_MEDICION = 0.3
+
+_OLE2 = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+_BOMS_TEXTO = (b"\xef\xbb\xbf", b"\xff\xfe", b"\xfe\xff")
+_EXTENSIONES_TEXTO = {"txt", "log", "md"}
+_POR_EXTENSION = {"pdf": "pdf", "docx": "docx", "xlsx": "xlsx", "xlsm": "xlsx", "xls": "ole",
+                  "csv": "csv", "tsv": "tsv", "tab": "tsv"}
+
+# Formatos reconocidos que ningún motor extrae
+FORMATOS_NO_SOPORTADOS = {
+    "ole": "documento de Office antiguo (.doc/.xls); guárdalo como .docx o .xlsx",
+    "zip": "archivo ZIP que no es un documento de Office",
+    "binario": "archivo binario",
+}
+
+
+def _extension(file_name: str) -> str:
+    return file_name.lower().split('.')[-1] if '.' in file_name else ''
+
+
+def _leer_prefijo(fuente) -> bytes:
+    if isinstance(fuente, str):
+        with open(fuente, "rb") as archivo:
+            return archivo.read(PREFIJO_DETECCION)
+    return bytes(fuente[:PREFIJO_DETECCION])
+
+
+def _formato_zip(fuente) -> str:
+    """Distingue DOCX y XLSX de otros ZIP por las partes del paquete (solo lee el directorio central)."""
+    if not isinstance(fuente, str) and not hasattr(fuente, "seek"):
+        fuente = io.BytesIO(fuente)
+    try:
+        with zipfile.ZipFile(fuente) as paquete:
+            nombres = set(paquete.namelist())
+    except zipfile.BadZipFile:
+        return "binario"
+    if "word/document.xml" in nombres:
+        return "docx"
+    if "xl/workbook.xml" in nombres:
+        return "xlsx"
+    return "zip"
+
+
+def _formato_texto(extension: str, file_type: str) -> str:
+    if extension in ('tsv', 'tab') or 'tab-separated-values' in file_type:
+        return "tsv"
+    if extension == 'csv' or 'text/csv' in file_type:
+        return "csv"
+    return "texto"
+
+
+def detectar_formato(fuente, file_name: str = "", file_type: str = "") -> Optional[str]:
+    """
+    Formato de un archivo según sus primeros bytes (magic bytes). La extensión y el
+    MIME solo deciden lo que el contenido no distingue: CSV/TSV frente a texto plano,
+    o un archivo vacío. `fuente` son los bytes, un archivo mapeado en memoria o una ruta.
+
+    Retorna "pdf", "docx", "xlsx", "csv", "tsv", "texto", uno de FORMATOS_NO_SOPORTADOS,
+    o None si no hay forma de saberlo.
+    """
+    extension = _extension(file_name)
+    file_type = (file_type or "").lower()
+    prefijo = _leer_prefijo(fuente)
+
+    if not prefijo:
+        if extension in _POR_EXTENSION:
+            return _POR_EXTENSION[extension]
+        if extension in _EXTENSIONES_TEXTO or file_type.startswith('text/'):
+            return "texto"
+        return None
+    if b"%PDF-" in prefijo[:1024]:
+        return "pdf"
+    if prefijo.startswith((b"PK\x03\x04", b"PK\x05\x06")):
+        return _formato_zip(fuente)
+    if prefijo.startswith(_OLE2):
+        return "ole"
+    if prefijo.startswith(_BOMS_TEXTO) or b"\x00" not in prefijo:
+        return _formato_texto(extension, file_type)
+    return "binario"
+
+
+class Extractor(NamedTuple):
+    formato: str
+    nombre: str
+    extraer: Callable[..., str]  # (fuente, cancelar, **opciones) -> texto
+    capacidades: FrozenSet[str]
+    secciones: Optional[Callable[..., list]]  # (fuente, cancelar, anteriores) -> [ParteDocumento]
+    modulos: Tuple[str, ...]  # Dependencias opcionales: sin ellas el motor no está disponible
+    prioridad: int  # Orden inicial, antes de tener mediciones (mayor = se espera más rápido)
+
+
+class RegistroExtractores:
+    """Motores de extracción de texto por formato, con selección automática.
+
+    Cada formato puede tener varios motores (p. ej. PyMuPDF, pypdf y PyPDF2 para
+    PDF); los que dependen de librerías no instaladas se ignoran. El orden de uso es:
+    el configurado en EXTRACTOR_<FORMATO> (p. ej. EXTRACTOR_PDF=pypdf2), luego los
+    de mayor prioridad aún sin medir, luego los medidos de mayor a menor rendimiento
+    (bytes/s, promedio móvil) y por último el resto. Si un motor falla se prueba el
+    siguiente, así los motores lentos pero tolerantes sirven de respaldo.
+    """
+
+    def __init__(self):
+        self._extractores: Dict[str, List[Extractor]] = {}
+        self._preferidos: Dict[str, str] = {}
+        self._rendimiento: Dict[Tuple[str, str], float] = {}  # (formato, nombre) -> bytes/s
+        self._usos: Dict[Tuple[str, str], int] = {}
+        self._modulos: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, formato: str, nombre: str, extraer: Callable[..., str],
+                  capacidades: Iterable[str] = (), secciones: Optional[Callable[..., list]] = None,
+                  modulos: Iterable[str] = (), prioridad: int = 0) -> Extractor:
+        """Agrega un motor para `formato`. Los nombres no pueden repetirse dentro de un formato."""
+        capacidades = frozenset(capacidades) | (frozenset({"secciones"}) if secciones else frozenset())
+        desconocidas = capacidades - CAPACIDADES
+        if desconocidas:
+            raise ValueError(f"Capacidades desconocidas para '{nombre}': {sorted(desconocidas)}")
+        motores = self._extractores.setdefault(formato, [])
+        if any(motor.nombre == nombre for motor in motores):
+            raise ValueError(f"Motor '{nombre}' ya registrado para {formato}")
+        extractor = Extractor(formato, nombre, extraer, capacidades, secciones, tuple(modulos), prioridad)
+        motores.append(extractor)
+        self._preferidos.setdefault(formato, os.getenv(f"EXTRACTOR_{formato.upper()}", "").strip().lower())
+        return extractor
+
+    def disponible(self, extractor: Extractor) -> bool:
+        """Indica si las librerías del motor están instaladas (sin importarlas)."""
+        for modulo in extractor.modulos:
+            if modulo not in self._modulos:
+                try:
+                    self._modulos[modulo] = importlib.util.find_spec(modulo) is not None
+                except (ImportError, ValueError):
+                    self._modulos[modulo] = False
+            if not self._modulos[modulo]:
+                return False
+        return True
+
+    def candidatos(self, formato: str, requiere: Iterable[str] = ()) -> List[Extractor]:
+        """Motores disponibles para el formato con las capacidades pedidas, en orden de uso."""
+        requiere = frozenset(requiere)
+        motores = [
+            motor for motor in self._extractores.get(formato, [])
+            if requiere <= motor.capacidades and self.disponible(motor)
+        ]
+        with self._lock:
+            medidos = sorted(
+                (m for m in motores if (formato, m.nombre) in self._rendimiento),
+                key=lambda m: self._rendimiento[(formato, m.nombre)],
+                reverse=True,
+            )
+        sin_medir = sorted((m for m in motores if m not in medidos), key=lambda m: m.prioridad, reverse=True)
+        mejor_prioridad = max((m.prioridad for m in medidos), default=None)
+        explorar = [m for m in sin_medir if mejor_prioridad is None or m.prioridad > mejor_prioridad]
+        orden = explorar + medidos + [m for m in sin_medir if m not in explorar]
+
+        preferido = self._preferidos.get(formato)
+        if preferido:
+            orden.sort(key=lambda m: m.nombre != preferido)
+        return orden
+
+    def admite(self, formato: str, capacidad: str) -> bool:
+        """Indica si algún motor disponible del formato tiene la capacidad."""
+        return bool(self.candidatos(formato, (capacidad,)))
+
+    def soporta(self, formato: Optional[str]) -> bool:
+        """Indica si hay algún motor disponible para el formato."""
+        return formato is not None and bool(self.candidatos(formato))
+
+    def medir(self, extractor: Extractor, cantidad_bytes: int, segundos: float):
+        """Registra el rendimiento de una extracción completa."""
+        clave = (extractor.formato, extractor.nombre)
+        rendimiento = cantidad_bytes / max(segundos, 1e-6)
+        with self._lock:
+            previo = self._rendimiento.get(clave)
+            self._rendimiento[clave] = (
+                rendimiento if previo is None else previo + PESO_MEDICION * (rendimiento - previo)
+            )
+            self._usos[clave] = self._usos.get(clave, 0) + 1
+
+    def _probar(self, formato: str, requiere: Iterable[str], llamada: Callable[[Extractor], object]):
+        motores = self.candidatos(formato, requiere)
+        if not motores:
+            faltan = sorted({m for e in self._extractores.get(formato, []) for m in e.modulos})
+            detalle = f" (instala alguna de: {', '.join(faltan)})" if faltan else ""
+            raise LookupError(f"No hay motor de extracción disponible para {formato}{detalle}")
+        ultimo_error = None
+        for motor in motores:
+            try:
+                return llamada(motor)
+            except TrabajoCancelado:
+                raise
+            except Exception as e:
+                ultimo_error = e
+                log.warning("⚠️  Motor %s falló con %s (%s), probando el siguiente...", motor.nombre, formato, e)
+        raise ultimo_error
+
+    def ejecutar(self, formato: str, fuente, cancelar: Optional[threading.Event] = None,
+                 requiere: Iterable[str] = (), **opciones) -> str:
+        """Extrae el texto con el mejor motor disponible; si falla, con el siguiente."""
+        def llamada(motor: Extractor) -> str:
+            log.debug("⚙️  Extrayendo %s con %s", formato, motor.nombre)
+            inicio = time.perf_counter()
+            with traza(f"extraer.{formato}", motor=motor.nombre, bytes=len(fuente)):
+                texto = motor.extraer(fuente, cancelar, **opciones)
+            self.medir(motor, len(fuente), time.perf_counter() - inicio)
+            return texto
+        return self._probar(formato, requiere, llamada)
+
+    def ejecutar_secciones(self, formato: str, fuente, cancelar: Optional[threading.Event] = None,
+                           anteriores: Optional[Dict[str, str]] = None) -> list:
+        """Extrae por secciones con el mejor motor que lo permita (ver FileProcessor.extract_parts)."""
+        def llamada(motor: Extractor) -> list:
+            log.debug("⚙️  Extrayendo %s por secciones con %s", formato, motor.nombre)
+            inicio = time.perf_counter()
+            with traza(f"extraer.{formato}", motor=motor.nombre, bytes=len(fuente), secciones=True):
+                partes = motor.secciones(fuente, cancelar, anteriores or {})
+            # Con secciones de una versión anterior solo se procesa lo que cambió:
+            # no es una medida del motor
+            if not anteriores:
+                self.medir(motor, len(fuente), time.perf_counter() - inicio)
+            return partes
+        return self._probar(formato, ("secciones",), llamada)
+
+    def estadisticas(self) -> List[Dict]:
+        """Motores registrados con su disponibilidad y rendimiento medido."""
+        with self._lock:
+            rendimiento = dict(self._rendimiento)
+            usos = dict(self._usos)
+        return [
+            {
+                "formato": formato,
+                "nombre": motor.nombre,
+                "disponible": self.disponible(motor),
+                "capacidades": sorted(motor.capacidades),
+                "bytes_por_segundo": rendimiento.get((formato, motor.nombre)),
+                "usos": usos.get((formato, motor.nombre), 0),
+            }
+            for formato, motores in self._extractores.items()
+            for motor in motores
+        ]
+
+
+# Instancia global
+registro = RegistroExtractores()
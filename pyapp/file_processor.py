@@ -1,9 +1,76 @@
 import base64
+import codecs
+import csv
+import functools
+import hashlib
+import importlib
 import io
-from typing import Optional
-import PyPDF2
-from docx import Document
-import openpyxl
+import itertools
+import mmap
+import os
+import re
+import posixpath
+import threading
+import zipfile
+from contextlib import contextmanager
+from xml.etree import ElementTree
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from .bitacora import contenido, muestrear, obtener_logger
+from .cancelacion import TrabajoCancelado
+from .extractores import FORMATOS_NO_SOPORTADOS, detectar_formato, registro
+from .memoria import leer_de_spool, ruta_en_spool
+from .trazas import traza
+
+log = obtener_logger(__name__)
+
+# Lectura incremental de texto plano (TXT, logs, CSV/TSV)
+PREFIJO_CODIFICACION = 64 * 1024  # Bytes que se miran para adivinar la codificación
+BLOQUE_TEXTO = 1024 * 1024  # Bytes decodificados por paso
+_BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),  # Antes que UTF-16 LE: comparten los dos primeros bytes
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+# Incluir encabezados y pies de página al extraer texto de DOCX
+DOCX_ENCABEZADOS = os.getenv("DOCX_ENCABEZADOS", "0") == "1"
+
+# Etiquetas de WordprocessingML usadas por la lectura en streaming de DOCX
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_P, _W_T, _W_TAB, _W_TR, _W_TC = _W + "p", _W + "t", _W + "tab", _W + "tr", _W + "tc"
+_W_SALTOS = {_W + "br", _W + "cr"}
+_W_CONTENEDORES = {_W + "body", _W + "hdr", _W + "ftr"}
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+_PARTE_ENCABEZADO = re.compile(r"word/header\d*\.xml")
+_PARTE_PIE = re.compile(r"word/footer\d*\.xml")
+
+# Partes de SpreadsheetML usadas para calcular las huellas de cada hoja de un XLSX
+_S = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_R_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+_XLSX_COMPARTIDAS = ("xl/sharedStrings.xml", "xl/styles.xml")  # Afectan el texto de todas las hojas
+
+# Nombres de cada formato en los mensajes de error
+_ETIQUETAS = {"pdf": "PDF", "docx": "DOCX", "xlsx": "XLSX", "texto": "TXT", "csv": "CSV/TSV", "tsv": "CSV/TSV"}
+
+
+class ParteDocumento(NamedTuple):
+    """Sección de un documento extraída por separado (página, hoja o parte del ZIP).
+
+    `huella` resume el contenido crudo de la sección: si no cambia entre dos versiones
+    del archivo, el texto ya extraído se reutiliza sin volver a leerla.
+    """
+    clave: str
+    huella: str
+    texto: str
+
+
+def _verificar_cancelacion(cancelar: Optional[threading.Event]):
+    """Interrumpe la extracción si el cliente la canceló."""
+    if cancelar is not None and cancelar.is_set():
+        raise TrabajoCancelado()
 
 class FileProcessor:
     """Clase para procesar diferentes tipos de archivos y extraer su contenido como texto."""
@@ -11,196 +78,449 @@ class FileProcessor:
     @staticmethod
     def decode_base64_file(base64_content: str) -> bytes:
         """Decodifica el contenido base64 del archivo."""
-        print("🔄 Decodificando archivo base64...")
-        print(f"📏 Longitud del contenido base64: {len(base64_content)}")
+        log.debug("🔄 Decodificando archivo base64 (%d caracteres)", len(base64_content))
         
         # Remover el prefijo data:tipo/subtipo;base64, si existe
         if ',' in base64_content:
             prefix, base64_data = base64_content.split(',', 1)
-            print(f"🏷️  Prefijo detectado: {prefix}")
-            print(f"📏 Longitud después de remover prefijo: {len(base64_data)}")
+            log.debug("🏷️  Prefijo detectado: %s", prefix)
             base64_content = base64_data
         
         try:
-            decoded = base64.b64decode(base64_content)
-            print(f"✅ Archivo decodificado exitosamente ({len(decoded)} bytes)")
+            with traza("base64.decodificar", caracteres=len(base64_content)):
+                decoded = base64.b64decode(base64_content)
+            log.info("✅ Archivo decodificado exitosamente (%d bytes)", len(decoded))
             
             # Verificar que los primeros bytes sean correctos para diferentes formatos
             if len(decoded) >= 4:
                 first_bytes = decoded[:4]
-                print(f"🔍 Primeros 4 bytes (hex): {first_bytes.hex()}")
+                log.debug("🔍 Primeros 4 bytes (hex): %s", first_bytes.hex())
                 
                 # Verificar signatura de archivo
                 if first_bytes == b'PK\x03\x04':
-                    print("✅ Signatura ZIP/DOCX/XLSX detectada")
+                    log.debug("✅ Signatura ZIP/DOCX/XLSX detectada")
                 elif first_bytes == b'%PDF':
-                    print("✅ Signatura PDF detectada")
+                    log.debug("✅ Signatura PDF detectada")
                 else:
-                    print(f"⚠️  Signatura desconocida: {first_bytes}")
+                    log.debug("⚠️  Signatura desconocida: %r", first_bytes)
             
             return decoded
         except Exception as e:
-            print(f"❌ Error en decodificación base64: {str(e)}")
+            log.error("❌ Error en decodificación base64: %s", e)
             raise e
     
+    @classmethod
+    def read_attachment(cls, archivo_info: Dict) -> bytes:
+        """Obtiene los bytes de un adjunto, ya sea desde su data URL o desde el spool en disco."""
+        if archivo_info.get("en_spool"):
+            return leer_de_spool(archivo_info.get("huella"))
+        return cls.decode_base64_file(archivo_info.get("content", ""))
+    
+    @classmethod
+    def iter_table_rows(cls, file_bytes: bytes, file_name: str) -> Iterator[List[str]]:
+        """
+        Recorre las filas de una planilla (XLSX) o de un CSV/TXT delimitado como listas de textos.
+        Las filas vacías se omiten. Se usa para importaciones masivas.
+        """
+        formato = detectar_formato(file_bytes, file_name)
+        if formato == "xlsx":
+            import openpyxl
+            workbook = openpyxl.load_workbook(io.BytesIO(file_bytes), read_only=True, data_only=True)
+            try:
+                sheet = workbook.worksheets[0]
+                for row in sheet.iter_rows(values_only=True):
+                    valores = ["" if cell is None else str(cell).strip() for cell in row]
+                    if any(valores):
+                        yield valores
+            finally:
+                workbook.close()
+            return
+        
+        delimitador = "\t" if formato == "tsv" else None
+        yield from cls.iter_delimited_rows(file_bytes, delimitador=delimitador)
+    
     @staticmethod
-    def extract_text_from_pdf(file_bytes: bytes) -> str:
-        """Extrae texto de un archivo PDF."""
+    def detect_encoding(prefijo: bytes) -> str:
+        """
+        Adivina la codificación de un texto a partir de su BOM o de un prefijo acotado.
+        Un texto mayormente UTF-8 con algún byte dañado se sigue tratando como UTF-8.
+        """
+        for bom, codificacion in _BOMS:
+            if prefijo.startswith(bom):
+                return codificacion
+
+        # final=False: el prefijo puede cortar un carácter multibyte a la mitad
+        muestra = codecs.getincrementaldecoder("utf-8")(errors="replace").decode(prefijo, final=False)
+        errores = muestra.count("\ufffd")
+        if errores == 0:
+            return "utf-8"
+        no_ascii = sum(1 for c in muestra if c > "\x7f") - errores
+        if no_ascii > errores:
+            return "utf-8"
         try:
-            print("📖 Extrayendo texto de PDF...")
-            print(f"📏 Tamaño del archivo: {len(file_bytes)} bytes")
-            
-            pdf_file = io.BytesIO(file_bytes)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            
-            print(f"📄 PDF tiene {len(pdf_reader.pages)} páginas")
-            
-            text = ""
-            for i, page in enumerate(pdf_reader.pages):
-                page_text = page.extract_text()
-                text += page_text + "\n"
-                print(f"  - Página {i+1}: {len(page_text)} caracteres extraídos")
-            
-            print(f"✅ Extracción de PDF completada ({len(text)} caracteres totales)")
-            return text.strip()
-        except Exception as e:
-            error_msg = f"Error al leer PDF: {str(e)}"
-            print(f"❌ {error_msg}")
-            return error_msg
+            prefijo.decode("cp1252")
+            return "cp1252"
+        except UnicodeDecodeError:
+            return "latin-1"
+
+    @classmethod
+    def iter_text_chunks(cls, fuente, cancelar: Optional[threading.Event] = None,
+                         encoding: Optional[str] = None) -> Iterator[str]:
+        """
+        Decodifica `fuente` (bytes o un archivo mapeado en memoria) por bloques y emite
+        texto cortado en límites de línea, sin copiar el archivo completo.
+        """
+        with memoryview(fuente) as vista:
+            if encoding is None:
+                encoding = cls.detect_encoding(bytes(vista[:PREFIJO_CODIFICACION]))
+                log.debug("🔤 Codificación detectada: %s", encoding)
+            decodificador = codecs.getincrementaldecoder(encoding)(errors="replace")
+            pendiente = ""
+            for inicio in range(0, len(vista), BLOQUE_TEXTO):
+                _verificar_cancelacion(cancelar)
+                texto = pendiente + decodificador.decode(vista[inicio:inicio + BLOQUE_TEXTO])
+                corte = texto.rfind("\n") + 1
+                if corte == 0 and len(texto) < BLOQUE_TEXTO:
+                    pendiente = texto
+                    continue
+                corte = corte or len(texto)  # Línea gigante: se emite igual
+                yield texto[:corte]
+                pendiente = texto[corte:]
+            resto = pendiente + decodificador.decode(b"", final=True)
+            if resto:
+                yield resto
+
+    @classmethod
+    def iter_delimited_rows(cls, fuente, cancelar: Optional[threading.Event] = None,
+                            delimitador: Optional[str] = None) -> Iterator[List[str]]:
+        """Recorre un CSV/TSV (bytes o archivo mapeado) fila por fila. Las filas vacías se omiten."""
+        lineas = (
+            linea
+            for bloque in cls.iter_text_chunks(fuente, cancelar)
+            for linea in io.StringIO(bloque, newline="")
+        )
+        muestra = list(itertools.islice(lineas, 50))
+        if delimitador == "\t":
+            dialecto = csv.excel_tab
+        else:
+            try:
+                dialecto = csv.Sniffer().sniff("".join(muestra)[:4096], delimiters=",;\t|")
+            except csv.Error:
+                dialecto = csv.excel
+        for row in csv.reader(itertools.chain(muestra, lineas), dialecto):
+            valores = [cell.strip() for cell in row]
+            if any(valores):
+                yield valores
+
+    @classmethod
+    def iter_docx_text(cls, file_bytes: bytes, cancelar: Optional[threading.Event] = None,
+                       incluir_encabezados: bool = DOCX_ENCABEZADOS) -> Iterator[str]:
+        """
+        Recorre un DOCX como ZIP y emite sus párrafos y filas de tabla a medida que se leen,
+        sin construir el modelo completo de python-docx (memoria constante).
+        Las filas de tabla salen como "celda | celda | celda".
+        """
+        with zipfile.ZipFile(io.BytesIO(file_bytes)) as paquete:
+            for _, titulo, miembros in cls._secciones_docx(paquete, incluir_encabezados):
+                if titulo:
+                    yield titulo
+                for nombre in miembros:
+                    with paquete.open(nombre) as parte:
+                        yield from cls._iter_docx_part(parte, cancelar)
+
+    @staticmethod
+    def _secciones_docx(paquete: zipfile.ZipFile,
+                        incluir_encabezados: bool) -> List[Tuple[str, Optional[str], List[str]]]:
+        """Secciones de un DOCX en orden de lectura: (clave, título, partes XML del ZIP)."""
+        secciones = [("documento", None, ["word/document.xml"])]
+        if incluir_encabezados:
+            nombres = paquete.namelist()
+            encabezados = sorted(n for n in nombres if _PARTE_ENCABEZADO.fullmatch(n))
+            pies = sorted(n for n in nombres if _PARTE_PIE.fullmatch(n))
+            if encabezados:
+                secciones.insert(0, ("encabezados", "=== ENCABEZADOS ===", encabezados))
+            if pies:
+                secciones.append(("pies de página", "=== PIES DE PÁGINA ===", pies))
+        return secciones
+
+    @staticmethod
+    def _iter_docx_part(parte, cancelar: Optional[threading.Event] = None) -> Iterator[str]:
+        """Emite párrafos y filas de tabla de una parte XML de WordprocessingML mientras se parsea."""
+        abiertos = []  # Elementos abiertos, para soltar del árbol lo ya emitido
+        textos = []  # Un buffer por párrafo abierto (los cuadros de texto anidan párrafos)
+        filas = []  # Filas de tabla abiertas: celdas ya cerradas
+        celdas = []  # Celdas abiertas: párrafos ya cerrados
+        en_alternativa = 0  # Dentro de mc:Fallback (copia del contenido de mc:Choice)
+
+        for evento, elem in ElementTree.iterparse(parte, events=("start", "end")):
+            tag = elem.tag
+            if evento == "start":
+                abiertos.append(elem)
+                if tag == _MC_FALLBACK:
+                    en_alternativa += 1
+                elif en_alternativa:
+                    pass
+                elif tag == _W_P:
+                    textos.append([])
+                elif tag == _W_TR:
+                    filas.append([])
+                elif tag == _W_TC:
+                    celdas.append([])
+                continue
+
+            abiertos.pop()
+            if tag == _MC_FALLBACK:
+                en_alternativa -= 1
+                elem.clear()
+                continue
+            if en_alternativa:
+                continue
+
+            bloque = None
+            if tag == _W_T:
+                if textos:
+                    textos[-1].append(elem.text or "")
+            elif tag == _W_TAB:
+                if textos:
+                    textos[-1].append("\t")
+            elif tag in _W_SALTOS:
+                if textos:
+                    textos[-1].append("\n")
+            elif tag == _W_P:
+                bloque = "".join(textos.pop())
+                elem.clear()
+            elif tag == _W_TC:
+                parrafos = celdas.pop()
+                if filas:
+                    filas[-1].append(" ".join(p.strip() for p in parrafos if p.strip()))
+                elem.clear()
+            elif tag == _W_TR:
+                bloque = " | ".join(filas.pop())
+                elem.clear()
+
+            if bloque is not None:
+                if celdas:
+                    celdas[-1].append(bloque)  # Párrafo o tabla anidada dentro de una celda
+                elif textos:
+                    textos[-1].append(bloque + "\n")  # Cuadro de texto dentro de un párrafo
+                else:
+                    _verificar_cancelacion(cancelar)
+                    yield bloque
+
+            # Soltar del árbol los bloques de primer nivel ya procesados
+            if abiertos and abiertos[-1].tag in _W_CONTENEDORES:
+                elem.clear()
+                abiertos[-1].remove(elem)
     
+    # --- Motores de extracción (se registran en `registro` al final del módulo) ---
+    # Lanzan excepciones ante un archivo que no pueden leer: el registro prueba el
+    # siguiente motor y, si ninguno puede, extract_with_engine arma el mensaje de error.
+
+    @staticmethod
+    def _pdf_pypdf(modulo: str, file_bytes: bytes, cancelar: Optional[threading.Event] = None,
+                   paginas: Optional[slice] = None) -> str:
+        """PDF con pypdf o PyPDF2 (misma API, `modulo` indica cuál)."""
+        pdf_reader = importlib.import_module(modulo).PdfReader(io.BytesIO(file_bytes))
+        log.info("📄 PDF tiene %d páginas", len(pdf_reader.pages))
+
+        text = ""
+        for i in range(len(pdf_reader.pages))[paginas or slice(None)]:
+            _verificar_cancelacion(cancelar)
+            page_text = pdf_reader.pages[i].extract_text()
+            text += page_text + "\n"
+            if muestrear(log, "pdf.pagina"):
+                log.debug("  - Página %d: %d caracteres extraídos", i + 1, len(page_text))
+
+        log.info("✅ Extracción de PDF completada (%d caracteres totales)", len(text))
+        return text.strip()
+
+    @staticmethod
+    def _pdf_pymupdf(file_bytes: bytes, cancelar: Optional[threading.Event] = None,
+                     paginas: Optional[slice] = None) -> str:
+        """PDF con PyMuPDF (motor en C, bastante más rápido que los de Python puro)."""
+        import fitz
+        with fitz.open(stream=file_bytes, filetype="pdf") as documento:
+            log.info("📄 PDF tiene %d páginas", documento.page_count)
+            textos = []
+            for i in range(documento.page_count)[paginas or slice(None)]:
+                _verificar_cancelacion(cancelar)
+                textos.append(documento.load_page(i).get_text().rstrip("\n"))
+        text = "\n".join(textos)
+        log.info("✅ Extracción de PDF completada (%d caracteres totales)", len(text))
+        return text.strip()
+
+    @classmethod
+    def _docx_streaming(cls, file_bytes: bytes, cancelar: Optional[threading.Event] = None) -> str:
+        """DOCX leyendo word/document.xml en streaming (sin dependencias externas)."""
+        # Verificar que el archivo tenga la signatura correcta
+        if len(file_bytes) >= 4:
+            signature = file_bytes[:4]
+            log.debug("🔍 Signatura del archivo: %s", signature.hex())
+            if signature != b'PK\x03\x04':
+                log.warning("⚠️  ADVERTENCIA: El archivo no tiene signatura ZIP/DOCX válida")
+
+        text = "\n".join(cls.iter_docx_text(file_bytes, cancelar))
+        log.info("✅ Extracción de DOCX completada en streaming (%d caracteres totales)", len(text))
+        return text.strip()
+
     @staticmethod
-    def extract_text_from_docx(file_bytes: bytes) -> str:
-        """Extrae texto de un archivo DOCX."""
+    def _docx_python_docx(file_bytes: bytes, cancelar: Optional[threading.Event] = None) -> str:
+        """DOCX con python-docx: más lento, pero tolera paquetes que la lectura directa no entiende."""
+        from docx import Document
+        docx_file = io.BytesIO(file_bytes)
+
         try:
-            print("📝 Extrayendo texto de DOCX...")
-            print(f"📏 Tamaño del archivo: {len(file_bytes)} bytes")
-            
-            # Verificar que el archivo tenga la signatura correcta
-            if len(file_bytes) >= 4:
-                signature = file_bytes[:4]
-                print(f"🔍 Signatura del archivo: {signature.hex()}")
-                if signature != b'PK\x03\x04':
-                    print(f"⚠️  ADVERTENCIA: El archivo no tiene signatura ZIP/DOCX válida")
-            
-            docx_file = io.BytesIO(file_bytes)
-            
+            doc = Document(docx_file)
+            log.info("📄 DOCX cargado exitosamente, tiene %d párrafos", len(doc.paragraphs))
+        except Exception as doc_error:
+            log.error("❌ Error al cargar documento DOCX: %s", doc_error)
+
+            # Intentar diagnóstico adicional
+            docx_file.seek(0)
+            first_100_bytes = docx_file.read(100)
+            log.debug("🔍 Primeros bytes del archivo: %s...", first_100_bytes[:50].hex())
+
+            # Intentar verificar si es un archivo ZIP válido
+            docx_file.seek(0)
             try:
-                doc = Document(docx_file)
-                print(f"📄 DOCX cargado exitosamente, tiene {len(doc.paragraphs)} párrafos")
-            except Exception as doc_error:
-                print(f"❌ Error al cargar documento DOCX: {str(doc_error)}")
-                
-                # Intentar diagnóstico adicional
-                docx_file.seek(0)
-                first_100_bytes = docx_file.read(100)
-                print(f"🔍 Primeros 100 bytes del archivo: {first_100_bytes[:50].hex()}...")
-                
-                # Intentar verificar si es un archivo ZIP válido
-                import zipfile
-                docx_file.seek(0)
-                try:
-                    with zipfile.ZipFile(docx_file, 'r') as zip_file:
-                        print(f"✅ Archivo ZIP válido, contiene: {zip_file.namelist()[:5]}")
-                except zipfile.BadZipFile as zip_error:
-                    print(f"❌ No es un archivo ZIP válido: {str(zip_error)}")
-                
-                raise doc_error
-            
-            text = ""
-            for i, paragraph in enumerate(doc.paragraphs):
-                text += paragraph.text + "\n"
-                if i < 5:  # Solo mostrar los primeros 5 párrafos
-                    print(f"  - Párrafo {i+1}: {len(paragraph.text)} caracteres")
-            
-            print(f"✅ Extracción de DOCX completada ({len(text)} caracteres totales)")
-            return text.strip()
-        except Exception as e:
-            error_msg = f"Error al leer DOCX: {str(e)}"
-            print(f"❌ {error_msg}")
-            return error_msg
-    
+                with zipfile.ZipFile(docx_file, 'r') as zip_file:
+                    log.debug("✅ Archivo ZIP válido, contiene: %s", zip_file.namelist()[:5])
+            except zipfile.BadZipFile as zip_error:
+                log.error("❌ No es un archivo ZIP válido: %s", zip_error)
+
+            raise doc_error
+
+        lineas = []
+        for i, paragraph in enumerate(doc.paragraphs):
+            _verificar_cancelacion(cancelar)
+            lineas.append(paragraph.text)
+            if muestrear(log, "docx.parrafo"):
+                log.debug("  - Párrafo %d: %d caracteres", i + 1, len(paragraph.text))
+        for table in doc.tables:
+            for row in table.rows:
+                _verificar_cancelacion(cancelar)
+                lineas.append(" | ".join(cell.text.strip() for cell in row.cells))
+
+        text = "\n".join(lineas)
+        log.info("✅ Extracción de DOCX completada (%d caracteres totales)", len(text))
+        return text.strip()
+
     @staticmethod
-    def extract_text_from_xlsx(file_bytes: bytes) -> str:
-        """Extrae texto de un archivo XLSX."""
+    def _texto_hoja_xlsx(sheet, sheet_name: str, cancelar: Optional[threading.Event] = None) -> Tuple[str, int]:
+        """Texto de una hoja (encabezados, filas y cierre) y la cantidad de filas con datos."""
+        lineas = [f"\n=== HOJA: {sheet_name} ==="]
+        filas = 0
+        for row in sheet.iter_rows(values_only=True):
+            _verificar_cancelacion(cancelar)
+            row_data = [str(cell).strip() for cell in row if cell is not None]
+            if not any(row_data):  # Solo si hay contenido
+                continue
+            if filas == 0:
+                # Primera fila como encabezados
+                lineas.append("ENCABEZADOS: " + " | ".join(row_data))
+            else:
+                # Resto de filas como datos
+                lineas.append(f"FILA {filas}: " + " | ".join(row_data))
+            filas += 1
+        lineas.append(f"\n--- FIN HOJA {sheet_name} ({filas} filas) ---\n")
+        return "\n".join(lineas), filas
+
+    @classmethod
+    def _xlsx_openpyxl(cls, file_bytes: bytes, cancelar: Optional[threading.Event] = None) -> str:
+        """XLSX con openpyxl en modo solo lectura (las hojas se recorren sin cargarlas enteras)."""
+        import openpyxl
+        workbook = openpyxl.load_workbook(io.BytesIO(file_bytes), read_only=True)
         try:
-            print("📊 Extrayendo datos de XLSX...")
-            print(f"📏 Tamaño del archivo: {len(file_bytes)} bytes")
-            
-            xlsx_file = io.BytesIO(file_bytes)
-            workbook = openpyxl.load_workbook(xlsx_file)
-            
-            print(f"📄 XLSX tiene {len(workbook.sheetnames)} hojas: {workbook.sheetnames}")
-            
-            text = ""
+            log.info("📄 XLSX tiene %d hojas", len(workbook.sheetnames))
+
+            bloques = []
             total_rows = 0
-            
             for sheet_name in workbook.sheetnames:
-                sheet = workbook[sheet_name]
-                text += f"\n=== HOJA: {sheet_name} ===\n"
-                
-                # Obtener todas las filas con datos
-                rows_with_data = []
-                for row in sheet.iter_rows(values_only=True):
-                    row_text = []
-                    for cell in row:
-                        if cell is not None:
-                            row_text.append(str(cell).strip())
-                    if any(cell for cell in row_text if cell):  # Solo si hay contenido
-                        rows_with_data.append(row_text)
-                
-                print(f"  - Hoja '{sheet_name}': {len(rows_with_data)} filas con datos")
-                
-                # Agregar cada fila al texto
-                for i, row_data in enumerate(rows_with_data):
-                    if i == 0:
-                        # Primera fila como encabezados
-                        text += "ENCABEZADOS: " + " | ".join(row_data) + "\n"
-                    else:
-                        # Resto de filas como datos
-                        text += f"FILA {i}: " + " | ".join(row_data) + "\n"
-                    total_rows += 1
-                
-                text += f"\n--- FIN HOJA {sheet_name} ({len(rows_with_data)} filas) ---\n"
-            
-            print(f"✅ Extracción de XLSX completada:")
-            print(f"  📊 Total de filas procesadas: {total_rows}")
-            print(f"  📄 Caracteres totales: {len(text)}")
-            
-            return text.strip()
-        except Exception as e:
-            error_msg = f"Error al leer XLSX: {str(e)}"
-            print(f"❌ {error_msg}")
-            return error_msg
-    
+                texto_hoja, filas = cls._texto_hoja_xlsx(workbook[sheet_name], sheet_name, cancelar)
+                log.debug("  - Hoja %s: %d filas con datos", contenido(sheet_name), filas)
+                bloques.append(texto_hoja)
+                total_rows += filas
+        finally:
+            workbook.close()
+
+        text = "".join(bloques)
+        log.info("✅ Extracción de XLSX completada: %d filas, %d caracteres", total_rows, len(text))
+        return text.strip()
+
+    @classmethod
+    def _texto_plano(cls, fuente, cancelar: Optional[threading.Event] = None) -> str:
+        """TXT o log (bytes o archivo mapeado en memoria), decodificado por bloques."""
+        text = "".join(cls.iter_text_chunks(fuente, cancelar))
+        log.info("✅ TXT decodificado (%d caracteres)", len(text))
+        return text
+
+    @classmethod
+    def _tabla_delimitada(cls, fuente, cancelar: Optional[threading.Event] = None,
+                          delimitador: Optional[str] = None) -> str:
+        """CSV/TSV (bytes o archivo mapeado) con el mismo formato que las hojas XLSX."""
+        lineas = []
+        total_rows = 0
+        for i, row_data in enumerate(cls.iter_delimited_rows(fuente, cancelar, delimitador)):
+            if i == 0:
+                # Primera fila como encabezados
+                lineas.append("ENCABEZADOS: " + " | ".join(row_data))
+            else:
+                lineas.append(f"FILA {i}: " + " | ".join(row_data))
+            total_rows += 1
+        lineas.append(f"\n--- FIN TABLA ({total_rows} filas) ---")
+
+        text = "\n".join(lineas)
+        log.info("✅ Extracción de CSV/TSV completada: %d filas, %d caracteres", total_rows, len(text))
+        return text
+
     @staticmethod
-    def extract_text_from_txt(file_bytes: bytes) -> str:
-        """Extrae texto de un archivo TXT."""
+    def extract_with_engine(formato: str, fuente, cancelar: Optional[threading.Event] = None,
+                            requiere: Tuple[str, ...] = (), **opciones) -> str:
+        """
+        Extrae el texto de `fuente` con el mejor motor registrado para `formato`.
+        Retorna el texto, o un mensaje de error si ningún motor pudo leer el archivo.
+        """
+        etiqueta = _ETIQUETAS.get(formato, formato.upper())
         try:
-            print("📄 Extrayendo texto de TXT...")
-            print(f"📏 Tamaño del archivo: {len(file_bytes)} bytes")
-            
-            # Intentar diferentes codificaciones
-            encodings = ['utf-8', 'latin-1', 'cp1252']
-            
-            for encoding in encodings:
-                try:
-                    text = file_bytes.decode(encoding)
-                    print(f"✅ TXT decodificado con codificación '{encoding}' ({len(text)} caracteres)")
-                    return text
-                except UnicodeDecodeError:
-                    print(f"  - Fallo con codificación '{encoding}', probando siguiente...")
-                    continue
-            
-            error_msg = "Error: No se pudo decodificar el archivo de texto"
-            print(f"❌ {error_msg}")
-            return error_msg
+            log.info("📄 Extrayendo texto de %s (%d bytes)", etiqueta, len(fuente))
+            return registro.ejecutar(formato, fuente, cancelar, requiere, **opciones)
         except Exception as e:
-            error_msg = f"Error al leer TXT: {str(e)}"
-            print(f"❌ {error_msg}")
+            error_msg = f"Error al leer {etiqueta}: {str(e)}"
+            log.error("❌ %s", error_msg)
             return error_msg
-    
+
+    @classmethod
+    def extract_text_from_pdf(cls, file_bytes: bytes, cancelar: Optional[threading.Event] = None,
+                              paginas: Optional[slice] = None) -> str:
+        """Extrae texto de un archivo PDF (opcionalmente solo `paginas`, p. ej. slice(0, 10))."""
+        if paginas is None:
+            return cls.extract_with_engine("pdf", file_bytes, cancelar)
+        return cls.extract_with_engine("pdf", file_bytes, cancelar, ("paginas",), paginas=paginas)
+
+    @classmethod
+    def extract_text_from_docx(cls, file_bytes: bytes, cancelar: Optional[threading.Event] = None) -> str:
+        """Extrae texto de un archivo DOCX (párrafos y tablas)."""
+        return cls.extract_with_engine("docx", file_bytes, cancelar)
+
+    @classmethod
+    def extract_text_from_xlsx(cls, file_bytes: bytes, cancelar: Optional[threading.Event] = None) -> str:
+        """Extrae texto de un archivo XLSX."""
+        return cls.extract_with_engine("xlsx", file_bytes, cancelar)
+
+    @classmethod
+    def extract_text_from_txt(cls, file_bytes, cancelar: Optional[threading.Event] = None) -> str:
+        """Extrae texto de un archivo TXT o log (bytes o archivo mapeado en memoria)."""
+        return cls.extract_with_engine("texto", file_bytes, cancelar)
+
+    @classmethod
+    def extract_text_from_delimited(cls, file_bytes, cancelar: Optional[threading.Event] = None,
+                                    delimitador: Optional[str] = None) -> str:
+        """Extrae el contenido de un CSV/TSV con el mismo formato que las hojas XLSX."""
+        return cls.extract_with_engine("tsv" if delimitador == "\t" else "csv", file_bytes, cancelar)
+
     @classmethod
-    def process_file(cls, base64_content: str, file_type: str, file_name: str) -> str:
+    def process_file(cls, base64_content: str, file_type: str, file_name: str,
+                     cancelar: Optional[threading.Event] = None) -> str:
         """
         Procesa un archivo según su tipo y retorna el texto extraído.
         
@@ -208,40 +528,293 @@ class FileProcessor:
             base64_content: Contenido del archivo en base64
             file_type: Tipo MIME del archivo
             file_name: Nombre del archivo
+            cancelar: Señal opcional para interrumpir la extracción (lanza TrabajoCancelado)
         
         Returns:
             Texto extraído del archivo
         """
         try:
-            print("=== PROCESANDO ARCHIVO ===")
-            print(f"📄 Archivo: {file_name}")
-            print(f"🏷️  Tipo MIME: {file_type}")
-            print(f"📏 Longitud contenido base64: {len(base64_content)}")
+            log.info("📄 Procesando archivo %s (%s, %d caracteres base64)", contenido(file_name), file_type,
+                     len(base64_content))
             
             file_bytes = cls.decode_base64_file(base64_content)
-            
-            # Determinar el tipo de archivo por extensión o MIME type
-            file_extension = file_name.lower().split('.')[-1] if '.' in file_name else ''
-            print(f"🔍 Extensión detectada: .{file_extension}")
-            
-            if file_extension == 'pdf' or 'pdf' in file_type.lower():
-                print("📖 Procesando como PDF...")
-                return cls.extract_text_from_pdf(file_bytes)
-            elif file_extension == 'docx' or 'wordprocessingml' in file_type.lower():
-                print("📝 Procesando como DOCX...")
-                return cls.extract_text_from_docx(file_bytes)
-            elif file_extension in ['xlsx', 'xls'] or 'spreadsheet' in file_type.lower():
-                print("📊 Procesando como XLSX...")
-                return cls.extract_text_from_xlsx(file_bytes)
-            elif file_extension == 'txt' or 'text/plain' in file_type.lower():
-                print("📄 Procesando como TXT...")
-                return cls.extract_text_from_txt(file_bytes)
-            else:
-                error_msg = f"Tipo de archivo no soportado: {file_type} (.{file_extension})"
-                print(f"❌ {error_msg}")
-                return error_msg
+            return cls.process_bytes(file_bytes, file_type, file_name, cancelar)
                 
         except Exception as e:
             error_msg = f"Error al procesar el archivo {file_name}: {str(e)}"
-            print(f"❌ {error_msg}")
-            return error_msg
\ No newline at end of file
+            log.error("❌ %s", error_msg)
+            return error_msg
+    
+    @classmethod
+    def _procesar_formato(cls, formato: Optional[str], fuente, file_type: str, file_name: str,
+                          cancelar: Optional[threading.Event] = None) -> str:
+        """Extrae `fuente` ya identificada como `formato`, o explica por qué no se puede."""
+        file_extension = file_name.lower().split('.')[-1] if '.' in file_name else ''
+        log.info("🔍 Formato detectado: %s (extensión .%s)", formato or "desconocido", file_extension)
+        if not registro.soporta(formato):
+            error_msg = f"Tipo de archivo no soportado: {file_type} (.{file_extension})"
+            if formato in FORMATOS_NO_SOPORTADOS:
+                error_msg += f" - {FORMATOS_NO_SOPORTADOS[formato]}"
+            log.warning("❌ %s", error_msg)
+            return error_msg
+        return cls.extract_with_engine(formato, fuente, cancelar)
+
+    @classmethod
+    def process_bytes(cls, file_bytes: bytes, file_type: str, file_name: str,
+                      cancelar: Optional[threading.Event] = None) -> str:
+        """
+        Procesa el contenido binario de un archivo (ya decodificado) según su tipo.
+        El formato se reconoce por el contenido (ver detectar_formato), no solo por la extensión.
+        """
+        try:
+            _verificar_cancelacion(cancelar)
+            formato = detectar_formato(file_bytes, file_name, file_type)
+            return cls._procesar_formato(formato, file_bytes, file_type, file_name, cancelar)
+        except Exception as e:
+            error_msg = f"Error al procesar el archivo {file_name}: {str(e)}"
+            log.error("❌ %s", error_msg)
+            return error_msg
+
+    @classmethod
+    def process_path(cls, huella: str, file_type: str, file_name: str,
+                     cancelar: Optional[threading.Event] = None) -> str:
+        """
+        Procesa un adjunto guardado en el spool. Si el motor del formato acepta archivos
+        mapeados en memoria (TXT, logs, CSV/TSV) se mapea; si no, se lee completo.
+        """
+        try:
+            _verificar_cancelacion(cancelar)
+            ruta = ruta_en_spool(huella)
+            formato = detectar_formato(ruta, file_name, file_type)
+            if formato is None or not registro.admite(formato, "mmap"):
+                return cls._procesar_formato(formato, leer_de_spool(huella), file_type, file_name, cancelar)
+            log.info("🗺️  Mapeando en memoria (%d bytes)", os.path.getsize(ruta))
+            with cls._mapear(ruta) as mapeado:
+                return cls._procesar_formato(formato, mapeado, file_type, file_name, cancelar)
+        except (OSError, ValueError) as e:
+            error_msg = f"Error al procesar el archivo {file_name}: {str(e)}"
+            log.error("❌ %s", error_msg)
+            return error_msg
+
+    @staticmethod
+    @contextmanager
+    def _mapear(ruta: str):
+        """Mapea en memoria un archivo del spool (mmap no admite archivos vacíos: se entrega b"")."""
+        with open(ruta, "rb") as archivo:
+            if os.fstat(archivo.fileno()).st_size == 0:
+                yield b""
+                return
+            with mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ) as mapeado:
+                yield mapeado
+
+    # --- Extracción por secciones (re-extracción incremental) ---
+
+    @staticmethod
+    def _huella(datos) -> str:
+        return hashlib.blake2b(datos, digest_size=16).hexdigest()
+
+    @staticmethod
+    def _huella_miembros(paquete: zipfile.ZipFile, nombres) -> str:
+        """Huella de partes del ZIP tomada del directorio central (CRC y tamaño), sin descomprimirlas."""
+        huellas = []
+        for nombre in nombres:
+            try:
+                info = paquete.getinfo(nombre)
+            except KeyError:
+                huellas.append("-")
+                continue
+            huellas.append(f"{info.CRC:08x}:{info.file_size}")
+        return ",".join(huellas)
+
+    @staticmethod
+    def is_error_message(texto: str) -> bool:
+        """Indica si el resultado de una extracción es un mensaje de error en vez de contenido."""
+        return texto.startswith(("Error al ", "Tipo de archivo no soportado"))
+
+    @staticmethod
+    def join_parts(partes: List[ParteDocumento]) -> str:
+        """Arma el texto completo del documento a partir de sus secciones."""
+        return "".join(parte.texto for parte in partes).strip()
+
+    @classmethod
+    def _partes_pdf_pypdf(cls, modulo: str, file_bytes: bytes, cancelar: Optional[threading.Event],
+                          anteriores: Dict[str, str]) -> List[ParteDocumento]:
+        """Una sección por página; la huella es la del content stream de la página."""
+        pdf_reader = importlib.import_module(modulo).PdfReader(io.BytesIO(file_bytes))
+        log.info("📄 PDF tiene %d páginas", len(pdf_reader.pages))
+        partes = []
+        for i, page in enumerate(pdf_reader.pages):
+            _verificar_cancelacion(cancelar)
+            contenido = page.get_contents()
+            # Cada motor extrae un texto algo distinto: las huellas no se comparten entre motores
+            huella = f"{modulo}:" + cls._huella(contenido.get_data() if contenido is not None else b"")
+            texto = anteriores.get(huella)
+            if texto is None:
+                texto = page.extract_text() + "\n"
+                if muestrear(log, "pdf.pagina"):
+                    log.debug("  - Página %d: %d caracteres extraídos", i + 1, len(texto) - 1)
+            partes.append(ParteDocumento(f"página {i + 1}", huella, texto))
+        return partes
+
+    @classmethod
+    def _partes_pdf_pymupdf(cls, file_bytes: bytes, cancelar: Optional[threading.Event],
+                            anteriores: Dict[str, str]) -> List[ParteDocumento]:
+        """Como _partes_pdf_pypdf, con PyMuPDF."""
+        import fitz
+        partes = []
+        with fitz.open(stream=file_bytes, filetype="pdf") as documento:
+            log.info("📄 PDF tiene %d páginas", documento.page_count)
+            for i in range(documento.page_count):
+                _verificar_cancelacion(cancelar)
+                pagina = documento.load_page(i)
+                huella = "pymupdf:" + cls._huella(pagina.read_contents())
+                texto = anteriores.get(huella)
+                if texto is None:
+                    texto = pagina.get_text().rstrip("\n") + "\n"
+                    if muestrear(log, "pdf.pagina"):
+                        log.debug("  - Página %d: %d caracteres extraídos", i + 1, len(texto) - 1)
+                partes.append(ParteDocumento(f"página {i + 1}", huella, texto))
+        return partes
+
+    @classmethod
+    def _partes_docx(cls, file_bytes: bytes, cancelar: Optional[threading.Event],
+                     anteriores: Dict[str, str]) -> List[ParteDocumento]:
+        """Una sección por grupo de partes XML (encabezados, cuerpo, pies de página)."""
+        partes = []
+        with zipfile.ZipFile(io.BytesIO(file_bytes)) as paquete:
+            for clave, titulo, miembros in cls._secciones_docx(paquete, DOCX_ENCABEZADOS):
+                huella = f"{clave}:{cls._huella_miembros(paquete, miembros)}"
+                texto = anteriores.get(huella)
+                if texto is None:
+                    lineas = [titulo] if titulo else []
+                    for nombre in miembros:
+                        with paquete.open(nombre) as parte:
+                            lineas.extend(cls._iter_docx_part(parte, cancelar))
+                    texto = "\n".join(lineas) + "\n"
+                    log.debug("  - Sección %s: %d caracteres extraídos", clave, len(texto))
+                partes.append(ParteDocumento(clave, huella, texto))
+        return partes
+
+    @staticmethod
+    def _hojas_xlsx(paquete: zipfile.ZipFile) -> List[Tuple[str, str]]:
+        """(nombre, parte del ZIP) de cada hoja, en el orden del libro."""
+        with paquete.open("xl/_rels/workbook.xml.rels") as rels:
+            destinos = {rel.get("Id"): rel.get("Target") for rel in ElementTree.parse(rels).getroot().iter(_REL)}
+        with paquete.open("xl/workbook.xml") as libro:
+            hojas = ElementTree.parse(libro).getroot().iter(_S + "sheet")
+            resultado = []
+            for hoja in hojas:
+                destino = destinos[hoja.get(_R_ID)]
+                if destino.startswith("/"):
+                    miembro = destino.lstrip("/")
+                else:
+                    miembro = posixpath.normpath(posixpath.join("xl", destino))
+                resultado.append((hoja.get("name"), miembro))
+        return resultado
+
+    @classmethod
+    def _partes_xlsx(cls, file_bytes: bytes, cancelar: Optional[threading.Event],
+                     anteriores: Dict[str, str]) -> List[ParteDocumento]:
+        """
+        Una sección por hoja. La huella combina la parte XML de la hoja con las partes
+        compartidas del libro (textos y estilos), así que solo se abren las hojas que cambiaron.
+        """
+        with zipfile.ZipFile(io.BytesIO(file_bytes)) as paquete:
+            compartidas = cls._huella_miembros(paquete, _XLSX_COMPARTIDAS)
+            huellas = [
+                (nombre, f"hoja {nombre}:{cls._huella_miembros(paquete, [miembro])}|{compartidas}")
+                for nombre, miembro in cls._hojas_xlsx(paquete)
+            ]
+        log.info("📄 XLSX tiene %d hojas", len(huellas))
+
+        textos = {nombre: anteriores[huella] for nombre, huella in huellas if huella in anteriores}
+        pendientes = [nombre for nombre, _ in huellas if nombre not in textos]
+        if pendientes:
+            import openpyxl
+            workbook = openpyxl.load_workbook(io.BytesIO(file_bytes), read_only=True)
+            try:
+                for nombre in pendientes:
+                    textos[nombre], filas = cls._texto_hoja_xlsx(workbook[nombre], nombre, cancelar)
+                    log.debug("  - Hoja %s: %d filas con datos", contenido(nombre), filas)
+            finally:
+                workbook.close()
+        return [ParteDocumento(f"hoja '{nombre}'", huella, textos[nombre]) for nombre, huella in huellas]
+
+    @classmethod
+    def extract_parts(cls, fuente, file_type: str, file_name: str,
+                      cancelar: Optional[threading.Event] = None,
+                      anteriores: Optional[Dict[str, str]] = None) -> List[ParteDocumento]:
+        """
+        Extrae un archivo por secciones: páginas de PDF, partes del ZIP de DOCX y hojas
+        de XLSX; los demás formatos son una sola sección con la huella del archivo completo.
+
+        Args:
+            fuente: Bytes del archivo (o un archivo de texto mapeado en memoria)
+            anteriores: huella -> texto de las secciones de una versión previa; las
+                secciones con la misma huella se reutilizan sin volver a extraerlas
+        """
+        anteriores = anteriores or {}
+        _verificar_cancelacion(cancelar)
+        formato = detectar_formato(fuente, file_name, file_type)
+        
+        if formato is not None and registro.admite(formato, "secciones"):
+            try:
+                partes = registro.ejecutar_secciones(formato, fuente, cancelar, anteriores)
+                reutilizadas = sum(1 for parte in partes if parte.huella in anteriores)
+                log.info("🧩 %d secciones, %d reutilizadas de la versión anterior", len(partes), reutilizadas)
+                return partes
+            except Exception as e:
+                log.warning("⚠️  No se pudo extraer por secciones (%s), procesando el archivo completo...", e)
+        
+        huella = cls._huella(fuente)
+        texto = anteriores.get(huella)
+        if texto is None:
+            texto = cls._procesar_formato(formato, fuente, file_type, file_name, cancelar)
+        else:
+            log.info("♻️  Contenido idéntico a la versión anterior")
+        return [ParteDocumento("contenido", huella, texto)]
+
+    @classmethod
+    def extract_attachment_parts(cls, archivo_info: Dict, cancelar: Optional[threading.Event] = None,
+                                 anteriores: Optional[Dict[str, str]] = None) -> List[ParteDocumento]:
+        """extract_parts para un adjunto, ya sea desde su data URL o desde el spool en disco."""
+        file_name = archivo_info.get("name", "archivo")
+        file_type = archivo_info.get("type", "")
+        try:
+            ruta = ruta_en_spool(archivo_info.get("huella")) if archivo_info.get("en_spool") else None
+            if ruta and registro.admite(detectar_formato(ruta, file_name, file_type) or "", "mmap"):
+                with cls._mapear(ruta) as mapeado:
+                    return cls.extract_parts(mapeado, file_type, file_name, cancelar, anteriores)
+            return cls.extract_parts(cls.read_attachment(archivo_info), file_type, file_name, cancelar, anteriores)
+        except Exception as e:
+            error_msg = f"Error al procesar el archivo {file_name}: {str(e)}"
+            log.error("❌ %s", error_msg)
+            return [ParteDocumento("contenido", "", error_msg)]
+
+
+# ========== MOTORES DE EXTRACCIÓN ==========
+# Varios motores por formato; el registro elige el más rápido disponible (o el
+# configurado en EXTRACTOR_<FORMATO>) y usa los demás como respaldo.
+
+registro.registrar("pdf", "pymupdf", FileProcessor._pdf_pymupdf,
+                   capacidades=("paginas",), secciones=FileProcessor._partes_pdf_pymupdf,
+                   modulos=("fitz",), prioridad=30)
+registro.registrar("pdf", "pypdf", functools.partial(FileProcessor._pdf_pypdf, "pypdf"),
+                   capacidades=("paginas",), secciones=functools.partial(FileProcessor._partes_pdf_pypdf, "pypdf"),
+                   modulos=("pypdf",), prioridad=20)
+registro.registrar("pdf", "pypdf2", functools.partial(FileProcessor._pdf_pypdf, "PyPDF2"),
+                   capacidades=("paginas",), secciones=functools.partial(FileProcessor._partes_pdf_pypdf, "PyPDF2"),
+                   modulos=("PyPDF2",), prioridad=10)
+registro.registrar("docx", "streaming", FileProcessor._docx_streaming,
+                   capacidades=("streaming", "tablas"), secciones=FileProcessor._partes_docx, prioridad=20)
+registro.registrar("docx", "python-docx", FileProcessor._docx_python_docx,
+                   capacidades=("tablas",), modulos=("docx",), prioridad=10)
+registro.registrar("xlsx", "openpyxl", FileProcessor._xlsx_openpyxl,
+                   capacidades=("streaming", "tablas"), secciones=FileProcessor._partes_xlsx,
+                   modulos=("openpyxl",), prioridad=10)
+registro.registrar("texto", "decodificador", FileProcessor._texto_plano,
+                   capacidades=("streaming", "mmap"), prioridad=10)
+registro.registrar("csv", "csv", FileProcessor._tabla_delimitada,
+                   capacidades=("streaming", "tablas", "mmap"), prioridad=10)
+registro.registrar("tsv", "csv", functools.partial(FileProcessor._tabla_delimitada, delimitador="\t"),
+                   capacidades=("streaming", "tablas", "mmap"), prioridad=10)
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from typing import Any
+
+# Límites configurables por variable de entorno
+LIMITE_ESTADO_BYTES = int(os.getenv("LIMITE_ESTADO_KB", "512")) * 1024
+LIMITE_CACHE_BYTES = int(os.getenv("LIMITE_CACHE_MB", "16")) * 1024 * 1024
+# Largo máximo de un mensaje dentro de la ventana cuando hay que recortar
+MAX_TEXTO_VENTANA = 4000
+
+# Archivos adjuntos descargados del estado a disco
+DIRECTORIO_SPOOL = os.getenv("SPOOL_DIR", os.path.join(tempfile.gettempdir(), "pyapp_spool"))
+VIDA_SPOOL = 3600  # segundos
+# Nombre de un adjunto en el spool: el SHA-256 de su contenido
+_HUELLA = re.compile(r"[0-9a-f]{64}")
+
+
+def tamaño_serializado(valor: Any) -> int:
+    """Tamaño en bytes de un valor serializado como JSON (como viaja en el estado)."""
+    return len(json.dumps(valor, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def formatear_bytes(cantidad: int) -> str:
+    """Formatea bytes como B, KB o MB."""
+    if cantidad < 1024:
+        return f"{cantidad} B"
+    if cantidad < 1024 * 1024:
+        return f"{cantidad / 1024:.1f} KB"
+    return f"{cantidad / (1024 * 1024):.1f} MB"
+
+
+# ---------- Spool de adjuntos ----------
+
+def guardar_en_spool(datos: bytes) -> str:
+    """
+    Guarda bytes en el spool (direccionado por contenido) y retorna su huella.
+    El estado del cliente guarda solo la huella, nunca la ruta (ver ruta_en_spool).
+    """
+    os.makedirs(DIRECTORIO_SPOOL, exist_ok=True)
+    _limpiar_spool()
+    huella = hashlib.sha256(datos).hexdigest()
+    ruta = os.path.join(DIRECTORIO_SPOOL, huella)
+    if not os.path.exists(ruta):
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, "wb") as f:
+            f.write(datos)
+        os.replace(temporal, ruta)
+    else:
+        os.utime(ruta)
+    return huella
+
+
+def ruta_en_spool(huella: str) -> str:
+    """
+    Ruta del adjunto con esa huella dentro del spool. La huella llega desde el estado
+    del cliente, que este puede modificar: cualquier cosa que no sea un SHA-256 o que
+    resuelva fuera de DIRECTORIO_SPOOL se rechaza con ValueError.
+    """
+    if not isinstance(huella, str) or not _HUELLA.fullmatch(huella):
+        raise ValueError("Adjunto inválido")
+    directorio = os.path.realpath(DIRECTORIO_SPOOL)
+    ruta = os.path.realpath(os.path.join(directorio, huella))
+    if os.path.dirname(ruta) != directorio:
+        raise ValueError("Adjunto inválido")
+    return ruta
+
+
+def leer_de_spool(huella: str) -> bytes:
+    """Lee un adjunto guardado en el spool a partir de su huella."""
+    with open(ruta_en_spool(huella), "rb") as f:
+        return f.read()
+
+
+def _limpiar_spool():
+    """Borra los adjuntos del spool que llevan más de VIDA_SPOOL sin usarse."""
+    limite = time.time() - VIDA_SPOOL
+    try:
+        with os.scandir(DIRECTORIO_SPOOL) as entradas:
+            for entrada in entradas:
+                try:
+                    if entrada.stat().st_mtime < limite:
+                        os.remove(entrada.path)
+                except OSError:
+                    pass
+    except FileNotFoundError:
+        pass
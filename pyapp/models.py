@@ -1,30 +1,116 @@
-import google.generativeai as genai
 from dotenv import load_dotenv
+import asyncio
 import os
+import threading
 import time
-from typing import List, Dict, Optional
-from .file_processor import FileProcessor
-from .database import procesar_comando_db
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
+from .file_processor import FileProcessor, ParteDocumento
+from .biblioteca import biblioteca
+from .bitacora import contenido, obtener_logger
+from .comandos import Invocacion, cliente_actual, router
+from .database import procesar_comando_db_async
+from .estado_compartido import estado_compartido
+from .memoria import LIMITE_CACHE_BYTES
+from .trazas import traza
 
-# Cargar variables de entorno y configurar la API de Gemini
+if TYPE_CHECKING:
+    import google.generativeai as genai
+
+log = obtener_logger(__name__)
+
+# Cargar variables de entorno (la API de Gemini se configura en el primer uso)
 load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+
+# Modelo de Gemini que usa el chat
+MODELO_GEMINI = 'gemini-1.5-flash'
+
+_genai = None
+_lock_genai = threading.Lock()
+
+
+def cargar_genai():
+    """Importa y configura el SDK de Gemini una sola vez (tarda: no se hace al importar)."""
+    global _genai
+    if _genai is None:
+        with _lock_genai:
+            if _genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+                _genai = genai
+    return _genai
+
+# Tiempo que se conserva el estado del modelo de un cliente inactivo (archivo e historial del chat)
+VIDA_ESTADO_CLIENTE = int(os.getenv("VIDA_ESTADO_CLIENTE_HORAS", "24")) * 3600
 
 class GeminiModel:
-    _chat_session: Optional[genai.ChatSession] = None
-    _archivo_procesado: Optional[Dict] = None  # Cache del último archivo procesado
+    """Chat con Gemini y el archivo de cada cliente.
+
+    El estado de cada cliente (archivo procesado, sus secciones e historial del
+    chat) vive en el estado compartido bajo su token, no en el proceso: cualquier
+    worker puede atender su próximo mensaje. La sesión de chat se arma en cada
+    mensaje a partir del historial guardado (start_chat no hace llamadas a la API).
+    """
+    _modelo: Optional["genai.GenerativeModel"] = None  # Sin estado por cliente: uno por proceso
     
     @classmethod
-    def get_chat_session(cls) -> genai.ChatSession:
-        """Obtener o crear una sesión de chat"""
-        if cls._chat_session is None:
-            print("🔄 Creando nueva sesión de chat con Gemini")
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            cls._chat_session = model.start_chat(history=[])
-            print("✅ Sesión de chat creada exitosamente")
+    def get_chat_session(cls, historial: Optional[List[Dict]] = None) -> "genai.ChatSession":
+        """Sesión de chat del cliente actual, con su historial guardado (o el indicado)."""
+        if cls._modelo is None:
+            cls._modelo = cargar_genai().GenerativeModel(MODELO_GEMINI)
+        if historial is None:
+            historial = cls._historial()
+        log.debug("🔄 Sesión de chat con Gemini (%d turnos previos)", len(historial))
+        return cls._modelo.start_chat(history=historial)
+    
+    @classmethod
+    def restaurar_sesion(cls, historial: List[Dict]):
+        """
+        Siembra el historial del chat del cliente actual a partir de la conversación
+        guardada, si no tiene uno (p. ej. tras un reinicio o si venció por inactividad).
+        """
+        if historial:
+            estado_compartido.guardar_si_falta("chat", cliente_actual.get(), historial, ttl=VIDA_ESTADO_CLIENTE)
+    
+    # ---------- Estado del cliente (compartido entre workers) ----------
+    
+    @staticmethod
+    def _historial() -> List[Dict]:
+        """Historial del chat del cliente actual en el formato de start_chat."""
+        return estado_compartido.obtener("chat", cliente_actual.get()) or []
+    
+    @staticmethod
+    def _guardar_historial(historial: List[Dict]):
+        estado_compartido.guardar("chat", cliente_actual.get(), historial, ttl=VIDA_ESTADO_CLIENTE)
+    
+    @staticmethod
+    def _historial_de_sesion(chat_session) -> List[Dict]:
+        """Historial de una sesión de chat como datos serializables."""
+        return [
+            {"role": turno.role, "parts": [getattr(parte, 'text', '') or '' for parte in turno.parts]}
+            for turno in chat_session.history
+        ]
+    
+    @staticmethod
+    def _archivo() -> Optional[Dict]:
+        """Archivo procesado del cliente actual (sin las secciones, ver _partes)."""
+        return estado_compartido.obtener("archivo", cliente_actual.get())
+    
+    @staticmethod
+    def _partes() -> List[ParteDocumento]:
+        """Texto original por secciones del archivo (para actualizarlo si se vuelve a subir)."""
+        partes = estado_compartido.obtener("partes", cliente_actual.get()) or []
+        return [ParteDocumento(*parte) for parte in partes]
+    
+    @staticmethod
+    def _guardar_archivo(archivo: Dict, partes: Optional[List[ParteDocumento]] = None):
+        """Guarda el archivo procesado; las secciones van aparte porque solo se leen al re-subirlo."""
+        token = cliente_actual.get()
+        archivo['bytes_partes'] = sum(len(parte.texto) for parte in partes or [])
+        estado_compartido.guardar("archivo", token, archivo, ttl=VIDA_ESTADO_CLIENTE)
+        if partes:
+            estado_compartido.guardar("partes", token, partes, ttl=VIDA_ESTADO_CLIENTE)
         else:
-            print("♻️  Reutilizando sesión de chat existente")
-        return cls._chat_session
+            estado_compartido.eliminar("partes", token)
     
     @classmethod
     def comprimir_archivo_inteligente(cls, contenido: str) -> str:
@@ -32,15 +118,15 @@ class GeminiModel:
         Comprime el archivo de manera inteligente manteniendo TODA la información.
         Funciona con cualquier tipo de archivo (dinámico).
         """
-        print(f"🗜️  COMPRESIÓN INTELIGENTE de {len(contenido)} caracteres")
+        log.debug("🗜️  COMPRESIÓN INTELIGENTE de %d caracteres", len(contenido))
         
         # Si ya es pequeño, no comprimir
         if len(contenido) <= 60000:
-            print("✅ Archivo pequeño, no necesita compresión")
+            log.debug("✅ Archivo pequeño, no necesita compresión")
             return contenido
         
         lineas = contenido.split('\n')
-        print(f"📊 Procesando {len(lineas)} líneas")
+        log.debug("📊 Procesando %d líneas", len(lineas))
         
         # Estrategia de compresión inteligente:
         # 1. Eliminar líneas vacías múltiples
@@ -69,7 +155,7 @@ class GeminiModel:
         
         # Si aún es muy grande, tomar muestra representativa
         if len(contenido_comprimido) > 120000:
-            print(f"⚠️  Archivo aún muy grande ({len(contenido_comprimido)} chars), tomando muestra representativa")
+            log.warning("⚠️  Archivo aún muy grande (%d chars), tomando muestra representativa", len(contenido_comprimido))
             
             lineas_finales = lineas_comprimidas[:2000]  # Primeras 2000 líneas
             if len(lineas_comprimidas) > 2000:
@@ -78,97 +164,262 @@ class GeminiModel:
             contenido_comprimido = '\n'.join(lineas_finales)
         
         reduccion = ((len(contenido) - len(contenido_comprimido)) / len(contenido)) * 100
-        print(f"✅ Compresión completada:")
-        print(f"  📊 Tamaño original: {len(contenido)} chars")
-        print(f"  📊 Tamaño comprimido: {len(contenido_comprimido)} chars")
-        print(f"  📊 Reducción: {reduccion:.1f}%")
+        log.info("✅ Compresión completada: %d → %d chars (reducción %.1f%%)", len(contenido),
+                 len(contenido_comprimido), reduccion)
         
         return contenido_comprimido
     
     @classmethod
-    async def procesar_archivo_rapido(cls, archivo_info: Dict) -> str:
+    async def procesar_archivo_rapido(cls, archivo_info: Dict, cancelar: Optional[threading.Event] = None) -> str:
         """
         Procesa un archivo de manera rápida y eficiente.
+        La extracción corre en un hilo para no bloquear el loop y se puede interrumpir con `cancelar`.
+        Si es una nueva versión del archivo del cliente (mismo nombre), solo se vuelven a extraer
+        las secciones que cambiaron y el resumen de cambios queda en el campo 'cambios' del archivo.
         """
-        print("🚀 PROCESANDO ARCHIVO RÁPIDO")
+        return (await cls._procesar_archivo(archivo_info, cancelar))['contenido']
+    
+    @classmethod
+    async def _procesar_archivo(cls, archivo_info: Dict, cancelar: Optional[threading.Event] = None) -> Dict:
+        """Procesa el archivo (ver procesar_archivo_rapido) y retorna el archivo guardado para el cliente."""
+        log.debug("🚀 PROCESANDO ARCHIVO RÁPIDO")
         nombre_archivo = archivo_info.get('name', 'archivo')
+        huella = archivo_info.get('huella')
         
-        # Extraer contenido del archivo
-        contenido_crudo = FileProcessor.process_file(
-            archivo_info.get("content", ""),
-            archivo_info.get("type", ""),
-            nombre_archivo
-        )
+        # Si el mismo archivo ya se procesó antes (en cualquier sesión), se toma de la biblioteca
+        documento = await asyncio.to_thread(biblioteca.obtener, huella) if huella else None
+        if documento is not None:
+            log.info("📚 Archivo encontrado en la biblioteca, sin extracción")
+            documento['nombre'] = nombre_archivo
+            return await asyncio.to_thread(cls.adjuntar_documento, documento)
         
-        print(f"📄 Contenido extraído: {len(contenido_crudo)} caracteres")
+        previo = await asyncio.to_thread(cls._archivo)
+        if previo is not None and previo['nombre'] == nombre_archivo:
+            log.info("♻️  Archivo ya en cache, verificando cambios...")
+            anteriores: List[ParteDocumento] = await asyncio.to_thread(cls._partes)
+        else:
+            log.info("🆕 Nuevo archivo, procesando...")
+            anteriores = []
+        
+        # Extraer contenido del archivo (reutilizando las secciones sin cambios)
+        with traza("extraccion", bytes=archivo_info.get('size', 0)):
+            partes = await asyncio.to_thread(
+                FileProcessor.extract_attachment_parts,
+                archivo_info,
+                cancelar,
+                {parte.huella: parte.texto for parte in anteriores},
+            )
+        
+        if anteriores and [p.huella for p in partes] == [p.huella for p in anteriores]:
+            log.info("♻️  Archivo idéntico al que está en cache")
+            previo['cambios'] = "sin cambios respecto de la versión anterior"
+            previo['timestamp'] = time.time()
+            await asyncio.to_thread(cls._guardar_archivo, previo, anteriores)
+            return previo
+        
+        contenido_crudo = FileProcessor.join_parts(partes)
+        log.info("📄 Contenido extraído: %d caracteres", len(contenido_crudo))
         
         # Comprimir de manera inteligente
-        contenido_comprimido = cls.comprimir_archivo_inteligente(contenido_crudo)
+        with traza("comprimir", caracteres=len(contenido_crudo)):
+            contenido_comprimido = cls.comprimir_archivo_inteligente(contenido_crudo)
         
         # Guardar en cache
-        cls._archivo_procesado = {
+        archivo = {
             'nombre': nombre_archivo,
             'contenido': contenido_comprimido,
-            'contenido_original': contenido_crudo,
+            'cambios': cls.describir_cambios(anteriores, partes) if anteriores else None,
             'size_original': len(contenido_crudo),
             'size_procesado': len(contenido_comprimido),
+            'huella': huella,
             'timestamp': time.time()
         }
+        await asyncio.to_thread(cls._guardar_archivo, archivo, partes)
         
-        print(f"💾 Archivo guardado en cache: {nombre_archivo}")
-        return contenido_comprimido
+        log.info("💾 Archivo guardado en cache: %s", contenido(nombre_archivo))
+        if huella and not FileProcessor.is_error_message(contenido_crudo):
+            await asyncio.to_thread(
+                biblioteca.guardar,
+                huella,
+                nombre_archivo,
+                archivo_info.get('type', ''),
+                archivo_info.get('size', 0),
+                contenido_comprimido,
+                len(contenido_crudo),
+            )
+        return archivo
+    
+    @classmethod
+    def adjuntar_documento(cls, documento: Dict) -> Dict:
+        """Deja un documento de la biblioteca como archivo de la conversación (ya extraído)."""
+        archivo = {
+            'nombre': documento['nombre'],
+            'contenido': documento['contenido'],
+            'cambios': None,
+            'size_original': documento.get('size_original') or len(documento['contenido']),
+            'size_procesado': len(documento['contenido']),
+            'huella': documento['huella'],
+            'timestamp': time.time()
+        }
+        cls._guardar_archivo(archivo)
+        log.info("💾 Documento de la biblioteca en cache: %s", contenido(documento['nombre']))
+        return archivo
+    
+    @staticmethod
+    def describir_cambios(anteriores: List[ParteDocumento], nuevas: List[ParteDocumento]) -> str:
+        """
+        Resume qué secciones cambiaron entre dos versiones de un documento.
+        Se compara el texto extraído: una sección que solo se movió (p. ej. páginas
+        corridas por una inserción) no cuenta como modificada.
+        """
+        textos_previos = {parte.texto for parte in anteriores}
+        textos_nuevos = {parte.texto for parte in nuevas}
+        claves_previas = {parte.clave for parte in anteriores}
+        claves_nuevas = {parte.clave for parte in nuevas}
+        
+        modificadas = [p.clave for p in nuevas if p.texto not in textos_previos and p.clave in claves_previas]
+        agregadas = [p.clave for p in nuevas if p.texto not in textos_previos and p.clave not in claves_previas]
+        eliminadas = [p.clave for p in anteriores if p.texto not in textos_nuevos and p.clave not in claves_nuevas]
+        
+        detalles = []
+        if modificadas:
+            detalles.append("secciones modificadas: " + ", ".join(modificadas))
+        if agregadas:
+            detalles.append("secciones nuevas: " + ", ".join(agregadas))
+        if eliminadas:
+            detalles.append("secciones eliminadas: " + ", ".join(eliminadas))
+        if len(anteriores) != len(nuevas):
+            detalles.append(f"pasó de {len(anteriores)} a {len(nuevas)} secciones")
+        if not detalles:
+            return "sin cambios en el texto respecto de la versión anterior"
+        return "; ".join(detalles)
+    
+    @classmethod
+    def bytes_cache(cls) -> int:
+        """Bytes aproximados de los caches del modelo del cliente (archivo e historial del chat)."""
+        total = 0
+        archivo = cls._archivo()
+        if archivo:
+            total += len(archivo.get('contenido') or '') + archivo.get('bytes_partes', 0)
+        total += sum(cls._bytes_turno(turno) for turno in cls._historial())
+        return total
+    
+    @staticmethod
+    def _bytes_turno(turno: Dict) -> int:
+        return sum(len(parte) for parte in turno['parts'] if isinstance(parte, str))
+    
+    @classmethod
+    def aplicar_limite_cache(cls, limite: int = LIMITE_CACHE_BYTES) -> Tuple[Optional[str], int]:
+        """
+        Recorta los caches del modelo del cliente si superan el límite (lee el archivo y
+        el historial una sola vez; lee y escribe SQLite: llamarla con asyncio.to_thread).
+        Retorna un aviso describiendo lo recortado (o None si no hizo falta) y los bytes
+        que quedan en los caches, como bytes_cache().
+        """
+        archivo = cls._archivo()
+        historial = cls._historial()
+        total = sum(cls._bytes_turno(turno) for turno in historial)
+        if archivo:
+            total += len(archivo.get('contenido') or '') + archivo.get('bytes_partes', 0)
+        if total <= limite:
+            return None, total
+        
+        acciones = []
+        
+        # 1. El texto original por secciones solo sirve para actualizar el archivo si se vuelve a subir
+        if archivo and archivo.get('bytes_partes'):
+            total -= archivo['bytes_partes']
+            cls._guardar_archivo(archivo)
+            acciones.append("se liberó el texto original del archivo")
+        
+        # 2. Turnos más antiguos del historial del chat (de a pares usuario/modelo)
+        if total > limite and historial:
+            quitar = 0
+            while total > limite and len(historial) - quitar > 2:
+                total -= cls._bytes_turno(historial[quitar]) + cls._bytes_turno(historial[quitar + 1])
+                quitar += 2
+            if quitar:
+                cls._guardar_historial(historial[quitar:])
+                acciones.append(f"se olvidaron {quitar // 2} intercambios antiguos del chat")
+        
+        # 3. Como último recurso, recortar el contenido del archivo en cache
+        if total > limite and archivo and archivo.get('contenido'):
+            contenido = archivo['contenido']
+            sobrante = total - limite
+            conservar = max(0, len(contenido) - sobrante)
+            archivo['contenido'] = (
+                contenido[:conservar] + "\n[NOTA: Contenido recortado por límite de memoria.]"
+            )
+            total += len(archivo['contenido']) - len(contenido)
+            archivo['size_procesado'] = len(archivo['contenido'])
+            cls._guardar_archivo(archivo)
+            acciones.append("se recortó el contenido del archivo en memoria")
+        
+        aviso = "Límite de memoria del modelo alcanzado: " + "; ".join(acciones) + "."
+        log.warning("⚠️  %s", aviso)
+        return aviso, total
     
     @classmethod
     def tiene_archivo_en_cache(cls, nombre_archivo: str) -> bool:
-        """Verifica si un archivo ya está procesado en cache."""
-        if not cls._archivo_procesado:
-            return False
-        return cls._archivo_procesado['nombre'] == nombre_archivo
+        """Verifica si hay en cache una versión de este archivo (mismo nombre, contenido quizás distinto)."""
+        archivo = cls._archivo()
+        return archivo is not None and archivo['nombre'] == nombre_archivo
     
     @classmethod
     def obtener_archivo_cache(cls) -> Optional[str]:
         """Obtiene el contenido del archivo desde cache."""
-        if cls._archivo_procesado:
-            print(f"💾 Usando archivo desde cache: {cls._archivo_procesado['nombre']}")
-            return cls._archivo_procesado['contenido']
+        archivo = cls._archivo()
+        if archivo:
+            log.debug("💾 Usando archivo desde cache: %s", contenido(archivo['nombre']))
+            return archivo['contenido']
         return None
     
     @classmethod
     def limpiar_cache_archivo(cls):
         """Limpia el cache del archivo."""
-        if cls._archivo_procesado:
-            print(f"🗑️  Limpiando cache del archivo: {cls._archivo_procesado['nombre']}")
-            cls._archivo_procesado = None
+        token = cliente_actual.get()
+        if estado_compartido.eliminar("archivo", token):
+            log.debug("🗑️  Limpiando cache del archivo del cliente")
+        estado_compartido.eliminar("partes", token)
     
     @classmethod
-    async def generar_respuesta(cls, mensaje: str, archivo_info: Optional[Dict] = None) -> str:
+    async def _enviar(cls, chat_session, mensaje: str):
+        """Envía el mensaje y guarda el historial actualizado (el próximo mensaje puede ir a otro worker)."""
+        with traza("gemini.enviar", modelo=MODELO_GEMINI, caracteres=len(mensaje)):
+            respuesta = await chat_session.send_message_async(mensaje)
+        with traza("estado.guardar_historial"):
+            await asyncio.to_thread(cls._guardar_historial, cls._historial_de_sesion(chat_session))
+        return respuesta
+    
+    @classmethod
+    async def generar_respuesta(cls, mensaje: str, archivo_info: Optional[Dict] = None,
+                                cancelar: Optional[threading.Event] = None) -> str:
         """
         Generar respuesta rápida con compresión inteligente y manejo de base de datos.
+        Cancelar la tarea que la ejecuta corta la llamada al modelo; `cancelar` detiene la extracción.
         """
         try:
-            print("=== PROCESANDO SOLICITUD RÁPIDA ===")
-            print(f"📝 Mensaje: '{mensaje}'")
-            inicio_total = time.time()
+            log.debug("=== PROCESANDO SOLICITUD RÁPIDA ===")
+            log.info("📝 Mensaje: %s", contenido(mensaje))
             
             # 🆕 VERIFICAR SI ES UN COMANDO DE BASE DE DATOS
-            print("🔍 Verificando si es comando de base de datos...")
-            respuesta_db = procesar_comando_db(mensaje)
+            log.debug("🔍 Verificando si es comando de base de datos...")
+            respuesta_db = await procesar_comando_db_async(mensaje, archivo_info)
             
             if respuesta_db is not None:
-                print("💾 Comando de base de datos procesado")
-                tiempo_total = time.time() - inicio_total
-                print(f"⏱️  TIEMPO TOTAL DB: {tiempo_total:.2f}s")
+                log.info("💾 Comando de base de datos procesado")
                 return respuesta_db
             
-            print("💬 No es comando de DB, procesando con Gemini...")
+            log.debug("💬 No es comando de DB, procesando con Gemini...")
             
-            chat_session = cls.get_chat_session()
+            chat_session = cls.get_chat_session(await asyncio.to_thread(cls._historial))
+            archivo = None if archivo_info else await asyncio.to_thread(cls._archivo)
             
             # CASO 1: Sin archivo nuevo, pero hay archivo en cache
-            if not archivo_info and cls._archivo_procesado:
-                print("🔄 Consultando sobre archivo en memoria")
-                contenido_archivo = cls.obtener_archivo_cache()
-                nombre_archivo = cls._archivo_procesado['nombre']
+            if archivo:
+                log.info("🔄 Consultando sobre archivo en memoria: %s", contenido(archivo['nombre']))
+                contenido_archivo = archivo['contenido']
+                nombre_archivo = archivo['nombre']
                 
                 mensaje_completo = f"""Usuario: {mensaje}
 
@@ -187,18 +438,12 @@ CONTENIDO DEL ARCHIVO:
 
 Instrucciones: Responde la pregunta del usuario basándote en el contenido del archivo. Si menciona usuarios o base de datos, explica que puede usar los comandos disponibles. Sé directo y profesional."""
                 
-                inicio_gemini = time.time()
-                respuesta = await chat_session.send_message_async(mensaje_completo)
-                tiempo_gemini = time.time() - inicio_gemini
-                
-                tiempo_total = time.time() - inicio_total
-                print(f"⏱️  TIEMPO GEMINI: {tiempo_gemini:.2f}s")
-                print(f"⏱️  TIEMPO TOTAL: {tiempo_total:.2f}s")
+                respuesta = await cls._enviar(chat_session, mensaje_completo)
                 return respuesta.text
             
             # CASO 2: Sin archivo adjunto y sin cache
             elif not archivo_info:
-                print("💬 Conversación normal")
+                log.debug("💬 Conversación normal")
                 
                 # Agregar información sobre comandos de BD disponibles
                 mensaje_con_db = f"""Usuario: {mensaje}
@@ -220,55 +465,90 @@ El usuario puede usar estos comandos para manejar la base de datos de usuarios:
 🗑️ ELIMINAR:
 - "eliminar usuario [id]"
 
+📚 BIBLIOTECA DE DOCUMENTOS:
+- "documentos" - Ver los documentos ya procesados
+- "usar documento [nombre]" - Trabajar con un documento sin volver a subirlo
+
 INSTRUCCIONES: Si el usuario pregunta sobre usuarios, base de datos, o quiere realizar operaciones CRUD, explícale que puede usar estos comandos exactos. Si es una consulta general, responde normalmente."""
                 
-                inicio_gemini = time.time()
-                respuesta = await chat_session.send_message_async(mensaje_con_db)
-                tiempo_gemini = time.time() - inicio_gemini
-                print(f"⏱️  TIEMPO GEMINI: {tiempo_gemini:.2f}s")
+                respuesta = await cls._enviar(chat_session, mensaje_con_db)
                 return respuesta.text
             
             # CASO 3: Nuevo archivo adjunto
             else:
                 nombre_archivo = archivo_info.get('name', 'archivo')
-                print(f"📎 Procesando archivo: {nombre_archivo}")
+                log.info("📎 Procesando archivo: %s", contenido(nombre_archivo))
                 
-                # Verificar si ya tenemos este archivo en cache
-                if cls.tiene_archivo_en_cache(nombre_archivo):
-                    print("♻️  Archivo ya en cache")
-                    contenido_archivo = cls.obtener_archivo_cache()
-                else:
-                    print("🆕 Nuevo archivo, procesando...")
-                    if cls._archivo_procesado:
-                        cls.limpiar_cache_archivo()
-                    
-                    contenido_archivo = await cls.procesar_archivo_rapido(archivo_info)
+                # Una nueva versión del archivo en cache se actualiza por secciones
+                archivo = await cls._procesar_archivo(archivo_info, cancelar)
+                contenido_archivo = archivo['contenido']
+                cambios = archivo.get('cambios')
+                aviso_cambios = f"\n[NUEVA VERSIÓN DEL ARCHIVO: {cambios}]\n" if cambios else ""
                 
                 # UNA SOLA llamada a Gemini con contenido comprimido
                 mensaje_completo = f"""Usuario: {mensaje}
 
 [ARCHIVO: {nombre_archivo}]
-
+{aviso_cambios}
 CONTENIDO COMPLETO DEL ARCHIVO:
 {contenido_archivo}
 
 💾 Base de datos disponible: El usuario puede manejar usuarios con comandos como:
 - "listar usuarios", "agregar usuario [datos]", "buscar usuario [término]", etc.
 
-Instrucciones: Analiza todo el contenido del archivo y responde la pregunta del usuario. Si menciona usuarios o base de datos, explica los comandos disponibles. Sé preciso y directo."""
-                
-                inicio_gemini = time.time()
-                respuesta = await chat_session.send_message_async(mensaje_completo)
-                tiempo_gemini = time.time() - inicio_gemini
+Instrucciones: Analiza todo el contenido del archivo y responde la pregunta del usuario. Si es una nueva versión, ten en cuenta qué secciones cambiaron. Si menciona usuarios o base de datos, explica los comandos disponibles. Sé preciso y directo."""
                 
-                tiempo_total = time.time() - inicio_total
-                print(f"⏱️  TIEMPO GEMINI: {tiempo_gemini:.2f}s")
-                print(f"⏱️  TIEMPO TOTAL: {tiempo_total:.2f}s")
-                print(f"💾 Archivo queda en memoria para futuras consultas")
+                respuesta = await cls._enviar(chat_session, mensaje_completo)
+                log.debug("💾 Archivo queda en memoria para futuras consultas")
                 
                 return respuesta.text
             
         except Exception as e:
             error_msg = f"Error al generar respuesta: {str(e)}"
-            print(f"❌ ERROR en GeminiModel: {error_msg}")
-            return error_msg
\ No newline at end of file
+            log.error("❌ ERROR en GeminiModel: %s", error_msg)
+            return error_msg
+
+# ========== COMANDOS DE LA BIBLIOTECA ==========
+
+@router.comando("documentos", "ver documentos", "listar documentos")
+def _comando_documentos(inv: Invocacion) -> Optional[str]:
+    """Listar los documentos de la biblioteca."""
+    if inv.argumentos:
+        return None  # "Documentos que necesito para...": es una pregunta, no el comando
+    documentos = biblioteca.listar()
+    if not documentos:
+        return ("📚 La biblioteca está vacía. Los archivos que subas quedan guardados aquí para volver a usarlos "
+                "(la biblioteca es compartida por todos los usuarios de la app).")
+    total = biblioteca.total()
+    lineas = [f"📚 **BIBLIOTECA DE DOCUMENTOS** ({total['documentos']} documentos)\n",
+              "ℹ️ La biblioteca es compartida: incluye los archivos que subieron todos los usuarios de la app\n"]
+    for documento in documentos:
+        usado = time.strftime("%Y-%m-%d %H:%M", time.localtime(documento['usado']))
+        lineas.append(
+            f"• **{documento['nombre']}** · {documento['size'] / 1024:.1f} KB · "
+            f"{documento['usos']} usos (último: {usado}) · `{documento['huella'][:8]}`"
+        )
+    lineas.append("\nℹ️ Escribe `usar documento [nombre]` para trabajar con uno sin volver a subirlo")
+    return "\n".join(lineas)
+
+@router.comando("usar documento", "abrir documento")
+def _comando_usar_documento(inv: Invocacion) -> str:
+    """Adjuntar a la conversación un documento ya procesado."""
+    termino = " ".join(inv.argumentos)
+    if not termino:
+        return "❌ Formato: 'usar documento [nombre]' (escribe 'documentos' para ver la lista)"
+    encontrados = biblioteca.buscar(termino)
+    if not encontrados:
+        return f"❌ No hay ningún documento que coincida con '{termino}'. Escribe 'documentos' para ver la lista."
+    if len(encontrados) > 1:
+        opciones = "\n".join(
+            f"• {d['nombre']} (`{d['huella'][:8]}`, usado {time.strftime('%Y-%m-%d %H:%M', time.localtime(d['usado']))})"
+            for d in encontrados
+        )
+        return f"🔍 Hay varios documentos que coinciden con '{termino}':\n{opciones}\n\nIndica el nombre completo o el código."
+    documento = biblioteca.obtener(encontrados[0]['huella'])
+    if documento is None:
+        return f"❌ El documento '{encontrados[0]['nombre']}' ya no está en la biblioteca."
+    GeminiModel.adjuntar_documento(documento)
+    return (f"📚 Documento **{documento['nombre']}** listo ({documento['size_original']} caracteres), "
+            f"sin subirlo ni procesarlo de nuevo.\n\nYa puedes hacer preguntas sobre su contenido.")
@@ -1,7 +1,33 @@
 import reflex as rx
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
 from .views import index
 from .controllers import Estado
+from .cancelacion import vigilar_desconexiones
+from .arranque import ciclo_de_vida, preparacion
+from .extractores import registro
+
+
+async def listo(request):
+    """Sonda de disponibilidad: 200 solo cuando este worker terminó de calentarse."""
+    resumen = preparacion.resumen()
+    return JSONResponse(resumen, status_code=200 if resumen["listo"] else 503)
+
+
+async def extractores(request):
+    """Motores de extracción de este worker: disponibilidad, usos y rendimiento medido."""
+    return JSONResponse(registro.estadisticas())
+
+
+# Rutas propias que se sirven junto a las de Reflex (p. ej. para el balanceador de carga)
+api = Starlette(routes=[Route("/listo", listo), Route("/extractores", extractores)])
 
 # --- App ---
-app = rx.App()
-app.add_page(index, title="Chat con Gemini")
\ No newline at end of file
+app = rx.App(api_transformer=api)
+# Bases de datos y autenticación se preparan al arrancar, no al importar;
+# el calentamiento sigue en segundo plano y /listo informa cuándo termina
+app.register_lifespan_task(ciclo_de_vida)
+app.add_page(index, title="Chat con Gemini", on_load=Estado.restaurar_conversacion)
+# Cancelar el trabajo de los clientes que cierran la pestaña o pierden la conexión
+app.register_lifespan_task(vigilar_desconexiones, app_reflex=app)
@@ -0,0 +1,373 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Set
+from .bitacora import obtener_logger
+from .conexiones import GestorConexiones
+
+log = obtener_logger(__name__)
+
+# Mensajes recientes que se mantienen en memoria por conversación
+CACHE_MENSAJES = 200
+# Conversaciones en memoria como máximo (se descartan las usadas hace más tiempo)
+MAX_CONVERSACIONES = int(os.getenv("TRANSCRIPT_MAX_CONVERSACIONES", "500"))
+# Parámetros de la escritura diferida (write-behind)
+LOTE_ESCRITURA = 100
+INTERVALO_ESCRITURA = 0.5  # segundos
+
+
+class TranscriptStore:
+    """Historial completo de cada conversación, persistido en SQLite por cliente.
+
+    El estado de Reflex solo mantiene una ventana de mensajes recientes; el resto
+    vive aquí y se pagina bajo demanda. Las escrituras se encolan y un hilo las
+    confirma en lotes, de modo que el chat nunca espera al disco. Tras un reinicio
+    o una reconexión, la cola reciente de cada conversación se carga perezosamente.
+    En memoria quedan solo las conversaciones usadas más recientemente; las de los
+    clientes que se desconectan se olvidan (ver cancelacion.vigilar_desconexiones).
+
+    Con varios workers, los mensajes de un cliente pueden llegar a procesos
+    distintos: el índice definitivo lo asigna el hilo escritor dentro de la
+    transacción (el siguiente al máximo guardado), así ninguno pisa a otro. El
+    índice que retorna `agregar` es provisional; si el escritor asigna otro, la
+    conversación se vuelve a cargar desde SQLite cuando no le quedan mensajes
+    pendientes.
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or os.getenv("CONVERSACIONES_DB", "conversaciones.db")
+        # token -> {"total", "inicio", "cache", "pendientes", "desfasada"}, de la menos a la más usada
+        self._conversaciones: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._cola: "queue.Queue" = queue.Queue()
+        self.conexiones = GestorConexiones(self.db_path, tamaño_pool=2, inicializar=self.init_database)
+        self._escritor = None  # Se arranca con iniciar() o con la primera escritura
+        atexit.register(self.flush)
+
+    def iniciar(self):
+        """Crea las tablas y arranca el hilo escritor (lo llama el ciclo de vida de la app)."""
+        self.conexiones.iniciar()
+        self._asegurar_escritor()
+
+    def init_database(self):
+        """Crear las tablas si no existen."""
+        with self.conexiones.escritura() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS mensajes (
+                    token TEXT NOT NULL,
+                    indice INTEGER NOT NULL,
+                    texto TEXT NOT NULL,
+                    es_usuario INTEGER NOT NULL,
+                    tiene_adjunto INTEGER NOT NULL DEFAULT 0,
+                    nombre_archivo TEXT NOT NULL DEFAULT '',
+                    fecha REAL NOT NULL,
+                    PRIMARY KEY (token, indice)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS documentos (
+                    token TEXT NOT NULL,
+                    nombre TEXT NOT NULL,
+                    tipo TEXT NOT NULL DEFAULT '',
+                    size INTEGER NOT NULL DEFAULT 0,
+                    fecha REAL NOT NULL
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documentos_token ON documentos (token, fecha)")
+
+    # ---------- Escritura diferida ----------
+
+    def _asegurar_escritor(self):
+        if self._escritor is None:
+            with self._lock:
+                if self._escritor is None:
+                    self._escritor = threading.Thread(
+                        target=self._bucle_escritura, name="transcript-writer", daemon=True
+                    )
+                    self._escritor.start()
+
+    def _encolar(self, operacion):
+        self._asegurar_escritor()
+        self._cola.put(operacion)
+
+    def _bucle_escritura(self):
+        """Hilo escritor: agrupa las operaciones encoladas y las confirma en una transacción."""
+        while True:
+            operaciones = [self._cola.get()]
+            limite = time.monotonic() + INTERVALO_ESCRITURA
+            while len(operaciones) < LOTE_ESCRITURA:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    operaciones.append(self._cola.get(timeout=restante))
+                except queue.Empty:
+                    break
+
+            mensajes = [op[1] for op in operaciones if op[0] == "mensaje"]
+            pendientes: Dict[str, int] = {}
+            for mensaje in mensajes:
+                pendientes[mensaje[0]] = pendientes.get(mensaje[0], 0) + 1
+            documentos = [op[1] for op in operaciones if op[0] == "documento"]
+            desfasadas: Set[str] = set()
+            try:
+                with self.conexiones.escritura() as conn:
+                    if mensajes:
+                        filas, desfasadas = self._asignar_indices(conn, mensajes)
+                        conn.executemany('''
+                            INSERT INTO mensajes
+                                (token, indice, texto, es_usuario, tiene_adjunto, nombre_archivo, fecha)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ''', filas)
+                    if documentos:
+                        conn.executemany('''
+                            INSERT INTO documentos (token, nombre, tipo, size, fecha)
+                            VALUES (?, ?, ?, ?, ?)
+                        ''', documentos)
+            except Exception as e:
+                desfasadas = set()
+                log.error("❌ Error al persistir conversación: %s", e)
+
+            with self._lock:
+                for token, cantidad in pendientes.items():
+                    conversacion = self._conversaciones.get(token)
+                    if conversacion is None:
+                        continue
+                    conversacion["pendientes"] -= cantidad
+                    if token in desfasadas:
+                        conversacion["desfasada"] = True
+                    # Otro worker escribió en la conversación: la cache no sigue el orden guardado
+                    if conversacion["desfasada"] and conversacion["pendientes"] == 0:
+                        del self._conversaciones[token]
+                        log.debug("🔀 Conversación escrita desde otro worker, se recargará desde la base")
+
+            # Despertar a quienes esperaban un flush
+            for tipo, dato in operaciones:
+                if tipo == "flush":
+                    dato.set()
+
+    @classmethod
+    def _asignar_indices(cls, conn, mensajes: List[tuple]):
+        """
+        Asigna a cada mensaje el índice siguiente al último guardado de su conversación.
+        Corre dentro de la transacción del escritor (BEGIN IMMEDIATE), así que ningún otro
+        proceso escribe en medio. Retorna las filas y los tokens cuyo índice provisional
+        no coincidió con el asignado.
+        """
+        siguientes: Dict[str, int] = {}
+        filas = []
+        desfasadas: Set[str] = set()
+        for token, provisional, *datos in mensajes:
+            if token not in siguientes:
+                siguientes[token] = cls._total_guardado(conn, token)
+            indice = siguientes[token]
+            siguientes[token] += 1
+            if indice != provisional:
+                desfasadas.add(token)
+            filas.append((token, indice, *datos))
+        return filas, desfasadas
+
+    @staticmethod
+    def _total_guardado(conn, token: str) -> int:
+        fila = conn.execute("SELECT MAX(indice) FROM mensajes WHERE token = ?", (token,)).fetchone()
+        return (fila[0] + 1) if fila and fila[0] is not None else 0
+
+    def flush(self, timeout: float = 5.0):
+        """Espera a que todas las escrituras encoladas hasta ahora estén confirmadas."""
+        if self._escritor is None:
+            return  # Nunca se encoló nada
+        listo = threading.Event()
+        self._cola.put(("flush", listo))
+        listo.wait(timeout)
+
+    # ---------- Carga perezosa ----------
+
+    def _conversacion(self, token: str) -> Dict:
+        """Retorna la conversación en memoria, cargando su cola reciente si hace falta.
+
+        Se llama sin `self._lock` tomado: la lectura de SQLite no frena a los demás
+        clientes. Quien la modifique debe confirmar, ya con el lock, que sigue en
+        memoria (ver agregar).
+        """
+        with self._lock:
+            conversacion = self._conversaciones.get(token)
+            if conversacion is not None:
+                self._conversaciones.move_to_end(token)
+                return conversacion
+
+        with self.conexiones.lectura() as conn:
+            total = self._total_guardado(conn, token)
+            inicio = max(0, total - CACHE_MENSAJES)
+            filas = conn.execute('''
+                SELECT texto, es_usuario, tiene_adjunto, nombre_archivo
+                FROM mensajes WHERE token = ? AND indice >= ?
+                ORDER BY indice
+            ''', (token, inicio)).fetchall()
+        cargada = {
+            "total": total,
+            "inicio": inicio,
+            "cache": [self._fila_a_mensaje(f) for f in filas],
+            "pendientes": 0,  # Mensajes encolados que el escritor todavía no confirmó
+            "desfasada": False,  # El escritor asignó índices distintos a los provisionales
+        }
+
+        with self._lock:
+            # Si otro hilo la cargó mientras tanto, vale la suya (puede tener mensajes nuevos)
+            conversacion = self._conversaciones.setdefault(token, cargada)
+            self._conversaciones.move_to_end(token)
+            self._desalojar(conservar=token)
+            return conversacion
+
+    def _vigente(self, token: str) -> Dict:
+        """
+        Como _conversacion, pero si no tiene mensajes pendientes compara su total con el
+        guardado: si otro worker agregó mensajes, la vuelve a cargar desde SQLite.
+        """
+        conversacion = self._conversacion(token)
+        with self._lock:
+            if conversacion["pendientes"] > 0:
+                return conversacion  # Lo pendiente solo está en memoria; el escritor la corrige
+            total = conversacion["total"]
+        with self.conexiones.lectura() as conn:
+            guardado = self._total_guardado(conn, token)
+        if guardado == total:
+            return conversacion
+        with self._lock:
+            if self._conversaciones.get(token) is conversacion and conversacion["pendientes"] == 0:
+                del self._conversaciones[token]
+        return self._conversacion(token)
+
+    def _desalojar(self, conservar: str):
+        """Descarta las conversaciones menos usadas por encima de MAX_CONVERSACIONES.
+
+        Debe llamarse con `self._lock` tomado. Las que tienen mensajes sin confirmar se
+        conservan: al volver a cargarlas desde SQLite faltarían esos mensajes.
+        """
+        exceso = len(self._conversaciones) - MAX_CONVERSACIONES
+        if exceso <= 0:
+            return
+        descartables = [t for t, c in self._conversaciones.items() if c["pendientes"] == 0 and t != conservar]
+        for token in descartables[:exceso]:
+            del self._conversaciones[token]
+
+    @staticmethod
+    def _fila_a_mensaje(fila) -> Dict:
+        texto, es_usuario, tiene_adjunto, nombre_archivo = fila
+        mensaje = {"texto": texto, "es_usuario": bool(es_usuario)}
+        if es_usuario:
+            mensaje["tiene_adjunto"] = bool(tiene_adjunto)
+            mensaje["nombre_archivo"] = nombre_archivo
+        return mensaje
+
+    # ---------- API ----------
+
+    def agregar(self, token: str, mensaje: Dict) -> int:
+        """
+        Agrega un mensaje al historial del cliente y retorna su índice (provisional: si
+        otro worker escribe a la vez en la misma conversación, el escritor asigna otro).
+        """
+        while True:
+            conversacion = self._vigente(token)
+            with self._lock:
+                if self._conversaciones.get(token) is conversacion:
+                    break  # Si se descartó mientras se cargaba, se vuelve a cargar
+        with self._lock:
+            conversacion["pendientes"] += 1
+            indice = conversacion["total"]
+            conversacion["total"] += 1
+            conversacion["cache"].append(mensaje)
+            exceso = len(conversacion["cache"]) - CACHE_MENSAJES
+            if exceso > 0:
+                del conversacion["cache"][:exceso]
+                conversacion["inicio"] += exceso
+
+        self._encolar(("mensaje", (
+            token,
+            indice,
+            mensaje.get("texto", ""),
+            int(bool(mensaje.get("es_usuario"))),
+            int(bool(mensaje.get("tiene_adjunto"))),
+            mensaje.get("nombre_archivo", "") or "",
+            time.time(),
+        )))
+        return indice
+
+    def registrar_documento(self, token: str, nombre: str, tipo: str = "", size: int = 0):
+        """Registra (de forma diferida) que un documento se usó en la conversación."""
+        self._encolar(("documento", (token, nombre, tipo or "", size or 0, time.time())))
+
+    def total(self, token: str) -> int:
+        """Cantidad de mensajes del historial completo del cliente."""
+        conversacion = self._vigente(token)
+        with self._lock:
+            return conversacion["total"]
+
+    def rango(self, token: str, desde: int, hasta: int) -> List[Dict]:
+        """Retorna los mensajes en [desde, hasta) del historial del cliente."""
+        desde = max(0, desde)
+        conversacion = self._conversacion(token)
+        with self._lock:
+            hasta = min(max(0, hasta), conversacion["total"])
+            base = conversacion["inicio"]
+            en_memoria = conversacion["cache"][max(desde, base) - base:max(hasta, base) - base]
+        hasta_disco = min(hasta, base)
+        if desde >= hasta_disco:
+            return list(en_memoria)
+
+        # La parte anterior a la cola en memoria se lee de SQLite (lo pendiente siempre está en memoria)
+        with self.conexiones.lectura() as conn:
+            filas = conn.execute('''
+                SELECT texto, es_usuario, tiene_adjunto, nombre_archivo
+                FROM mensajes WHERE token = ? AND indice >= ? AND indice < ?
+                ORDER BY indice
+            ''', (token, desde, hasta_disco)).fetchall()
+        return [self._fila_a_mensaje(f) for f in filas] + list(en_memoria)
+
+    def recientes(self, token: str, cantidad: int) -> List[Dict]:
+        """Retorna los últimos `cantidad` mensajes del cliente."""
+        total = self.total(token)
+        return self.rango(token, total - cantidad, total) if cantidad > 0 else []
+
+    def documentos(self, token: str, limite: int = 10) -> List[Dict]:
+        """Documentos usados recientemente en la conversación del cliente."""
+        self.flush()
+        with self.conexiones.lectura() as conn:
+            filas = conn.execute('''
+                SELECT nombre, tipo, size, fecha FROM documentos
+                WHERE token = ? ORDER BY fecha DESC LIMIT ?
+            ''', (token, limite)).fetchall()
+        return [{"nombre": n, "tipo": t, "size": s, "fecha": f} for n, t, s, f in filas]
+
+    def historial_modelo(self, token: str, cantidad: int = 20) -> List[Dict]:
+        """Historial reciente en el formato de `start_chat` (pares usuario/modelo)."""
+        mensajes = self.recientes(token, cantidad)
+        historial = []
+        for anterior, actual in zip(mensajes, mensajes[1:]):
+            if anterior.get("es_usuario") and not actual.get("es_usuario"):
+                historial.append({"role": "user", "parts": [anterior.get("texto", "")]})
+                historial.append({"role": "model", "parts": [actual.get("texto", "")]})
+        return historial
+
+    def limpiar(self, token: str) -> bool:
+        """
+        Olvida la conversación en memoria (lo persistido se conserva). Si tiene mensajes
+        sin confirmar no la olvida todavía. Retorna True si ya no está en memoria.
+        """
+        with self._lock:
+            conversacion = self._conversaciones.get(token)
+            if conversacion is not None and conversacion["pendientes"] > 0:
+                return False
+            self._conversaciones.pop(token, None)
+            return True
+
+    def tokens_en_memoria(self) -> Set[str]:
+        """Clientes con la conversación cargada en memoria."""
+        with self._lock:
+            return set(self._conversaciones)
+
+
+# Instancia global
+transcript = TranscriptStore()
@@ -0,0 +1,342 @@
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import queue
+import secrets
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+from .bitacora import campos, obtener_logger
+
+log = obtener_logger(__name__)
+
+# Archivo donde se exportan los spans (vacío: no se exportan, solo se resumen en el log).
+# Cada línea es un ExportTraceServiceRequest en JSON, el formato del exportador "file"
+# del OpenTelemetry Collector: se puede leer con su receptor otlpjsonfile o con
+# `python benchmarks/trazas.py`
+TRAZAS_ARCHIVO = os.getenv("TRAZAS_ARCHIVO", "")
+# Resumen de cada solicitud en el log: las que tardan más de estos milisegundos se
+# registran como INFO, el resto como DEBUG (los comandos y tareas cortas no llenan el log)
+RESUMEN_MS = int(os.getenv("TRAZAS_RESUMEN_MS", "1000"))
+# Perfil por solicitud (opcional): las que tardan más de estos milisegundos guardan un
+# perfil de muestreo de sus hilos en TRAZAS_PERFILES. 0 lo desactiva. El hilo del loop
+# de eventos lo comparten todos los clientes: sus pilas pueden ser de otra solicitud que
+# corría a la vez (las de los hilos de extracción o de SQLite sí son propias)
+PERFIL_MS = int(os.getenv("TRAZAS_PERFIL_MS", "0"))
+PERFIL_DIRECTORIO = os.getenv("TRAZAS_PERFILES", "perfiles")
+PERFIL_INTERVALO = int(os.getenv("TRAZAS_PERFIL_INTERVALO_MS", "5")) / 1000
+# Spans pendientes de escribir como máximo; si la cola se llena se descartan (nunca se espera)
+CAPACIDAD_COLA = 10000
+LOTE_EXPORTACION = 512
+
+# Códigos de estado de OTLP
+_ESTADO_OK = 1
+_ESTADO_ERROR = 2
+
+_actual: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("span_actual", default=None)
+
+
+class Span:
+    """Una etapa medida de una solicitud.
+
+    El span activo viaja en un ContextVar, así que los spans que se abren dentro de
+    `asyncio.to_thread` o del pool de lectores de SQLite quedan como hijos del que
+    los lanzó. La raíz de cada traza junta la duración de todos sus spans para el
+    resumen que se registra al terminar.
+    """
+
+    __slots__ = ("nombre", "traza_id", "span_id", "padre", "raiz", "atributos",
+                 "inicio_ns", "_inicio", "duracion", "error", "etapas")
+
+    def __init__(self, nombre: str, padre: Optional["Span"], atributos: Dict):
+        self.nombre = nombre
+        self.padre = padre
+        self.raiz = padre.raiz if padre is not None else self
+        self.traza_id = self.raiz.traza_id if padre is not None else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.atributos = atributos
+        self.inicio_ns = time.time_ns()
+        self._inicio = time.perf_counter()
+        self.duracion: Optional[float] = None  # segundos
+        self.error: Optional[str] = None
+        self.etapas: List = []  # Solo en la raíz: (nombre, segundos) de cada span terminado
+
+    @property
+    def es_raiz(self) -> bool:
+        return self.raiz is self
+
+    def terminar(self, error: Optional[BaseException] = None):
+        if self.duracion is not None:
+            return
+        self.duracion = time.perf_counter() - self._inicio
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        if _actual.get() is self:
+            _actual.set(self.padre)
+        if self.es_raiz:
+            perfilador.terminar(self)
+            self._resumir()
+        else:
+            self.raiz.etapas.append((self.nombre, self.duracion))
+            perfilador.salir(self)
+        exportador.exportar(self)
+
+    def _resumir(self):
+        """
+        Registra la duración de la solicitud y de sus etapas (sumadas por nombre): como
+        INFO si superó TRAZAS_RESUMEN_MS, si no como DEBUG.
+        """
+        nivel = logging.INFO if self.duracion * 1000 >= RESUMEN_MS else logging.DEBUG
+        if not log.isEnabledFor(nivel):
+            return
+        totales: Dict[str, float] = {}
+        for nombre, segundos in self.etapas:
+            totales[nombre] = totales.get(nombre, 0.0) + segundos
+        detalle = ", ".join(f"{nombre} {segundos:.2f}s" for nombre, segundos in totales.items())
+        log.log(nivel, "⏱️  %s en %.2fs%s", self.nombre, self.duracion, f" ({detalle})" if detalle else "",
+                 extra=campos(traza=self.traza_id, segundos=round(self.duracion, 3),
+                              etapas={nombre: round(s, 3) for nombre, s in totales.items()}))
+
+
+def iniciar_span(nombre: str, activar: bool = True, **atributos) -> Span:
+    """
+    Abre un span hijo del actual (o la raíz de una traza nueva). Con activar=False no
+    pasa a ser el span actual: sirve para medir un `yield` de un generador, donde el
+    contexto puede cambiar antes de cerrarlo. Hay que cerrarlo con `span.terminar()`.
+    """
+    padre = _actual.get()
+    span = Span(nombre, padre, atributos)
+    if activar:
+        _actual.set(span)
+    if padre is None:
+        perfilador.iniciar(span)
+    else:
+        perfilador.entrar(span)
+    return span
+
+
+@contextlib.contextmanager
+def traza(nombre: str, activar: bool = True, **atributos):
+    """
+    Mide el bloque como un span: `with traza("comprimir", caracteres=n): ...`.
+    Para medir un `yield` de un generador, activar=False (ver iniciar_span).
+    """
+    span = iniciar_span(nombre, activar, **atributos)
+    try:
+        yield span
+    except BaseException as e:
+        span.terminar(e)
+        raise
+    span.terminar()
+
+
+# ========== EXPORTACIÓN ==========
+
+def _valor_otlp(valor) -> Dict:
+    if isinstance(valor, bool):
+        return {"boolValue": valor}
+    if isinstance(valor, int):
+        return {"intValue": str(valor)}
+    if isinstance(valor, float):
+        return {"doubleValue": valor}
+    return {"stringValue": str(valor)}
+
+
+def _span_otlp(span: Span) -> Dict:
+    fin_ns = span.inicio_ns + int(span.duracion * 1e9)
+    datos = {
+        "traceId": span.traza_id,
+        "spanId": span.span_id,
+        "name": span.nombre,
+        "kind": 2 if span.es_raiz else 1,  # SERVER para la solicitud, INTERNAL para sus etapas
+        "startTimeUnixNano": str(span.inicio_ns),
+        "endTimeUnixNano": str(fin_ns),
+        "attributes": [{"key": clave, "value": _valor_otlp(valor)} for clave, valor in span.atributos.items()],
+        "status": {"code": _ESTADO_ERROR, "message": span.error} if span.error else {"code": _ESTADO_OK},
+    }
+    if span.padre is not None:
+        datos["parentSpanId"] = span.padre.span_id
+    return datos
+
+
+class Exportador:
+    """Escribe los spans terminados en TRAZAS_ARCHIVO desde un hilo propio, por lotes."""
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self.descartados = 0
+        self._cola: "queue.Queue" = queue.Queue(maxsize=CAPACIDAD_COLA)
+        self._hilo: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._recurso = {"attributes": [
+            {"key": "service.name", "value": {"stringValue": "pyapp"}},
+            {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+        ]}
+
+    def exportar(self, span: Span):
+        if not self.ruta:
+            return
+        if self._hilo is None:
+            self._iniciar()
+        try:
+            self._cola.put_nowait(span)
+        except queue.Full:
+            self.descartados += 1
+
+    def _iniciar(self):
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._escribir, name="trazas-exportador", daemon=True)
+                self._hilo.start()
+                atexit.register(self.cerrar)
+
+    def _escribir(self):
+        while True:
+            span = self._cola.get()
+            lote = [span]
+            while span is not None and len(lote) < LOTE_EXPORTACION:
+                try:
+                    span = self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                lote.append(span)
+            terminar = lote[-1] is None
+            lote = [s for s in lote if s is not None]
+            if lote:
+                solicitud = {"resourceSpans": [{
+                    "resource": self._recurso,
+                    "scopeSpans": [{"scope": {"name": "pyapp"}, "spans": [_span_otlp(s) for s in lote]}],
+                }]}
+                try:
+                    with open(self.ruta, "a", encoding="utf-8") as archivo:
+                        archivo.write(json.dumps(solicitud, ensure_ascii=False) + "\n")
+                except OSError as e:
+                    log.error("❌ Error al exportar trazas: %s", e)
+            if terminar:
+                return
+
+    def cerrar(self):
+        """Escribe lo pendiente y detiene el hilo."""
+        if self._hilo is not None and self._hilo.is_alive():
+            self._cola.put(None)
+            self._hilo.join(timeout=5)
+
+
+# ========== PERFIL POR SOLICITUD ==========
+
+class Perfilador:
+    """Perfil de muestreo de las solicitudes lentas (TRAZAS_PERFIL_MS).
+
+    Mientras una solicitud está en curso, un único hilo toma cada
+    TRAZAS_PERFIL_INTERVALO_MS la pila de los hilos donde tiene un span abierto
+    (el loop de eventos, el hilo de extracción, el lector de SQLite...). Si al
+    terminar superó el umbral, las pilas se guardan en formato "folded" (una pila
+    por línea con su cantidad de muestras), que leen flamegraph.pl y speedscope;
+    si no, se descartan. Sin umbral configurado no hace nada.
+
+    El loop de eventos atiende a todos los clientes: las muestras de ese hilo
+    incluyen lo que hacían las otras solicitudes en curso. Solo las pilas de los
+    hilos de trabajo (extracción, lectores y escritor de SQLite) son exclusivas
+    de la solicitud mientras tiene un span abierto en ellos.
+    """
+
+    def __init__(self, umbral_ms: int, directorio: str, intervalo: float):
+        self.umbral_ms = umbral_ms
+        self.directorio = directorio
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._hilos: Dict[str, Dict[int, int]] = {}  # traza -> {hilo: spans abiertos}
+        self._muestras: Dict[str, Dict[str, int]] = {}  # traza -> {pila: muestras}
+        self._hay_trabajo = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    @property
+    def activo(self) -> bool:
+        return self.umbral_ms > 0
+
+    def iniciar(self, raiz: Span):
+        if not self.activo:
+            return
+        with self._lock:
+            self._hilos[raiz.traza_id] = {threading.get_ident(): 1}
+            self._muestras[raiz.traza_id] = {}
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._muestrear, name="trazas-perfilador", daemon=True)
+                self._hilo.start()
+        self._hay_trabajo.set()
+
+    def entrar(self, span: Span):
+        if not self.activo:
+            return
+        with self._lock:
+            hilos = self._hilos.get(span.traza_id)
+            if hilos is not None:
+                ident = threading.get_ident()
+                hilos[ident] = hilos.get(ident, 0) + 1
+
+    def salir(self, span: Span):
+        if not self.activo:
+            return
+        with self._lock:
+            hilos = self._hilos.get(span.traza_id)
+            ident = threading.get_ident()
+            if hilos and ident in hilos:
+                hilos[ident] -= 1
+                if hilos[ident] <= 0:
+                    del hilos[ident]
+
+    def terminar(self, raiz: Span):
+        if not self.activo:
+            return
+        with self._lock:
+            self._hilos.pop(raiz.traza_id, None)
+            muestras = self._muestras.pop(raiz.traza_id, {})
+            if not self._hilos:
+                self._hay_trabajo.clear()
+        if raiz.duracion * 1000 < self.umbral_ms or not muestras:
+            return
+        ruta = os.path.join(self.directorio, f"{raiz.traza_id}.folded")
+        try:
+            os.makedirs(self.directorio, exist_ok=True)
+            with open(ruta, "w", encoding="utf-8") as archivo:
+                for pila, cantidad in sorted(muestras.items()):
+                    archivo.write(f"{pila} {cantidad}\n")
+        except OSError as e:
+            log.error("❌ Error al guardar el perfil: %s", e)
+            return
+        raiz.atributos["perfil"] = ruta
+        log.warning("🐢 %s tardó %.2fs: perfil guardado en %s", raiz.nombre, raiz.duracion, ruta)
+
+    def _muestrear(self):
+        propio = threading.get_ident()
+        while True:
+            self._hay_trabajo.wait()
+            time.sleep(self.intervalo)
+            marcos = sys._current_frames()
+            with self._lock:
+                for traza_id, hilos in self._hilos.items():
+                    muestras = self._muestras[traza_id]
+                    for ident in hilos:
+                        marco = marcos.get(ident)
+                        if marco is None or ident == propio:
+                            continue
+                        pila = self._pila(marco)
+                        muestras[pila] = muestras.get(pila, 0) + 1
+
+    @staticmethod
+    def _pila(marco) -> str:
+        llamadas = []
+        while marco is not None:
+            codigo = marco.f_code
+            llamadas.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})")
+            marco = marco.f_back
+        return ";".join(reversed(llamadas))
+
+
+# Instancias globales
+exportador = Exportador(TRAZAS_ARCHIVO)
+perfilador = Perfilador(PERFIL_MS, PERFIL_DIRECTORIO, PERFIL_INTERVALO)
@@ -10,6 +10,12 @@ COLOR_TEXTO_AI = "#000000"
 SHADOW = "rgba(0, 0, 0, 0.05) 0px 4px 4px"
 COLOR_ADJUNTO = "#e2e8f0"
 
+# --- Entrada de mensajes ---
+# "local": el texto vive solo en el navegador y se envía al servidor al confirmar (Enter o botón).
+# "debounce": el input sigue sincronizado con el estado, pero solo tras una pausa al escribir.
+MODO_ENTRADA = "local"
+DEBOUNCE_ENTRADA_MS = 600
+
 # --- Componentes de la UI ---
 def mensaje_componente(mensaje: dict) -> rx.Component:
     es_usuario = mensaje["es_usuario"]
@@ -69,7 +75,35 @@ def mensaje_componente(mensaje: dict) -> rx.Component:
         justify_content=rx.cond(es_usuario, "flex-end", "flex-start"),
         margin_bottom="10px",
         width="100%",
+        # Virtualización: el navegador omite layout y pintado de los mensajes fuera de pantalla
+        content_visibility="auto",
+        contain_intrinsic_size="auto 80px",
+    )
+
+def campo_mensaje() -> rx.Component:
+    """Input del mensaje según MODO_ENTRADA; en ambos modos el envío lo hace el formulario."""
+    props = dict(
+        name="mensaje",
+        id="campo_mensaje",
+        placeholder="Escribe un mensaje o adjunta un archivo para analizar...",
+        auto_complete="off",
+        flex="1",
+        border="1px solid #ddd",
+        border_radius="8px",
+        padding="12px",
+        bg="#FFFFFF",
+        color="#090909",
+        height="44px",
+        font_size="14px",
     )
+    if MODO_ENTRADA == "debounce":
+        return rx.input(
+            value=Estado.mensaje,
+            on_change=Estado.set_mensaje,
+            debounce_timeout=DEBOUNCE_ENTRADA_MS,
+            **props,
+        )
+    return rx.input(**props)
 
 def index() -> rx.Component:
     return rx.box(
@@ -84,6 +118,12 @@ def index() -> rx.Component:
                         font_size="0.9em",
                         opacity="0.8"
                     ),
+                    rx.text(
+                        Estado.uso_memoria,
+                        color="white",
+                        font_size="0.7em",
+                        opacity="0.6"
+                    ),
                     align_items="center",
                     spacing="2",
                 ),
@@ -94,7 +134,36 @@ def index() -> rx.Component:
             # Área de mensajes
             rx.box(
                 rx.vstack(
+                    # Paginación hacia atrás sobre el historial guardado en el servidor
+                    rx.cond(
+                        Estado.hay_anteriores,
+                        rx.center(
+                            rx.button(
+                                "Cargar mensajes anteriores",
+                                on_click=Estado.cargar_anteriores,
+                                size="1",
+                                variant="soft",
+                                color_scheme="gray",
+                            ),
+                            width="100%",
+                            padding_bottom="10px",
+                        ),
+                    ),
                     rx.foreach(Estado.mensajes, mensaje_componente),
+                    rx.cond(
+                        Estado.hay_posteriores,
+                        rx.center(
+                            rx.button(
+                                "Cargar mensajes posteriores",
+                                on_click=Estado.cargar_posteriores,
+                                size="1",
+                                variant="soft",
+                                color_scheme="gray",
+                            ),
+                            width="100%",
+                            padding_top="10px",
+                        ),
+                    ),
                     align_items="stretch",
                     padding_x="20px",
                     padding_y="10px",
@@ -105,10 +174,47 @@ def index() -> rx.Component:
                 overflow_y="auto",
                 width="100%",
             ),
+            # Aviso cuando se alcanza un límite de memoria
+            rx.cond(
+                Estado.aviso_memoria != "",
+                rx.hstack(
+                    rx.icon("triangle-alert", color="#b45309", size=16),
+                    rx.text(Estado.aviso_memoria, font_size="0.8em", color="#92400e"),
+                    rx.spacer(),
+                    rx.icon(
+                        "x",
+                        color="gray",
+                        cursor="pointer",
+                        on_click=Estado.cerrar_aviso_memoria,
+                    ),
+                    bg="#fef3c7",
+                    padding="8px 12px",
+                    border_radius="8px",
+                    margin_x="10px",
+                    width="calc(100% - 20px)",
+                    border="1px solid #fcd34d",
+                ),
+            ),
             # Spinner de carga
             rx.cond(
                 Estado.cargando,
-                rx.center(rx.spinner(color="blue", size="3"), padding="10px", width="100%"),
+                rx.center(
+                    rx.hstack(
+                        rx.spinner(color="blue", size="3"),
+                        rx.button(
+                            rx.icon("square", size=14),
+                            "Detener",
+                            on_click=Estado.cancelar_generacion,
+                            size="1",
+                            variant="soft",
+                            color_scheme="red",
+                        ),
+                        spacing="3",
+                        align_items="center",
+                    ),
+                    padding="10px",
+                    width="100%",
+                ),
             ),
             # Mostrar archivo adjunto si existe
             rx.cond(
@@ -160,7 +266,9 @@ def index() -> rx.Component:
                             "application/vnd.openxmlformats-officedocument.wordprocessingml.document": [".docx"],
                             "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": [".xlsx"],
                             "application/vnd.ms-excel": [".xls"],
-                            "text/plain": [".txt"]
+                            "text/plain": [".txt", ".log"],
+                            "text/csv": [".csv"],
+                            "text/tab-separated-values": [".tsv"]
                         },
                         multiple=False,
                         padding="0",
@@ -189,33 +297,30 @@ def index() -> rx.Component:
                     spacing="2",
                     align_items="center",
                 ),
-                rx.input(
-                    placeholder="Escribe un mensaje o adjunta un archivo para analizar...",
-                    value=Estado.mensaje,
-                    on_change=Estado.set_mensaje,
-                    on_key_down=lambda key: rx.cond(key == "Enter", Estado.enviar_mensaje, None),
+                # Formulario: Enter o el botón envían el texto una sola vez, sin sincronizar cada tecla
+                rx.form(
+                    rx.hstack(
+                        campo_mensaje(),
+                        rx.button(
+                            rx.icon("arrow-right", size=18),
+                            type="submit",
+                            is_disabled=Estado.cargando,
+                            bg=COLOR_MENSAJE_USUARIO,
+                            color="white",
+                            border_radius="8px",
+                            height="44px",
+                            width="44px",
+                            padding="0",
+                            cursor="pointer",
+                            _hover={"bg": "#3367d6"},
+                            _disabled={"bg": "#9ca3af", "cursor": "not-allowed"},
+                        ),
+                        gap="12px",
+                        align_items="center",
+                        width="100%",
+                    ),
+                    on_submit=Estado.enviar_formulario,
                     flex="1",
-                    border="1px solid #ddd",
-                    border_radius="8px",
-                    padding="12px",
-                    bg="#FFFFFF",
-                    color="#090909",
-                    height="44px",
-                    font_size="14px",
-                ),
-                rx.button(
-                    rx.icon("arrow-right", size=18),
-                    on_click=Estado.enviar_mensaje,
-                    is_disabled=Estado.cargando,
-                    bg=COLOR_MENSAJE_USUARIO,
-                    color="white",
-                    border_radius="8px",
-                    height="44px",
-                    width="44px",
-                    padding="0",
-                    cursor="pointer",
-                    _hover={"bg": "#3367d6"},
-                    _disabled={"bg": "#9ca3af", "cursor": "not-allowed"},
                 ),
                 width="100%",
                 padding="15px",